@@ -8,11 +8,13 @@ import autogen  # type: ignore
 
 from ae.core.memory.static_ltm import get_user_ltm
 from ae.core.prompts import LLM_PROMPTS
+from ae.core.skills.action_sequence import run_action_sequence
 from ae.core.skills.click_using_selector import click as click_element
 
 # from ae.core.skills.enter_text_and_click import enter_text_and_click
 from ae.core.skills.enter_text_using_selector import bulk_enter_text
 from ae.core.skills.enter_text_using_selector import entertext
+from ae.core.skills.find_elements import find_elements
 from ae.core.skills.get_dom_with_content_type import get_dom_with_content_type
 from ae.core.skills.get_url import geturl
 from ae.core.skills.open_url import openurl
@@ -88,6 +90,9 @@ class BrowserNavAgent:
         self.agent.register_for_llm(description=LLM_PROMPTS["GET_DOM_WITH_CONTENT_TYPE_PROMPT"])(get_dom_with_content_type)
         self.browser_nav_executor.register_for_execution()(get_dom_with_content_type)
 
+        self.agent.register_for_llm(description=LLM_PROMPTS["FIND_ELEMENTS_PROMPT"])(find_elements)
+        self.browser_nav_executor.register_for_execution()(find_elements)
+
         self.agent.register_for_llm(description=LLM_PROMPTS["CLICK_PROMPT"])(click_element)
         self.browser_nav_executor.register_for_execution()(click_element)
 
@@ -103,6 +108,9 @@ class BrowserNavAgent:
         self.agent.register_for_llm(description=LLM_PROMPTS["PRESS_KEY_COMBINATION_PROMPT"])(press_key_combination)
         self.browser_nav_executor.register_for_execution()(press_key_combination)
 
+        self.agent.register_for_llm(description=LLM_PROMPTS["ACTION_SEQUENCE_PROMPT"])(run_action_sequence)
+        self.browser_nav_executor.register_for_execution()(run_action_sequence)
+
         self.agent.register_for_llm(description=LLM_PROMPTS["EXTRACT_TEXT_FROM_PDF_PROMPT"])(extract_text_from_pdf)
         self.browser_nav_executor.register_for_execution()(extract_text_from_pdf)
         
@@ -10,8 +10,10 @@ from playwright.async_api import Playwright
 
 from ae.core.notification_manager import NotificationManager
 from ae.core.ui_manager import UIManager
+from ae.utils.dom_helper import get_element_by_selector
 from ae.utils.dom_mutation_observer import dom_mutation_change_detected
 from ae.utils.dom_mutation_observer import handle_navigation_for_mutation_observer
+from ae.utils.dom_settle import track_network_activity
 from ae.utils.js_helper import beautify_plan_message
 from ae.utils.js_helper import escape_js_message
 from ae.utils.logger import logger
@@ -107,6 +109,7 @@ class PlaywrightManager:
         await self.set_overlay_state_handler()
         await self.set_user_response_handler()
         await self.set_navigation_handler()
+        await self.set_network_activity_handler()
 
 
     async def start_playwright(self):
@@ -251,6 +254,10 @@ class PlaywrightManager:
         page.on("domcontentloaded", handle_navigation_for_mutation_observer) # type: ignore
         await page.expose_function("dom_mutation_change_detected", dom_mutation_change_detected) # type: ignore
 
+    async def set_network_activity_handler(self):
+        context = await self.get_browser_context()
+        track_network_activity(context) # type: ignore
+
     async def set_overlay_state_handler(self):
         logger.debug("Setting overlay state handler")
         context = await self.get_browser_context()
@@ -325,9 +332,12 @@ class PlaywrightManager:
     async def highlight_element(self, selector: str, add_highlight: bool):
         try:
             page: Page = await self.get_current_page()
+            element = await get_element_by_selector(page, selector)
+            if element is None:
+                return
             if add_highlight:
                 # Add the 'agente-ui-automation-highlight' class to the element. This class is used to apply the fading border.
-                await page.eval_on_selector(selector, '''e => {
+                await element.evaluate('''e => {
                             let originalBorderStyle = e.style.border;
                             e.classList.add('agente-ui-automation-highlight');
                             e.addEventListener('animationend', () => {
@@ -336,7 +346,7 @@ class PlaywrightManager:
                 logger.debug(f"Applied pulsating border to element with selector {selector} to indicate text entry operation")
             else:
                 # Remove the 'agente-ui-automation-highlight' class from the element.
-                await page.eval_on_selector(selector, "e => e.classList.remove('agente-ui-automation-highlight')")
+                await element.evaluate("e => e.classList.remove('agente-ui-automation-highlight')")
                 logger.debug(f"Removed pulsating border from element with selector {selector} after text entry operation")
         except Exception:
             # This is not significant enough to fail the operation
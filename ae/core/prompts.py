@@ -75,7 +75,7 @@ Some basic information about the user: $basic_user_information""",
    Individual function will reply with action success and if any changes were observed as a consequence. Adjust your approach based on this feedback.
    Once the task is completed or cannot be completed, return a short summary of the actions you performed to accomplish the task, and what worked and what did not. This should be followed by ##TERMINATE TASK##. Your reply will not contain any other information.
    Additionally, If task requires an answer, you will also provide a short and precise answer followed by ##TERMINATE TASK##.
-   Ensure that user questions are answered from the DOM and not from memory or assumptions. To answer a question about textual information on the page, prefer to use text_only DOM type. To answer a question about interactive elements, use all_fields DOM type.
+   Ensure that user questions are answered from the DOM and not from memory or assumptions. To answer a question about textual information on the page, prefer to use text_only DOM type. To answer a question about interactive elements, use all_fields DOM type. To find a single element to interact with (e.g. the search box), use find_elements first. When you know the mmids of several elements to act on in a row, use run_action_sequence to perform the actions in one step.
    Do not provide any mmid values in your response.
    Important: If you encounter an issues or is unsure how to proceed, simply ##TERMINATE TASK## and provide a detailed summary of the exact issue encountered.
    Do not repeat the same action multiple times if it fails. Instead, if something did not work after a few attempts, terminate the task.""",
@@ -108,9 +108,14 @@ Some basic information about the user: $basic_user_information""",
    # This one below had all three content types including input_fields
    "GET_DOM_WITH_CONTENT_TYPE_PROMPT": """Retrieves the DOM of the current web site based on the given content type.
    The DOM representation returned contains items ordered in the same way they appear on the page. Keep this in mind when executing user requests that contain ordinals or numbered items.
-   text_only - returns plain text representing all the text in the web site. Use this for any information retrieval task. This will contain the most complete textual information.
-   input_fields - returns a JSON string containing a list of objects representing text input html elements with mmid attribute. Use this strictly for interaction purposes with text input fields.
-   all_fields - returns a JSON string containing a list of objects representing all interactive elements and their attributes with mmid attribute. Use this strictly to identify and interact with any type of elements on page.
+   text_only - returns plain text representing all the text in the web site, main content first and navigation, headers, footers and ads last. Use this for any information retrieval task. This will contain the most complete textual information. Pass the information you are looking for as the query to get the most relevant text first, and the returned cursor to fetch more of the text.
+   input_fields - returns the text input html elements with their mmid attribute. Use this strictly for interaction purposes with text input fields.
+   all_fields - returns all interactive elements and their attributes with their mmid attribute. Use this strictly to identify and interact with any type of elements on page.
+   changed_fields - returns only the elements that were added, removed or changed (keyed by mmid) since the last all_fields or changed_fields call, or the full_dom if the page changed too much. Use this after an action on a page whose all_fields you already have.
+   viewport_fields - returns the interactive elements within a few screens of the current scroll position, followed by the cursor to fetch the next elements of the page. Use this on long or infinitely scrolling pages (e.g. search results, feeds), and pass the returned cursor to go through the rest of the page.
+   tables - returns the tables and grids of the page as a header line (columns:) and one line per row with the cells separated by |, prefixed by the mmid of the row, followed by the cursor to fetch the next rows of long tables. The mmids of the links and buttons of a cell follow its text. Use this to read or compare tabular data such as prices, schedules or specifications.
+   links - returns the distinct links of the page grouped by region (main, other, navigation, header, sidebar, footer), one per line as [mmid] "text" path, where path is the path of the links of the site and the full URL of the others. Use this to find the right product, article or page to navigate to.
+   input_fields, all_fields, changed_fields and viewport_fields list one element per line, nested elements are indented under their parent: [mmid] tag:type(role) "name" key=value ... where desc is the description, ph the placeholder, label the aria-label, val the value, note important information about the element and opts the options of a select as mmid:"text" (* marks the selected option). Elements without an mmid cannot be interacted with. Elements inside an Iframe have mmids such as 2.15, use them as they are in the selector (e.g. [mmid='2.15']). Repeated elements with the same structure (e.g. search results or products) are shown in full for the first few only, the others are collapsed into a group with one row per element: its mmid and the text that distinguishes it. Use all_fields with the expand given in the group to see them in full. Elements that are not displayed (e.g. closed menus, collapsed sections) are left out of input_fields and all_fields, pass include_hidden=true if an element you expect is missing.
    If information is not available in one content type, you must try another content_type.""",
 
 
@@ -118,6 +123,10 @@ Some basic information about the user: $basic_user_information""",
    The DOM representation returned contains items ordered in the same way they appear on the page. Keep this in mind when executing user requests that contain ordinals or numbered items.""",
 
 
+   "FIND_ELEMENTS_PROMPT": """Searches the current web page for the elements matching a short description, such as 'search box', 'Checkout button' or 'email field', and returns the few best matches with their mmid attribute, one per line, best first, in the same format as get_dom_with_content_type, with the form or section they are in and their match score.
+   Use this instead of get_dom_with_content_type when you only need to find a specific element to interact with. If none of the returned elements is the right one, use get_dom_with_content_type with all_fields.""",
+
+
    "CLICK_PROMPT": """Executes a click action on the element matching the given mmid attribute value. It is best to use mmid attribute as the selector.
    Returns Success if click was successful or appropriate error message if the element could not be clicked.""",
 
@@ -137,11 +146,17 @@ Some basic information about the user: $basic_user_information""",
 
    "BULK_ENTER_TEXT_PROMPT": """Bulk enter text in multiple DOM fields. To be used when there are multiple fields to be filled on the same page.
    Enters text in the DOM elements matching the given mmid attribute value.
-   The input will receive a list of objects containing the DOM query selector and the text to enter.
+   The input will receive a list of objects containing the DOM query selector and the text to enter. For a select element, the text is the option to select.
+   All the fields are filled in one step, without typing. Add 'use_keyboard': 'true' to an entry only if the field needs to be typed in key by key, e.g. when its text was not taken into account.
    This will only enter the text and not press enter or anything else.
    Returns each selector and the result for attempting to enter text.""",
 
 
+   "ACTION_SEQUENCE_PROMPT": """Executes several actions on the current web page in one step, in order: click, entertext, key (press a key such as Enter) and wait. Use this when you already know the mmids of all the elements involved, e.g. to fill a form, tick its checkboxes and submit it.
+   Mark with 'expect_change': 'true' the actions that should open a menu, show new elements or load a new page, such as the final submit. The sequence stops at the first action that fails or that changes the page unexpectedly, and reports the actions that were not executed, so that you can get the DOM again and continue.
+   Returns the result of each action executed.""",
+
+
    "PRESS_KEY_COMBINATION_PROMPT": """Presses the given key on the current web page.
    This is useful for pressing the enter button to submit a search query, PageDown to scroll, ArrowDown to change selection in a focussed list etc.""",
 
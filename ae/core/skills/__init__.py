@@ -1,3 +1,4 @@
+from ae.core.skills.action_sequence import run_action_sequence
 from ae.core.skills.click_using_selector import click
 from ae.core.skills.click_using_selector import do_click
 from ae.core.skills.click_using_selector import is_element_present
@@ -10,6 +11,7 @@ from ae.core.skills.enter_text_using_selector import bulk_enter_text
 from ae.core.skills.enter_text_using_selector import custom_fill_element
 from ae.core.skills.enter_text_using_selector import do_entertext
 
+from ae.core.skills.find_elements import find_elements
 from ae.core.skills.get_dom_with_content_type import get_dom_with_content_type
 from ae.core.skills.get_url import geturl
 from ae.core.skills.get_user_input import get_user_input
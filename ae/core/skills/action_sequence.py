@@ -0,0 +1,154 @@
+import asyncio
+import inspect
+from typing import Annotated
+from typing import List  # noqa: UP035
+
+from ae.core.playwright_manager import PlaywrightManager
+from ae.core.skills.click_using_selector import do_click
+from ae.core.skills.enter_text_using_selector import do_entertext
+from ae.core.skills.press_key_combination import do_press_key_combination
+from ae.utils.dom_mutation_observer import subscribe  # type: ignore
+from ae.utils.dom_mutation_observer import unsubscribe  # type: ignore
+from ae.utils.dom_settle import wait_for_dom_settled
+from ae.utils.logger import logger
+from ae.utils.ui_messagetype import MessageType
+
+ACTION_TYPES = ("click", "entertext", "key", "wait")
+
+# Longest wait action, in seconds
+MAX_WAIT_SECONDS = 10
+
+
+def __validate_action(action: dict[str, str]) -> str | None:
+    """
+    Returns what is wrong with an action, or None if it can be executed.
+    """
+    if not isinstance(action, dict):
+        return f"it must be an object with an 'action' key, got {type(action).__name__} {action!r}"
+    action_type = action.get("action")
+    if action_type not in ACTION_TYPES:
+        return f"unknown action \"{action_type}\", it must be one of {', '.join(ACTION_TYPES)}"
+    if action_type in ("click", "entertext") and not action.get("query_selector"):
+        return f"{action_type} needs a query_selector"
+    if action_type == "entertext" and "text" not in action:
+        return "entertext needs a text"
+    if action_type == "key" and not action.get("key"):
+        return "key needs a key, e.g. Enter"
+    if action_type == "wait":
+        try:
+            float(action.get("seconds") or 0)
+        except (TypeError, ValueError):
+            return "wait needs a number of seconds"
+    return None
+
+
+def __describe_action(action: dict[str, str]) -> str:
+    if action["action"] == "click":
+        return f"click {action['query_selector']}"
+    if action["action"] == "entertext":
+        return f"entertext \"{action['text']}\" in {action['query_selector']}"
+    if action["action"] == "key":
+        return f"key {action['key']}"
+    return f"wait {action.get('seconds') or 'for the page to settle'}"
+
+
+async def run_action_sequence(
+    actions: Annotated[List[dict[str, str]], "The actions to execute in order. Each one is an object with 'action' set to 'click' (with 'query_selector'), 'entertext' (with 'query_selector' and 'text'), 'key' (with 'key', e.g. 'Enter') or 'wait' (with 'seconds', or without it to wait for the page to settle). Add 'expect_change': 'true' to an action that is expected to open a menu, show new elements or load a new page."]  # noqa: UP006
+    ) -> Annotated[str, "The result of each action executed, and why the sequence stopped if it did."]:
+    """
+    Executes a sequence of actions on the current page back to back, in a single call, e.g. fill a few fields, tick a checkbox and submit.
+
+    After each action the page is left to settle (see wait_for_dom_settled). The sequence stops at the first action that fails,
+    or that makes new elements appear or the page navigate while it was not marked with 'expect_change', since the next actions
+    were planned on the page as it was. This is the skip on "as a consequence of this action" of the sequential function execution,
+    done without a round trip to the LLM for every action.
+
+    Parameters:
+    - actions: The actions to execute in order, see the annotation of the parameter.
+
+    Returns:
+    - One line per action executed with its result, followed by the reason the sequence stopped early and the actions that were not
+      executed, if it did.
+
+    Raises:
+    - ValueError: If no active page is found.
+    """
+    logger.info(f"Executing a sequence of {len(actions)} actions")
+    invalid_actions = [f"action {index + 1}: {error}" for index, action in enumerate(actions) if (error := __validate_action(action)) is not None]
+    if invalid_actions:
+        return "No action was executed, the sequence is invalid: " + "; ".join(invalid_actions)
+
+    browser_manager = PlaywrightManager(browser_type='chromium', headless=False)
+    page = await browser_manager.get_current_page()
+    if page is None: # type: ignore
+        raise ValueError('No active page found. OpenURL command opens a new page.')
+
+    function_name = inspect.currentframe().f_code.co_name # type: ignore
+    await browser_manager.take_screenshots(f"{function_name}_start", page)
+
+    dom_changes_detected=None
+    def detect_dom_changes(changes:str): # type: ignore
+        nonlocal dom_changes_detected
+        dom_changes_detected = changes # type: ignore
+
+    subscribe(detect_dom_changes)
+    results: list[str] = []
+    stop_reason: str | None = None
+    executed_count = 0
+    try:
+        for index, action in enumerate(actions):
+            description = __describe_action(action)
+            dom_changes_detected = None
+            url_before = page.url
+            action_failed = False
+            expects_change = str(action.get("expect_change", "")).lower() == "true"
+
+            if action["action"] == "click":
+                result = await do_click(page, action["query_selector"], 0.0, highlight=True)
+                action_failed = result["summary_message"].startswith("Unable")
+                message = result["summary_message"]
+                # The click reports the menus it opened itself
+                if not expects_change and "As a consequence a menu has appeared" in message:
+                    dom_changes_detected = dom_changes_detected or "a menu has appeared" # type: ignore
+            elif action["action"] == "entertext":
+                result = await do_entertext(page, action["query_selector"], action["text"], highlight=True)
+                action_failed = not result["summary_message"].startswith("Success")
+                message = result["summary_message"]
+            elif action["action"] == "key":
+                action_failed = not await do_press_key_combination(browser_manager, page, action["key"])
+                message = f"Key {action['key']} executed successfully" if not action_failed else f"Key {action['key']} could not be pressed"
+            else:
+                if action.get("seconds"):
+                    await asyncio.sleep(min(float(action["seconds"]), MAX_WAIT_SECONDS))
+                waited_time = await wait_for_dom_settled(page)
+                message = "Waited" + (f" {action['seconds']} seconds" if action.get("seconds") else f" {waited_time:.1f} seconds for the page to settle")
+
+            if action["action"] != "wait":
+                await wait_for_dom_settled(page)
+            executed_count = index + 1
+            results.append(f"{index + 1}. {description}: {message}")
+            await browser_manager.notify_user(message, message_type=MessageType.ACTION)
+
+            if action_failed:
+                stop_reason = f"Action {index + 1} failed."
+                break
+            if expects_change or action["action"] == "wait":
+                continue
+            if page.url != url_before:
+                stop_reason = f"As a consequence of this action, the page navigated to {page.url}."
+                break
+            if dom_changes_detected:
+                stop_reason = f"As a consequence of this action, new elements have appeared in view: {dom_changes_detected}."
+                break
+    finally:
+        unsubscribe(detect_dom_changes)
+    await browser_manager.take_screenshots(f"{function_name}_end", page)
+
+    if stop_reason is None:
+        return "\n".join(results + [f"All the {len(actions)} actions were executed."])
+    skipped_actions = [f"{index + 1}. {__describe_action(action)}" for index, action in enumerate(actions[executed_count:], start=executed_count)]
+    if skipped_actions:
+        stop_reason += f" The sequence stopped after action {executed_count}, the following actions were not executed: {'; '.join(skipped_actions)}."
+    if not stop_reason.startswith("Action"):
+        stop_reason += " Get all_fields DOM to continue the interaction."
+    return "\n".join(results + [stop_reason])
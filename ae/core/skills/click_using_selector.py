@@ -4,12 +4,16 @@ import traceback
 from typing import Annotated
 
 from playwright.async_api import ElementHandle
+from playwright.async_api import Frame
 from playwright.async_api import Page
 
 from ae.core.playwright_manager import PlaywrightManager
-from ae.utils.dom_helper import get_element_outer_html
+from ae.utils.dom_frames import resolve_selector_frame
+from ae.utils.dom_helper import describe_and_act_on_element
+from ae.utils.dom_helper import get_element_by_selector
 from ae.utils.dom_mutation_observer import subscribe  # type: ignore
 from ae.utils.dom_mutation_observer import unsubscribe  # type: ignore
+from ae.utils.dom_settle import wait_for_dom_settled
 from ae.utils.logger import logger
 from ae.utils.ui_messagetype import MessageType
 
@@ -40,16 +44,14 @@ async def click(selector: Annotated[str, "The properly formed query selector str
 
     await browser_manager.take_screenshots(f"{function_name}_start", page)
 
-    await browser_manager.highlight_element(selector, True)
-
     dom_changes_detected=None
     def detect_dom_changes(changes:str): # type: ignore
         nonlocal dom_changes_detected
         dom_changes_detected = changes # type: ignore
 
     subscribe(detect_dom_changes)
-    result = await do_click(page, selector, wait_before_execution)
-    await asyncio.sleep(0.1) # sleep for 100ms to allow the mutation observer to detect changes
+    result = await do_click(page, selector, wait_before_execution, highlight=True)
+    await wait_for_dom_settled(page) # let the mutation observer report the changes caused by the action
     unsubscribe(detect_dom_changes)
     await browser_manager.take_screenshots(f"{function_name}_end", page)
     await browser_manager.notify_user(result["summary_message"], message_type=MessageType.ACTION)
@@ -59,14 +61,18 @@ async def click(selector: Annotated[str, "The properly formed query selector str
     return result["detailed_message"]
 
 
-async def do_click(page: Page, selector: str, wait_before_execution: float) -> dict[str, str]:
+async def do_click(page: Page, selector: str, wait_before_execution: float, highlight: bool = False) -> dict[str, str]:
     """
     Executes the click action on the element with the given selector within the provided page.
 
+    The element is resolved, described, scrolled into view if needed and clicked in a single call into the page. The selector is only
+    waited for, with a second call, when the element is not in the page yet.
+
     Parameters:
     - page: The Playwright page instance.
     - selector: The query selector string to identify the element for the click action.
     - wait_before_execution: Optional wait time in seconds before executing the click event logic.
+    - highlight: Whether to highlight the element with the fading border. Defaults to False.
 
     Returns:
     dict[str,str] - Explanation of the outcome of this operation represented as a dictionary with 'summary_message' and 'detailed_message'.
@@ -77,52 +83,26 @@ async def do_click(page: Page, selector: str, wait_before_execution: float) -> d
     if wait_before_execution > 0:
         await asyncio.sleep(wait_before_execution)
 
-    # Wait for the selector to be present and ensure it's attached and visible. If timeout, try javascript click
     try:
-        logger.info(f"Executing ClickElement with \"{selector}\" as the selector. Waiting for the element to be attached and visible.")
-
-        element = await asyncio.wait_for(
-            page.wait_for_selector(selector, state="attached", timeout=2000),
-            timeout=2000
-        )
+        # Elements of child frames are routed to their frame
+        frame, frame_selector = resolve_selector_frame(page, selector)
+        # Playwright click seems to fail more often than not, the element is clicked with JavaScript
+        element = await describe_and_act_on_element(frame, frame_selector, "click", highlight=highlight)
+        if element is None:
+            logger.info(f"Element with selector: \"{selector}\" is not in the page yet. Waiting for it to be attached.")
+            await frame.wait_for_selector(frame_selector, state="attached", timeout=2000)
+            element = await describe_and_act_on_element(frame, frame_selector, "click", highlight=highlight)
         if element is None:
             raise ValueError(f"Element with selector: \"{selector}\" not found")
-
-        logger.info(f"Element with selector: \"{selector}\" is attached. scrolling it into view if needed.")
-        try:
-            await element.scroll_into_view_if_needed(timeout=200)
-            logger.info(f"Element with selector: \"{selector}\" is attached and scrolled into view. Waiting for the element to be visible.")
-        except Exception:
-            # If scrollIntoView fails, just move on, not a big deal
-            pass
-
-        try:
-            await element.wait_for_element_state("visible", timeout=200)
-            logger.info(f"Executing ClickElement with \"{selector}\" as the selector. Element is attached and visibe. Clicking the element.")
-        except Exception:
-            # If the element is not visible, try to click it anyway
-            pass
-
-        element_tag_name = await element.evaluate("element => element.tagName.toLowerCase()")
-        element_outer_html = await get_element_outer_html(element, page, element_tag_name)
-
-
-        if element_tag_name == "option":
-            element_value = await element.get_attribute("value") # get the text that is in the value of the option
-            parent_element = await element.evaluate_handle("element => element.parentNode")
-            # await parent_element.evaluate(f"element => element.select_option(value=\"{element_value}\")")
-            await parent_element.select_option(value=element_value) # type: ignore
-
-            logger.info(f'Select menu option "{element_value}" selected')
-
-            return {"summary_message": f'Select menu option "{element_value}" selected',
-                    "detailed_message": f'Select menu option "{element_value}" selected. The select element\'s outer HTML is: {element_outer_html}.'}
-
-
-        #Playwright click seems to fail more often than not, disabling it for now and just going with JS click
-        #await perform_playwright_click(element, selector)
-        msg = await perform_javascript_click(page, selector)
-        return {"summary_message": msg, "detailed_message": f"{msg} The clicked element's outer HTML is: {element_outer_html}."} # type: ignore
+        if not element["visible"]:
+            logger.info(f"Element with selector: \"{selector}\" was clicked although it is not visible.")
+
+        element_outer_html = element["opening_tag"]
+        msg = element["message"]
+        if element["tag"] == "option":
+            logger.info(f'Select menu option "{element["option_value"]}" selected')
+            return {"summary_message": msg, "detailed_message": f"{msg}. The select element\'s outer HTML is: {element_outer_html}."}
+        return {"summary_message": msg, "detailed_message": f"{msg} The clicked element's outer HTML is: {element_outer_html}."}
     except Exception as e:
         logger.error(f"Unable to click element with selector: \"{selector}\". Error: {e}")
         traceback.print_exc()
@@ -141,7 +121,7 @@ async def is_element_present(page: Page, selector: str) -> bool:
     Returns:
     - True if the element is present, False otherwise.
     """
-    element = await page.query_selector(selector)
+    element = await get_element_by_selector(page, selector)
     return element is not None
 
 
@@ -160,58 +140,24 @@ async def perform_playwright_click(element: ElementHandle, selector: str):
     await element.click(force=False, timeout=200)
 
 
-async def perform_javascript_click(page: Page, selector: str):
+async def perform_javascript_click(page: Page | Frame, selector: str):
     """
     Performs a click action on the element using JavaScript.
 
     Parameters:
-    - page: The Playwright page instance.
+    - page: The Playwright page instance, or the frame of the element.
     - selector: The query selector string of the element.
 
     Returns:
-    - None
+    - The message of the click, or None if it failed.
     """
-    js_code = """(selector) => {
-        let element = document.querySelector(selector);
-
-        if (!element) {
-            console.log(`perform_javascript_click: Element with selector ${selector} not found`);
-            return `perform_javascript_click: Element with selector ${selector} not found`;
-        }
-
-        if (element.tagName.toLowerCase() === "option") {
-            let value = element.text;
-            let parent = element.parentElement;
-
-            parent.value = element.value; // Directly set the value if possible
-            // Trigger change event if necessary
-            let event = new Event('change', { bubbles: true });
-            parent.dispatchEvent(event);
-
-            console.log("Select menu option", value, "selected");
-            return "Select menu option: "+ value+ " selected";
-        }
-        else {
-            console.log("About to click selector", selector);
-            // If the element is a link, make it open in the same tab
-            if (element.tagName.toLowerCase() === "a") {
-                element.target = "_self";
-            }
-            let ariaExpandedBeforeClick = element.getAttribute('aria-expanded');
-            element.click();
-            let ariaExpandedAfterClick = element.getAttribute('aria-expanded');
-            if (ariaExpandedBeforeClick === 'false' && ariaExpandedAfterClick === 'true') {
-                return "Executed JavaScript Click on element with selector: "+selector +". Very important: As a consequence a menu has appeared where you may need to make further selction. Very important: Get all_fields DOM to complete the action.";
-            }
-            return "Executed JavaScript Click on element with selector: "+selector;
-        }
-    }"""
     try:
         logger.info(f"Executing JavaScript click on element with selector: {selector}")
-        result:str = await page.evaluate(js_code, selector)
+        element = await describe_and_act_on_element(page, selector, "click")
+        if element is None:
+            return f"perform_javascript_click: Element with selector {selector} not found"
         logger.debug(f"Executed JavaScript Click on element with selector: {selector}")
-        return result
+        return element["message"]
     except Exception as e:
         logger.error(f"Error executing JavaScript click on element with selector: {selector}. Error: {e}")
         traceback.print_exc()
-
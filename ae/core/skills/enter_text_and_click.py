@@ -1,4 +1,3 @@
-import asyncio
 import inspect
 from typing import Annotated
 
@@ -6,6 +5,7 @@ from ae.core.playwright_manager import PlaywrightManager
 from ae.core.skills.click_using_selector import do_click
 from ae.core.skills.enter_text_using_selector import do_entertext
 from ae.core.skills.press_key_combination import do_press_key_combination
+from ae.utils.dom_settle import wait_for_dom_settled
 from ae.utils.logger import logger
 from ae.utils.ui_messagetype import MessageType
 
@@ -45,12 +45,10 @@ async def enter_text_and_click(
         logger.error("No active page found")
         raise ValueError('No active page found. OpenURL command opens a new page.')
 
-    await browser_manager.highlight_element(text_selector, True)
-
     function_name = inspect.currentframe().f_code.co_name # type: ignore
     await browser_manager.take_screenshots(f"{function_name}_start", page)
 
-    text_entry_result = await do_entertext(page, text_selector, text_to_enter, use_keyboard_fill=True)
+    text_entry_result = await do_entertext(page, text_selector, text_to_enter, use_keyboard_fill=True, highlight=True)
 
     #await browser_manager.notify_user(text_entry_result["summary_message"])
     if not text_entry_result["summary_message"].startswith("Success"):
@@ -69,13 +67,11 @@ async def enter_text_and_click(
             result["detailed_message"] += f" Clicking the same element after entering text in it, is of no value. Tried pressing the Enter key on element \"{click_selector}\" instead of click and failed."
             await browser_manager.notify_user("Failed to press the Enter key on element \"{click_selector}\".", message_type=MessageType.ACTION)
     else:
-        await browser_manager.highlight_element(click_selector, True)
-
-        do_click_result = await do_click(page, click_selector, wait_before_click_execution)
+        do_click_result = await do_click(page, click_selector, wait_before_click_execution, highlight=True)
         result["detailed_message"] += f' {do_click_result["detailed_message"]}'
         #await browser_manager.notify_user(do_click_result["summary_message"])
 
-    await asyncio.sleep(0.1) # sleep for 100ms to allow the mutation observer to detect changes
+    await wait_for_dom_settled(page) # let the mutation observer report the changes caused by the action
 
     await browser_manager.take_screenshots(f"{function_name}_end", page)
 
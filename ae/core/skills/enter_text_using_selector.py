@@ -1,18 +1,29 @@
-import asyncio
 import inspect
 import traceback
 from dataclasses import dataclass
 from typing import Annotated
 from typing import List  # noqa: UP035
 
+from playwright.async_api import Frame
 from playwright.async_api import Page
 
 from ae.core.playwright_manager import PlaywrightManager
 from ae.core.skills.press_key_combination import press_key_combination
-from ae.utils.dom_helper import get_element_outer_html
+from ae.utils.dom_fill import do_bulk_fill
+from ae.utils.dom_fill import FILL_FILLED
+from ae.utils.dom_fill import FILL_NEEDS_KEYBOARD
+from ae.utils.dom_fill import FILL_NO_OPTION
+from ae.utils.dom_fill import FILL_NOT_EDITABLE
+from ae.utils.dom_frames import resolve_selector_frame
+from ae.utils.dom_helper import describe_and_act_on_element
 from ae.utils.dom_mutation_observer import subscribe
 from ae.utils.dom_mutation_observer import unsubscribe
+from ae.utils.dom_settle import wait_for_dom_settled
 from ae.utils.logger import logger
+from ae.utils.text_entry import get_text_entry_strategies
+from ae.utils.text_entry import remember_text_entry_strategy
+from ae.utils.text_entry import STRATEGY_KEYBOARD
+from ae.utils.text_entry import try_fast_text_entry
 from ae.utils.ui_messagetype import MessageType
 
 
@@ -38,7 +49,7 @@ class EnterTextEntry:
             raise KeyError(f"{key} is not a valid key")
 
 
-async def custom_fill_element(page: Page, selector: str, text_to_enter: str):
+async def custom_fill_element(page: Page | Frame, selector: str, text_to_enter: str):
     """
     Sets the value of a DOM element to a specified text without triggering keyboard input events.
 
@@ -48,7 +59,7 @@ async def custom_fill_element(page: Page, selector: str, text_to_enter: str):
     especially in automated testing scenarios where speed and accuracy are paramount.
 
     Args:
-        page (Page): The Playwright Page object representing the browser tab in which the operation will be performed.
+        page (Page | Frame): The Playwright Page object representing the browser tab in which the operation will be performed, or the frame of the element.
         selector (str): The CSS selector string used to locate the target DOM element. The function will apply the
                         text change to the first element that matches this selector.
         text_to_enter (str): The text value to be set in the target element. Existing content will be overwritten.
@@ -67,7 +78,9 @@ async def custom_fill_element(page: Page, selector: str, text_to_enter: str):
             const selector = inputParams.selector;
             let text_to_enter = inputParams.text_to_enter;
             text_to_enter = text_to_enter.trim();
-            const element = document.querySelector(selector);
+            // Also finds the elements of the open shadow roots registered by the mmid injection
+            const querySelector = window.__agente_query_selector || ((selector) => document.querySelector(selector));
+            const element = querySelector(selector);
             if (!element) {
                 throw new Error(`Element not found: ${selector}`);
             }
@@ -125,8 +138,6 @@ async def entertext(entry: Annotated[EnterTextEntry, "An object containing 'quer
 
     await browser_manager.take_screenshots(f"{function_name}_start", page)
 
-    await browser_manager.highlight_element(query_selector, True)
-
     dom_changes_detected=None
     def detect_dom_changes(changes:str): # type: ignore
         nonlocal dom_changes_detected
@@ -134,22 +145,8 @@ async def entertext(entry: Annotated[EnterTextEntry, "An object containing 'quer
 
     subscribe(detect_dom_changes)
 
-    await page.evaluate(
-        """
-        (selector) => {
-            const element = document.querySelector(selector);
-            if (element) {
-                element.value = '';
-            } else {
-                console.error('Element not found:', selector);
-            }
-        }
-        """,
-        query_selector,
-    )
-
-    result = await do_entertext(page, query_selector, text_to_enter)
-    await asyncio.sleep(0.1) # sleep for 100ms to allow the mutation observer to detect changes
+    result = await do_entertext(page, query_selector, text_to_enter, highlight=True)
+    await wait_for_dom_settled(page) # let the mutation observer report the changes caused by the action
     unsubscribe(detect_dom_changes)
 
     await browser_manager.take_screenshots(f"{function_name}_end", page)
@@ -160,12 +157,13 @@ async def entertext(entry: Annotated[EnterTextEntry, "An object containing 'quer
     return result["detailed_message"]
 
 
-async def do_entertext(page: Page, selector: str, text_to_enter: str, use_keyboard_fill: bool=True):
+async def do_entertext(page: Page, selector: str, text_to_enter: str, use_keyboard_fill: bool=True, highlight: bool=False):
     """
     Performs the text entry operation on a DOM element.
 
     This function performs the text entry operation on a DOM element identified by the given CSS selector.
-    It applies a pulsating border effect to the element during the operation for visual feedback.
+    The element is resolved, described, cleared and focused in a single call into the page, which can also apply
+    a pulsating border effect to the element for visual feedback.
     The function supports both direct setting of the 'value' property and simulating keyboard typing.
 
     Args:
@@ -174,6 +172,7 @@ async def do_entertext(page: Page, selector: str, text_to_enter: str, use_keyboa
         text_to_enter (str): The text value to be set in the target element. Existing content will be overwritten.
         use_keyboard_fill (bool, optional): Determines whether to simulate keyboard typing or not.
                                             Defaults to False.
+        highlight (bool, optional): Whether to highlight the element. Defaults to False.
 
     Returns:
         dict[str, str]: Explanation of the outcome of this operation represented as a dictionary with 'summary_message' and 'detailed_message'.
@@ -183,35 +182,42 @@ async def do_entertext(page: Page, selector: str, text_to_enter: str, use_keyboa
 
     Note:
         - The 'use_keyboard_fill' parameter determines whether to simulate keyboard typing or not.
-        - If 'use_keyboard_fill' is set to True, the function uses the 'page.keyboard.type' method to enter the text.
+        - If 'use_keyboard_fill' is set to True, the text is entered with the first strategy of get_text_entry_strategies that works:
+          a CDP Input.insertText, the native value setter with input events, and the 'page.keyboard.type' method as the fallback.
         - If 'use_keyboard_fill' is set to False, the function uses the 'custom_fill_element' method to enter the text.
     """
     try:
 
         logger.debug(f"Looking for selector {selector} to enter text: {text_to_enter}")
 
-        elem = await page.query_selector(selector)
+        # Elements of child frames are routed to their frame, the keyboard of the page types in the focused frame
+        frame, frame_selector = resolve_selector_frame(page, selector)
+        element = await describe_and_act_on_element(frame, frame_selector, "focus", highlight=highlight, clear=True)
 
-        if elem is None:
+        if element is None:
             error = f"Error: Selector {selector} not found. Unable to continue."
             return {"summary_message": error, "detailed_message": error}
 
         logger.info(f"Found selector {selector} to enter text")
-        element_outer_html = await get_element_outer_html(elem, page)
+        element_outer_html = element["opening_tag"]
 
         if use_keyboard_fill:
-            await elem.focus()
-            await asyncio.sleep(0.1)
-            await press_key_combination("Control+A")
-            await asyncio.sleep(0.1)
-            await press_key_combination("Backspace")
-            await asyncio.sleep(0.1)
-            logger.debug(f"Focused element with selector {selector} to enter text")
-            #add a 100ms delay
-            await page.keyboard.type(text_to_enter, delay=1)
+            # Typing key by key is the last resort, the strategy that works for this kind of field of the site is tried first
+            for strategy in get_text_entry_strategies(page, element):
+                if strategy == STRATEGY_KEYBOARD:
+                    await wait_for_dom_settled(page)
+                    # The key presses wait for the DOM to settle themselves
+                    await press_key_combination("Control+A")
+                    await press_key_combination("Backspace")
+                    logger.debug(f"Focused element with selector {selector} to enter text")
+                    await page.keyboard.type(text_to_enter, delay=1)
+                elif not await try_fast_text_entry(page, frame, frame_selector, text_to_enter, strategy):
+                    continue
+                remember_text_entry_strategy(page, element, strategy)
+                logger.debug(f"Entered text in the element with selector {selector} with the {strategy} strategy")
+                break
         else:
-            await custom_fill_element(page, selector, text_to_enter)
-        await elem.focus()
+            await custom_fill_element(frame, frame_selector, text_to_enter)
         logger.info(f"Success. Text \"{text_to_enter}\" set successfully in the element with selector {selector}")
         success_msg = f"Success. Text \"{text_to_enter}\" set successfully in the element with selector {selector}"
         return {"summary_message": success_msg, "detailed_message": f"{success_msg} and outer HTML: {element_outer_html}."}
@@ -223,17 +229,21 @@ async def do_entertext(page: Page, selector: str, text_to_enter: str, use_keyboa
 
 
 async def bulk_enter_text(
-    entries: Annotated[List[dict[str, str]], "List of objects, each containing 'query_selector' and 'text'."]  # noqa: UP006
+    entries: Annotated[List[dict[str, str]], "List of objects, each containing 'query_selector' and 'text'. Add 'use_keyboard': 'true' to an entry to type its text key by key."]  # noqa: UP006
 ) -> Annotated[List[dict[str, str]], "List of dictionaries, each containing 'query_selector' and the result of the operation."]:  # noqa: UP006
     """
     Enters text into multiple DOM elements using a bulk operation.
 
     This function enters text into multiple DOM elements using a bulk operation.
     It takes a list of dictionaries, where each dictionary contains a 'query_selector' and 'text' pair.
-    The function internally calls the 'entertext' function to perform the text entry operation for each entry.
+    The fields of each frame are validated and filled in a single call into the page (see do_bulk_fill), as a user would fill them
+    but without typing. Only the fields that need real keystrokes (autocomplete, contenteditable, masked inputs, or flagged with
+    'use_keyboard') are typed with do_entertext, after the others. Select fields whose option is not there yet, e.g. a state that
+    depends on the country filled before it, are tried once more after the page settled.
+    The changes of the DOM caused by the whole operation are collected once, at the end.
 
     Args:
-        entries: List of objects, each containing 'query_selector' and 'text'.
+        entries: List of objects, each containing 'query_selector' and 'text', and optionally 'use_keyboard'.
 
     Returns:
         List of dictionaries, each containing 'query_selector' and the result of the operation.
@@ -248,16 +258,86 @@ async def bulk_enter_text(
     Note:
         - Each entry in the 'entries' list should be a dictionary with 'query_selector' and 'text' keys.
         - The result is a list of dictionaries, where each dictionary contains the 'query_selector' and the result of the operation.
+        - The new elements that appeared are reported in the result of the last entry.
     """
-
-    results: List[dict[str, str]] = []  # noqa: UP006
     logger.info("Executing bulk Enter Text Command")
-    for entry in entries:
-        query_selector = entry['query_selector']
-        text_to_enter = entry['text']
-        logger.info(f"Entering text: {text_to_enter} in element with selector: {query_selector}")
-        result = await entertext(EnterTextEntry(query_selector=query_selector, text=text_to_enter))
+    browser_manager = PlaywrightManager(browser_type='chromium', headless=False)
+    page = await browser_manager.get_current_page()
+    if page is None: # type: ignore
+        return [{"query_selector": entry['query_selector'], "result": "Error: No active page found. OpenURL command opens a new page."} for entry in entries]
+
+    function_name = inspect.currentframe().f_code.co_name # type: ignore
+    await browser_manager.take_screenshots(f"{function_name}_start", page)
+
+    dom_changes_detected=None
+    def detect_dom_changes(changes:str): # type: ignore
+        nonlocal dom_changes_detected
+        dom_changes_detected = changes # type: ignore
+
+    subscribe(detect_dom_changes)
+
+    entry_results: dict[int, str] = {}
+    keyboard_indexes: list[int] = []
+    fields_by_frame: dict[Page | Frame, list[tuple[int, str]]] = {}
+    for index, entry in enumerate(entries):
+        try:
+            frame, frame_selector = resolve_selector_frame(page, entry['query_selector'])
+        except ValueError as e:
+            entry_results[index] = f"Error: {e}"
+            continue
+        if str(entry.get('use_keyboard', '')).lower() == 'true':
+            keyboard_indexes.append(index)
+        else:
+            fields_by_frame.setdefault(frame, []).append((index, frame_selector))
+
+    for attempt in range(2):
+        retry_fields_by_frame: dict[Page | Frame, list[tuple[int, str]]] = {}
+        for frame, frame_fields in fields_by_frame.items():
+            try:
+                fill_results = await do_bulk_fill(frame, [{"selector": frame_selector, "text": entries[index]['text']} for index, frame_selector in frame_fields],
+                                                  highlight=True)
+                if len(fill_results) != len(frame_fields):
+                    raise ValueError(f"The page returned {len(fill_results)} results for {len(frame_fields)} fields")
+            except Exception as e:
+                traceback.print_exc()
+                for index, _ in frame_fields:
+                    entry_results[index] = f"Error entering text in selector {entries[index]['query_selector']}. Error: {e}"
+                continue
+            for (index, frame_selector), fill_result in zip(frame_fields, fill_results, strict=True):
+                query_selector, text_to_enter = entries[index]['query_selector'], entries[index]['text']
+                status = fill_result["status"]
+                if status == FILL_FILLED:
+                    entry_results[index] = f"Success. Text \"{text_to_enter}\" set successfully in the element with selector {query_selector} and outer HTML: {fill_result['opening_tag']}."
+                elif status == FILL_NEEDS_KEYBOARD:
+                    keyboard_indexes.append(index)
+                elif status == FILL_NO_OPTION and attempt == 0:
+                    retry_fields_by_frame.setdefault(frame, []).append((index, frame_selector))
+                elif status == FILL_NO_OPTION:
+                    entry_results[index] = f"Error: The select element with selector {query_selector} has no option \"{text_to_enter}\". Outer HTML: {fill_result['opening_tag']}."
+                elif status == FILL_NOT_EDITABLE:
+                    entry_results[index] = f"Error: The element with selector {query_selector} is disabled or read only. Outer HTML: {fill_result['opening_tag']}."
+                else:
+                    entry_results[index] = f"Error: Selector {query_selector} not found. Unable to continue."
+        if not retry_fields_by_frame:
+            break
+        # The options of a select can depend on the fields filled before it
+        await wait_for_dom_settled(page)
+        fields_by_frame = retry_fields_by_frame
+
+    for index in sorted(keyboard_indexes):
+        query_selector, text_to_enter = entries[index]['query_selector'], entries[index]['text']
+        logger.info(f"Typing text: {text_to_enter} in element with selector: {query_selector}")
+        result = await do_entertext(page, query_selector, text_to_enter, highlight=True)
+        entry_results[index] = result["detailed_message"]
+
+    await wait_for_dom_settled(page) # let the mutation observer report the changes caused by the whole operation
+    unsubscribe(detect_dom_changes)
+    await browser_manager.take_screenshots(f"{function_name}_end", page)
 
-        results.append({"query_selector": query_selector, "result": result})
+    filled_count = sum(result.startswith("Success") for result in entry_results.values())
+    await browser_manager.notify_user(f"Entered text in {filled_count} of {len(entries)} fields", message_type=MessageType.ACTION)
 
+    results: List[dict[str, str]] = [{"query_selector": entry['query_selector'], "result": entry_results[index]} for index, entry in enumerate(entries)]  # noqa: UP006
+    if dom_changes_detected and results:
+        results[-1]["result"] += f"\n As a consequence of this action, new elements have appeared in view: {dom_changes_detected}. This means that entering the text of the fields may need further interaction. Get all_fields DOM to complete the interaction."
     return results
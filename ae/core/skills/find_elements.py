@@ -0,0 +1,53 @@
+import time
+from typing import Annotated
+from typing import Any
+
+from ae.core.playwright_manager import PlaywrightManager
+from ae.utils.dom_search import do_find_elements
+from ae.utils.dom_serializer import format_node
+from ae.utils.dom_serializer import is_compact_output_enabled
+from ae.utils.logger import logger
+from ae.utils.ui_messagetype import MessageType
+
+
+async def find_elements(
+    query: Annotated[str, "What to look for, e.g. 'search box', 'Checkout button' or 'email'. Matched against the label, placeholder and text of the elements, tolerating typos."],
+    role: Annotated[str | None, "Only return elements of this role, e.g. 'button', 'link', 'textbox', 'checkbox', 'combobox'. Omit it to search all the elements."] = None,
+    top_k: Annotated[int, "The maximum number of elements to return."] = 5
+    ) -> Annotated[list[dict[str, Any]] | str, "The best matching elements with their mmids, best first."]:
+    """
+    Searches the current page for the elements that best match a text query, without extracting the DOM.
+
+    The matching runs inside the page, over the accessible name, placeholder, aria-label, inner text, title, name and id of the visible
+    elements, and only the best candidates are returned.
+
+    Parameters:
+    - query: What to look for. Words naming a role (e.g. 'button', 'box', 'link') favour the elements of that role.
+    - role: Optional role the elements must have.
+    - top_k: The maximum number of elements to return. Defaults to 5.
+
+    Returns:
+    - One line per element in the compact format of get_dom_with_content_type, with the context it is in (e.g. its form or dialog) and its
+      match score, or a list of JSON objects when DOM_OUTPUT_FORMAT is set to 'json'. A message if nothing matches.
+
+    Raises:
+    - ValueError: If no active page is found.
+    """
+    logger.info(f"Executing find_elements with query: {query}, role: {role}, top_k: {top_k}")
+    start_time = time.time()
+    browser_manager = PlaywrightManager(browser_type='chromium', headless=False)
+    page = await browser_manager.get_current_page()
+    if page is None: # type: ignore
+        raise ValueError('No active page found. OpenURL command opens a new page.')
+
+    candidates = await do_find_elements(page, query, role, top_k)
+    if candidates is None:
+        return "Could not search the elements of the page. Please consider using get_dom_with_content_type with all_fields."
+    if not candidates:
+        return f"No element matches '{query}'. Try other words, or get_dom_with_content_type with all_fields."
+
+    logger.info(f"find_elements executed in {time.time() - start_time} seconds")
+    await browser_manager.notify_user(f"Found {len(candidates)} elements matching \"{query}\"", message_type=MessageType.ACTION)
+    if not is_compact_output_enabled():
+        return candidates
+    return "\n".join(format_node(candidate) for candidate in candidates)
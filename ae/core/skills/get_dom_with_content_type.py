@@ -5,16 +5,39 @@ from typing import Any
 
 from playwright.async_api import Page
 
-from ae.config import SOURCE_LOG_FOLDER_PATH
 from ae.core.playwright_manager import PlaywrightManager
+from ae.utils.debug_artifacts import debug_artifacts
 from ae.utils.dom_helper import wait_for_non_loading_dom_state
+from ae.utils.dom_links import do_get_links
+from ae.utils.dom_links import serialize_links
+from ae.utils.dom_offload import count_nodes
+from ae.utils.dom_offload import get_offload_target
+from ae.utils.dom_offload import run_offloaded
+from ae.utils.dom_serializer import get_dom_token_budget
+from ae.utils.dom_serializer import is_compact_output_enabled
+from ae.utils.dom_serializer import serialize_compact
+from ae.utils.dom_serializer import serialize_compact_delta
+from ae.utils.dom_serializer import serialize_compact_window
+from ae.utils.dom_tables import do_get_tables
+from ae.utils.dom_tables import serialize_tables
+from ae.utils.dom_templates import collapse_repeated_subtrees
+from ae.utils.dom_templates import expand_collapsed_group
+from ae.utils.dom_templates import get_collapse_keep_count
+from ae.utils.dom_text_blocks import get_text_blocks
+from ae.utils.dom_text_blocks import select_text_blocks
+from ae.utils.get_detailed_accessibility_tree import do_get_accessibility_delta
 from ae.utils.get_detailed_accessibility_tree import do_get_accessibility_info
+from ae.utils.get_detailed_accessibility_tree import do_get_viewport_accessibility_info
 from ae.utils.logger import logger
 from ae.utils.ui_messagetype import MessageType
 
 
 async def get_dom_with_content_type(
-    content_type: Annotated[str, "The type of content to extract: 'text_only': Extracts the innerText of the highest element in the document and responds with text, or 'input_fields': Extracts the text input and button elements in the dom."]
+    content_type: Annotated[str, "The type of content to extract: 'text_only': Extracts the text of the page, main content first, and responds with text, or 'input_fields': Extracts the text input and button elements in the dom, or 'changed_fields': Extracts only the fields that changed since the last all_fields or changed_fields call, or 'viewport_fields': Extracts the fields around the current scroll position, or 'tables': Extracts the tables of the page as rows of cells, or 'links': Extracts the distinct links of the page grouped by region."],
+    cursor: Annotated[int | None, "Only for 'viewport_fields', 'text_only' and 'tables': the cursor returned by the previous call with the same content type to fetch the next (or previous) elements, text or rows of the page. Omit it to start from the current scroll position, or from the beginning of the text or of the tables."] = None,
+    expand: Annotated[str | None, "Only for 'all_fields': the id of a group of collapsed elements (e.g. expand=245 in the group) to fetch these elements in full. Omit it to fetch all the fields."] = None,
+    query: Annotated[str | None, "Only for 'text_only': the information you are looking for, e.g. 'return policy refund days'. The blocks of text that match it best are returned first. Omit it to get the text in page order."] = None,
+    include_hidden: Annotated[bool, "Only for 'all_fields' and 'input_fields': set it to true to also get the elements that are not displayed (e.g. closed menus, collapsed sections, hidden dialogs). They are left out by default."] = False
     ) -> Annotated[dict[str, Any] | str | None, "The output based on the specified content type."]:
     """
     Retrieves and processes the DOM of the active page in a browser instance based on the specified content type.
@@ -23,17 +46,47 @@ async def get_dom_with_content_type(
     ----------
     content_type : str
         The type of content to extract. Possible values are:
-        - 'text_only': Extracts the innerText of the highest element in the document and responds with text.
-        - 'input_fields': Extracts the text input and button elements in the DOM and responds with a JSON object.
-        - 'all_fields': Extracts all the fields in the DOM and responds with a JSON object.
+        - 'text_only': Extracts the visible text of the page as blocks, main content before navigation, headers, footers and ads, and
+          responds with the blocks that fit in DOM_TOKEN_BUDGET followed by the cursor to fetch the next ones.
+        - 'input_fields': Extracts the text input and button elements in the DOM and responds with a compact text, one element per line.
+        - 'all_fields': Extracts all the fields in the DOM and responds with a compact text, one element per line. Runs of elements
+          with the same structure (e.g. search results) are collapsed after the first DOM_COLLAPSE_KEEP into a group of one row per element.
+        - 'changed_fields': Extracts only the fields that were added, removed or changed since the last 'all_fields' or 'changed_fields'
+          call and responds with a compact text. Falls back to all the fields when the change is too big to be useful.
+        - 'viewport_fields': Extracts the fields within DOM_VIEWPORT_COUNT viewports of the current scroll position, or of the cursor,
+          and responds with a compact text that ends with the cursors to fetch the next and previous elements of the page.
+        - 'tables': Extracts the HTML tables and ARIA tables and grids of the page and responds with their header and rows, one row per
+          line with the cells separated by ' | '. Up to DOM_TABLE_MAX_ROWS rows are returned, followed by the cursor to fetch the next ones.
+        - 'links': Extracts the visible links of the page, deduped by normalized URL and grouped by region (main content, navigation,
+          header, sidebar, footer), and responds with one `[mmid] "text" path` line per link, up to DOM_LINKS_MAX links.
+        The fields are returned as JSON objects instead of the compact text when DOM_OUTPUT_FORMAT is set to 'json'.
+    cursor : int | None
+        Only used with 'viewport_fields', 'text_only' and 'tables', as returned by the previous call with the same content type. For 'viewport_fields',
+        the vertical position in the page, in pixels, where the extracted window starts. Defaults to None, which starts the window at the
+        current scroll position. For 'text_only', the number of text blocks already returned. Defaults to None, which starts from the first block.
+        For 'tables', the number of rows already returned. Defaults to None, which starts from the first row.
+    expand : str | None
+        Only used with 'all_fields'. The id of a group of repeated elements that were collapsed into rows, to extract these elements in full.
+        Defaults to None, which extracts all the fields with the repeated elements beyond the first DOM_COLLAPSE_KEEP collapsed.
+    query : str | None
+        Only used with 'text_only'. The query the text blocks are ranked against with BM25, best match first. Defaults to None, which keeps
+        the page order.
+    include_hidden : bool
+        Only used with 'all_fields' and 'input_fields'. Whether the elements that are not rendered (display none, visibility hidden, inert,
+        aria-hidden, without size or off the document) are extracted too. Defaults to False, which prunes them before they are reconciled
+        with the DOM, unless DOM_PRUNE_HIDDEN is disabled.
 
     Returns
     -------
     dict[str, Any] | str | None
         The processed content based on the specified content type. This could be:
-        - A JSON object for 'input_fields' with just inputs.
-        - Plain text for 'text_only'.
-        - A minified DOM represented as a JSON object for 'all_fields'.
+        - The compact DOM (or a JSON object) for 'input_fields' with just inputs.
+        - Plain text for 'text_only', followed by the cursor of the next blocks.
+        - The compact DOM (or a minified DOM represented as a JSON object) for 'all_fields'.
+        - The compact changes (or a JSON object with either the 'changes' or the 'full_dom') for 'changed_fields'.
+        - The compact DOM of the window followed by its cursors (or a JSON object with the 'tree' and the cursors) for 'viewport_fields'.
+        - The compact rows of the tables followed by the cursor of the next rows (or a JSON object with the 'tables') for 'tables'.
+        - The compact links by region (or a JSON object with the [mmid, text, path] lists of each region) for 'links'.
 
     Raises
     ------
@@ -43,6 +96,7 @@ async def get_dom_with_content_type(
 
     logger.info(f"Executing Get DOM Command based on content_type: {content_type}")
     start_time = time.time()
+    token_budget = get_dom_token_budget()
     # Create and use the PlaywrightManager
     browser_manager = PlaywrightManager(browser_type='chromium', headless=False)
     page = await browser_manager.get_current_page()
@@ -54,30 +108,100 @@ async def get_dom_with_content_type(
     user_success_message = ""
     if content_type == 'all_fields':
         user_success_message = "Fetched all the fields in the DOM"
-        extracted_data = await do_get_accessibility_info(page, only_input_fields=False)
+        extracted_data = await do_get_accessibility_info(page, only_input_fields=False, include_hidden=include_hidden)
+        if extracted_data is not None and expand is not None:
+            logger.debug(f'Expanding the collapsed group {expand}')
+            extracted_data = expand_collapsed_group(extracted_data, expand, get_collapse_keep_count())
+            if extracted_data is None:
+                return f"There is no collapsed group {expand} in the page anymore. Fetch all_fields again."
+            user_success_message = "Fetched the collapsed fields in the DOM"
+        elif extracted_data is not None:
+            extracted_data, _ = await run_offloaded(get_offload_target(count_nodes(extracted_data)), collapse_repeated_subtrees,
+                                                    extracted_data, get_collapse_keep_count())
     elif content_type == 'input_fields':
         logger.debug('Fetching DOM for input_fields')
-        extracted_data = await do_get_accessibility_info(page, only_input_fields=True)
+        extracted_data = await do_get_accessibility_info(page, only_input_fields=True, include_hidden=include_hidden)
         if extracted_data is None:
             return "Could not fetch input fields. Please consider trying with content_type all_fields."
         user_success_message = "Fetched only input fields in the DOM"
+    elif content_type == 'changed_fields':
+        logger.debug('Fetching DOM for changed_fields')
+        extracted_data = await do_get_accessibility_delta(page)
+        if extracted_data is None:
+            return "Could not fetch the changed fields. Please consider trying with content_type all_fields."
+        user_success_message = "Fetched the changed fields in the DOM" if "changes" in extracted_data else "Fetched all the fields in the DOM"
+        if "full_dom" in extracted_data:
+            full_dom, _ = await run_offloaded(get_offload_target(count_nodes(extracted_data["full_dom"])), collapse_repeated_subtrees,
+                                              extracted_data["full_dom"], get_collapse_keep_count())
+            extracted_data = {**extracted_data, "full_dom": full_dom}
+    elif content_type == 'viewport_fields':
+        logger.debug(f'Fetching DOM for viewport_fields, cursor: {cursor}')
+        extracted_data = await do_get_viewport_accessibility_info(page, cursor, float(os.getenv("DOM_VIEWPORT_COUNT", "2")))
+        if extracted_data is None:
+            return "Could not fetch the fields around the scroll position. Please consider trying with content_type all_fields."
+        user_success_message = "Fetched the fields around the scroll position in the DOM"
+    elif content_type == 'tables':
+        logger.debug(f'Fetching DOM for tables, cursor: {cursor}')
+        extracted_data = await do_get_tables(page, cursor)
+        if extracted_data is None:
+            return "Could not fetch the tables. Please consider trying with content_type all_fields."
+        user_success_message = "Fetched the tables in the DOM"
+    elif content_type == 'links':
+        logger.debug('Fetching DOM for links')
+        extracted_data = await do_get_links(page)
+        if extracted_data is None:
+            return "Could not fetch the links. Please consider trying with content_type all_fields."
+        user_success_message = "Fetched the links in the DOM"
     elif content_type == 'text_only':
         # Extract text from the body or the highest-level element
-        logger.debug('Fetching DOM for text_only')
-        text_content = await get_filtered_text_content(page)
-        with open(os.path.join(SOURCE_LOG_FOLDER_PATH, 'text_only_dom.txt'), 'w',  encoding='utf-8') as f:
-            f.write(text_content)
-        extracted_data = text_content
+        logger.debug(f'Fetching DOM for text_only, cursor: {cursor}, query: {query}')
+        text_blocks = await get_text_blocks(page)
+        if text_blocks:
+            debug_artifacts.write('text_only_dom.txt', lambda: "\n".join(block["text"] for block in text_blocks))
+            extracted_data = format_text_blocks(select_text_blocks(text_blocks, query, cursor, token_budget), cursor, query)
+        else:
+            # Pages without text blocks, e.g. with their content in a shadow DOM or a canvas, fall back to the innerText of the page
+            text_content = await get_filtered_text_content(page)
+            debug_artifacts.write('text_only_dom.txt', lambda: text_content)
+            extracted_data = text_content
         user_success_message = "Fetched the text content of the DOM"
     else:
         raise ValueError(f"Unsupported content_type: {content_type}")
 
+    if content_type != 'text_only' and extracted_data is not None and is_compact_output_enabled():
+        if content_type == 'changed_fields':
+            extracted_data = serialize_compact_delta(extracted_data, token_budget)
+        elif content_type == 'viewport_fields':
+            extracted_data = serialize_compact_window(extracted_data, token_budget)
+        elif content_type == 'tables':
+            extracted_data = serialize_tables(extracted_data, token_budget)
+        elif content_type == 'links':
+            extracted_data = serialize_links(extracted_data, token_budget)
+        else:
+            # The full trees of large pages are serialized off the event loop
+            extracted_data = await run_offloaded(get_offload_target(count_nodes(extracted_data)), serialize_compact, extracted_data, token_budget)
+
     elapsed_time = time.time() - start_time
     logger.info(f"Get DOM Command executed in {elapsed_time} seconds")
     await browser_manager.notify_user(user_success_message, message_type=MessageType.ACTION)
     return extracted_data # type: ignore
 
 
+def format_text_blocks(selection: dict[str, Any], cursor: int | None, query: str | None) -> str:
+    """
+    Formats the text blocks selected by select_text_blocks, followed by where they are in the text of the page and the cursor of the next blocks.
+    """
+    start = cursor or 0
+    end = selection["next_cursor"] if selection["next_cursor"] is not None else selection["total"]
+    lines = [selection["text"]]
+    order = "best match for the query first" if query else "in page order"
+    lines.append(f"Text blocks {start + 1} to {end} of {selection['total']}, {order}, with the {selection['boilerplate']} blocks of navigation, headers, footers and ads last.")
+    if selection["next_cursor"] is not None:
+        same_query = " and the same query" if query else ""
+        lines.append(f"More text is available, use text_only with cursor={selection['next_cursor']}{same_query} to fetch it.")
+    return "\n".join(lines)
+
+
 async def get_filtered_text_content(page: Page) -> str:
     text_content = await page.evaluate("""
         () => {
@@ -1,4 +1,3 @@
-import asyncio
 import inspect
 from typing import Annotated
 
@@ -7,6 +6,7 @@ from playwright.async_api import Page  # type: ignore
 from ae.core.playwright_manager import PlaywrightManager
 from ae.utils.dom_mutation_observer import subscribe  # type: ignore
 from ae.utils.dom_mutation_observer import unsubscribe  # type: ignore
+from ae.utils.dom_settle import wait_for_dom_settled
 from ae.utils.logger import logger
 from ae.utils.ui_messagetype import MessageType
 
@@ -56,7 +56,7 @@ async def press_key_combination(key_combination: Annotated[str, "The key to pres
     # Release the modifier keys
     for key in keys[:-1]:
         await page.keyboard.up(key)
-    await asyncio.sleep(0.1) # sleep for 100ms to allow the mutation observer to detect changes
+    await wait_for_dom_settled(page) # let the mutation observer report the changes caused by the action
     unsubscribe(detect_dom_changes)
 
     if dom_changes_detected:
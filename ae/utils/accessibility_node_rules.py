@@ -0,0 +1,206 @@
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+# Attributes that are only needed while reconciling the accessibility tree with the DOM
+ATTRIBUTES_TO_DELETE = ("level", "multiline", "haspopup", "id", "for")
+INPUT_FIELD_TAGS = ("input", "button", "textarea")
+SEPARATOR_ROLES = ("separator", "LineBreak")
+
+
+@dataclass
+class MergeRule:
+    """
+    A rule that cleans up an accessibility node once the information fetched from the DOM has been merged into it.
+
+    Attributes:
+        name (str): The name of the rule, used to report its hits.
+        predicate (Callable[[dict[str, Any]], bool]): Returns True if the rule applies to the node.
+        transform (Callable[[dict[str, Any]], None]): Modifies the node in place when the predicate matches.
+        requires_dom_info (bool): If True, the rule only applies to nodes for which information was found in the DOM.
+        hits (int): The number of nodes the rule applied to since the counters were last reset.
+    """
+
+    name: str
+    predicate: Callable[[dict[str, Any]], bool]
+    transform: Callable[[dict[str, Any]], None]
+    requires_dom_info: bool = True
+    hits: int = 0
+
+
+@dataclass
+class PruneRule:
+    """
+    A rule that prunes an accessibility node from the tree.
+
+    Attributes:
+        name (str): The name of the rule, used to report its hits.
+        predicate (Callable[[dict[str, Any], bool], bool]): Given the node and whether only input fields are requested, returns True if the node should be pruned.
+        hits (int): The number of nodes the rule pruned since the counters were last reset.
+    """
+
+    name: str
+    predicate: Callable[[dict[str, Any], bool], bool]
+    hits: int = 0
+
+
+def __delete_keys(*keys: str) -> Callable[[dict[str, Any]], None]:
+    def transform(node: dict[str, Any]) -> None:
+        for key in keys:
+            node.pop(key, None)
+    return transform
+
+
+def __is_name_in_description(node: dict[str, Any]) -> bool:
+    if 'name' not in node or 'description' not in node:
+        return False
+    name, description = node['name'], node['description']
+    return name == description or name == description.replace('\n', ' ') or description.replace('\n', '') in name
+
+
+def __link_to_text(node: dict[str, Any]) -> None:
+    del node["role"]
+    if node.get("description"):
+        node["text"] = node["description"]
+        del node["description"]
+
+
+def __is_name_and_role_only(node: dict[str, Any], only_input_fields: bool) -> bool:
+    if len(node) != 2 or 'name' not in node or 'role' not in node:
+        return False
+    if node.get('role') != "text":
+        return True
+    processed_name: str = node['name'].replace(',', '').replace(':', '').replace('\n', '').strip()
+    # text nodes are kept if their name is meaningful
+    return len(processed_name) < 3
+
+
+# Applied in order, each rule sees the node as left by the previous ones
+MERGE_RULES: list[MergeRule] = [
+    # check if 'name' and 'mmid' are the same
+    MergeRule("name_is_mmid", lambda node: node.get('name') == node.get('mmid') and node.get('role') != "textbox", __delete_keys('name')),
+    #if the name is same as description, then remove the description to avoid duplication
+    MergeRule("description_in_name", __is_name_in_description, __delete_keys('description')),
+    #if the name is same as the aria-label, then remove the aria-label to avoid duplication
+    MergeRule("aria_label_in_name", lambda node: 'name' in node and 'aria-label' in node and node['aria-label'] in node['name'], __delete_keys('aria-label')),
+    #if the name is same as the text, then remove the text to avoid duplication
+    MergeRule("text_is_name", lambda node: 'name' in node and 'text' in node and node['name'] == node['text'], __delete_keys('text')),
+    #children are not needed for select menus since "options" attriburte is already added
+    MergeRule("select_options", lambda node: node.get('tag') == "select", __delete_keys('children', 'role', 'description')),
+    #role and tag can have the same info. Get rid of role if it is the same as tag
+    MergeRule("role_is_tag", lambda node: 'role' in node and node['role'] == node.get('tag'), __delete_keys('role')),
+    # avoid duplicate aria-label
+    MergeRule("aria_label_is_placeholder", lambda node: bool(node.get("aria-label")) and node.get("aria-label") == node.get("placeholder"), __delete_keys('aria-label')),
+    MergeRule("link_to_text", lambda node: node.get("role") == "link", __link_to_text),
+    #remove attributes that are not needed once processing of a node is complete
+    MergeRule("unneeded_attributes", lambda node: any(attribute in node for attribute in ATTRIBUTES_TO_DELETE), __delete_keys(*ATTRIBUTES_TO_DELETE), requires_dom_info=False),
+]
+
+# A node is pruned by the first rule that matches
+PRUNE_RULES: list[PruneRule] = [
+    #If the request is for only input fields and this is not an input field, then mark the node for prunning
+    PruneRule("not_input_field", lambda node, only_input_fields: only_input_fields and node.get("role") != "WebArea"
+              and not (node.get("tag") in INPUT_FIELD_TAGS or node.get("role") == "button")),
+    # The presence of 'children' is checked after the pruned children were removed
+    PruneRule("empty_generic", lambda node, only_input_fields: node.get('role') == 'generic' and 'children' not in node and not node.get('name')),
+    PruneRule("separator", lambda node, only_input_fields: node.get('role') in SEPARATOR_ROLES),
+    #check if the node only have name and role, then delete that node
+    PruneRule("name_and_role_only", __is_name_and_role_only),
+]
+
+
+# The rules defined here, as opposed to the rules added at runtime, which do not exist in the processes spawned to post-process large trees
+CORE_RULE_NAMES = frozenset(rule.name for rule in [*MERGE_RULES, *PRUNE_RULES])
+
+
+def add_merge_rule(rule: MergeRule, before: str | None = None) -> None:
+    """
+    Adds a merge rule, e.g. for a specific site, without changing the core rules.
+
+    Parameters:
+    - rule: The rule to add.
+    - before: Optional name of an existing rule the new rule must be applied before. If not provided, the rule is applied last.
+    """
+    __insert_rule(MERGE_RULES, rule, before)
+
+
+def add_prune_rule(rule: PruneRule, before: str | None = None) -> None:
+    """
+    Adds a prune rule, e.g. for a specific site, without changing the core rules.
+
+    Parameters:
+    - rule: The rule to add.
+    - before: Optional name of an existing rule the new rule must be checked before. If not provided, the rule is checked last.
+    """
+    __insert_rule(PRUNE_RULES, rule, before)
+
+
+def __insert_rule(rules: list[Any], rule: MergeRule | PruneRule, before: str | None) -> None:
+    if any(existing_rule.name == rule.name for existing_rule in rules):
+        raise ValueError(f"A rule named {rule.name} already exists")
+    if before is None:
+        rules.append(rule)
+        return
+    for index, existing_rule in enumerate(rules):
+        if existing_rule.name == before:
+            rules.insert(index, rule)
+            return
+    raise ValueError(f"No rule named {before} to insert {rule.name} before")
+
+
+def apply_merge_rules(node: dict[str, Any], has_dom_info: bool) -> None:
+    """
+    Applies the merge rules to a node, in order, in a single pass.
+
+    Parameters:
+    - node: The accessibility node, with the information fetched from the DOM merged into it.
+    - has_dom_info: Whether any information was found in the DOM for the node.
+    """
+    for rule in MERGE_RULES:
+        if (has_dom_info or not rule.requires_dom_info) and rule.predicate(node):
+            rule.hits += 1
+            rule.transform(node)
+
+
+def matches_prune_rule(node: dict[str, Any], only_input_fields: bool) -> bool:
+    """
+    Returns True if any of the prune rules matches the node.
+    """
+    for rule in PRUNE_RULES:
+        if rule.predicate(node, only_input_fields):
+            rule.hits += 1
+            return True
+    return False
+
+
+def get_rule_hits() -> dict[str, int]:
+    """
+    Returns the number of hits of each merge and prune rule since the counters were last reset.
+    """
+    return {rule.name: rule.hits for rule in [*MERGE_RULES, *PRUNE_RULES]}
+
+
+def has_custom_rules() -> bool:
+    """
+    Returns True if rules were added with add_merge_rule or add_prune_rule.
+    """
+    return any(rule.name not in CORE_RULE_NAMES for rule in [*MERGE_RULES, *PRUNE_RULES])
+
+
+def add_rule_hits(hits: dict[str, int]) -> None:
+    """
+    Adds hits to the counters of the rules, e.g. the hits counted in another process.
+
+    Parameters:
+    - hits: The number of hits to add, by rule name.
+    """
+    for rule in [*MERGE_RULES, *PRUNE_RULES]:
+        rule.hits += hits.get(rule.name, 0)
+
+
+def reset_rule_hits() -> None:
+    """
+    Resets the hit counters of all the rules.
+    """
+    for rule in [*MERGE_RULES, *PRUNE_RULES]:
+        rule.hits = 0
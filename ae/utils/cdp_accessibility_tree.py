@@ -0,0 +1,434 @@
+import asyncio
+from collections.abc import Callable
+from collections.abc import Iterator
+from typing import Any
+
+from playwright.async_api import Frame
+from playwright.async_api import Page
+
+from ae.utils.logger import logger
+
+# Roles that Playwright's snapshot considers controls (see isControl in Playwright's crAccessibility.ts)
+CONTROL_ROLES = {'button', 'checkbox', 'ColorWell', 'combobox', 'DisclosureTriangle', 'listbox', 'menu', 'menubar', 'menuitem', 'menuitemcheckbox',
+                 'menuitemradio', 'radio', 'scrollbar', 'searchbox', 'slider', 'spinbutton', 'switch', 'tab', 'textbox', 'tree', 'treeitem'}
+LEAF_ROLES = {'doc-cover', 'graphics-symbol', 'img', 'Meter', 'scrollbar', 'slider', 'separator', 'progressbar'}
+TEXT_ONLY_ROLES = {'LineBreak', 'text', 'InlineTextBox', 'StaticText'}
+USER_STRING_PROPERTIES = ['description', 'keyshortcuts', 'roledescription', 'valuetext']
+BOOLEAN_PROPERTIES = ['disabled', 'expanded', 'focused', 'modal', 'multiline', 'multiselectable', 'readonly', 'required', 'selected']
+NUMERICAL_PROPERTIES = ['level', 'valuemax', 'valuemin']
+TOKEN_PROPERTIES = ['autocomplete', 'haspopup', 'invalid', 'orientation']
+TRISTATE_PROPERTIES = ['checked', 'pressed']
+
+INPUT_TYPES = {'button', 'checkbox', 'color', 'date', 'datetime-local', 'email', 'file', 'hidden', 'image', 'month', 'number', 'password', 'radio',
+               'range', 'reset', 'search', 'submit', 'tel', 'text', 'time', 'url', 'week'}
+NON_TEXT_TAGS = {'script', 'style', 'noscript', 'template'}
+
+ELEMENT_NODE = 1
+TEXT_NODE = 3
+
+
+class _AXNode:
+    """
+    A node of the tree returned by Accessibility.getFullAXTree, with the same filtering rules as Playwright's accessibility snapshot.
+    """
+
+    def __init__(self, payload: dict[str, Any]):
+        self.payload = payload
+        self.children: list[_AXNode] = []
+        self.name: str = payload.get('name', {}).get('value', '') or ''
+        self.role: str = payload.get('role', {}).get('value', 'Unknown')
+        self.ignored: bool = payload.get('ignored', False)
+        self.richly_editable = False
+        self.editable = False
+        self.focusable = False
+        self.hidden = False
+        for ax_property in payload.get('properties', []):
+            value = ax_property.get('value', {}).get('value')
+            if ax_property['name'] == 'editable':
+                self.richly_editable = value == 'richtext'
+                self.editable = True
+            elif ax_property['name'] == 'focusable':
+                self.focusable = bool(value)
+            elif ax_property['name'] == 'hidden':
+                self.hidden = bool(value)
+        # computed by __build_ax_tree once the children are linked
+        self.has_focusable_descendant = False
+
+    def is_plain_text_field(self) -> bool:
+        if self.richly_editable:
+            return False
+        if self.editable:
+            return True
+        return self.role in ('textbox', 'ComboBox', 'searchbox')
+
+    def is_leaf_node(self) -> bool:
+        if not self.children:
+            return True
+        if self.is_plain_text_field() or self.role in TEXT_ONLY_ROLES:
+            return True
+        if self.role in LEAF_ROLES:
+            return True
+        if self.has_focusable_descendant:
+            return False
+        if self.focusable and self.role not in ('WebArea', 'RootWebArea') and self.name:
+            return True
+        return self.role == 'heading' and bool(self.name)
+
+    def is_control(self) -> bool:
+        return self.role in CONTROL_ROLES
+
+    def is_interesting(self, inside_control: bool) -> bool:
+        if self.role == 'Ignored' or self.hidden or self.ignored:
+            return False
+        if self.focusable or self.richly_editable:
+            return True
+        if self.is_control():
+            return True
+        if inside_control:
+            return False
+        return self.is_leaf_node() and bool(self.name)
+
+    def serialize(self) -> dict[str, Any]:
+        properties: dict[str, Any] = {}
+        for ax_property in self.payload.get('properties', []):
+            properties[ax_property['name'].lower()] = ax_property.get('value', {}).get('value')
+        if 'description' in self.payload:
+            properties['description'] = self.payload['description'].get('value')
+
+        role = {'RootWebArea': 'WebArea', 'StaticText': 'text'}.get(self.role, self.role)
+        node: dict[str, Any] = {'role': role, 'name': self.name}
+        for user_string_property in USER_STRING_PROPERTIES:
+            if user_string_property in properties:
+                node[user_string_property] = properties[user_string_property]
+        for boolean_property in BOOLEAN_PROPERTIES:
+            # WebArea's focus is always true, so skip it
+            if boolean_property == 'focused' and self.role in ('RootWebArea', 'WebArea'):
+                continue
+            if properties.get(boolean_property):
+                node[boolean_property] = properties[boolean_property]
+        for numerical_property in NUMERICAL_PROPERTIES:
+            if numerical_property in properties:
+                node[numerical_property] = properties[numerical_property]
+        for token_property in TOKEN_PROPERTIES:
+            value = properties.get(token_property)
+            if value and value != 'false':
+                node[token_property] = value
+        if 'value' in self.payload and self.payload['value'].get('value') is not None:
+            node['value'] = self.payload['value']['value']
+        for tristate_property in TRISTATE_PROPERTIES:
+            if tristate_property in properties:
+                state = properties[tristate_property]
+                node[tristate_property] = True if state == 'true' else False if state == 'false' else 'mixed'
+        return node
+
+
+def __build_ax_tree(ax_nodes_payload: list[dict[str, Any]]) -> dict[str, Any] | None:
+    """
+    Builds a tree with the same shape as page.accessibility.snapshot(interesting_only=True) from the nodes of Accessibility.getFullAXTree.
+    Each serialized node keeps the backendDOMNodeId of its DOM node under '_backend_node_id'.
+    """
+    if not ax_nodes_payload:
+        return None
+    nodes_by_id = {payload['nodeId']: _AXNode(payload) for payload in ax_nodes_payload}
+    for node in nodes_by_id.values():
+        node.children = [nodes_by_id[child_id] for child_id in node.payload.get('childIds', []) if child_id in nodes_by_id]
+    root = nodes_by_id[ax_nodes_payload[0]['nodeId']]
+
+    # Nodes are visited in reverse pre order, so every child is done before its parent
+    pre_order: list[_AXNode] = []
+    stack_to_visit = [root]
+    while stack_to_visit:
+        node = stack_to_visit.pop()
+        pre_order.append(node)
+        stack_to_visit.extend(node.children)
+    for node in reversed(pre_order):
+        node.has_focusable_descendant = any(child.focusable or child.has_focusable_descendant for child in node.children)
+
+    interesting_nodes: set[int] = set()
+    stack: list[tuple[_AXNode, bool]] = [(root, False)]
+    while stack:
+        node, inside_control = stack.pop()
+        if node.is_interesting(inside_control):
+            interesting_nodes.add(id(node))
+        if node.is_leaf_node():
+            continue
+        inside_control = inside_control or node.is_control()
+        for child in node.children:
+            stack.append((child, inside_control))
+    if id(root) not in interesting_nodes:
+        return None
+
+    # Post order serialization, nodes that are not interesting are replaced by their serialized children
+    serialized: dict[int, list[dict[str, Any]]] = {}
+    stack_to_serialize: list[tuple[_AXNode, bool]] = [(root, False)]
+    while stack_to_serialize:
+        node, children_done = stack_to_serialize.pop()
+        if not children_done:
+            stack_to_serialize.append((node, True))
+            for child in reversed(node.children):
+                stack_to_serialize.append((child, False))
+            continue
+        children = [serialized_child for child in node.children for serialized_child in serialized.pop(id(child))]
+        if id(node) not in interesting_nodes:
+            serialized[id(node)] = children
+            continue
+        serialized_node = node.serialize()
+        if 'backendDOMNodeId' in node.payload:
+            serialized_node['_backend_node_id'] = node.payload['backendDOMNodeId']
+        if children:
+            serialized_node['children'] = children
+        serialized[id(node)] = [serialized_node]
+    return serialized[id(root)][0]
+
+
+def __attributes_of(dom_node: dict[str, Any]) -> dict[str, str]:
+    attributes = dom_node.get('attributes', [])
+    return dict(zip(attributes[::2], attributes[1::2], strict=False))
+
+
+def __text_of(dom_node: dict[str, Any]) -> str:
+    """
+    Approximates the innerText of a DOM node with its text content, whitespace collapsed.
+    innerText depends on the layout of the page (e.g. hidden elements), which is not available in the DOM tree.
+    """
+    texts: list[str] = []
+    stack = [dom_node]
+    while stack:
+        node = stack.pop()
+        if node.get('nodeType') == TEXT_NODE:
+            texts.append(node.get('nodeValue', ''))
+        elif node.get('localName') not in NON_TEXT_TAGS:
+            stack.extend(reversed(node.get('children', [])))
+    return ' '.join(''.join(texts).split())
+
+
+def __element_children(dom_node: dict[str, Any]) -> list[dict[str, Any]]:
+    return [child for child in dom_node.get('children', []) if child.get('nodeType') == ELEMENT_NODE]
+
+
+def __element_info(dom_node: dict[str, Any], should_fetch_inner_text: bool, params: dict[str, Any], option_selection: dict[int, bool]) -> dict[str, Any] | None:
+    """
+    Python counterpart of fetchElementInfo in FETCH_DOM_INFO_JS, computed from the DOM tree returned by DOM.getDocument.
+    """
+    element_attributes = __attributes_of(dom_node)
+    tag = dom_node.get('localName', '')
+    if element_attributes.get('id', '') in params['ids_to_ignore']:
+        return None
+    #Ignore "option" because it would have been processed with the select element
+    if tag in params['tags_to_ignore'] or tag == 'option':
+        return None
+
+    attributes_to_values: dict[str, Any] = {'tag': tag}
+
+    if tag == 'input':
+        input_type = element_attributes.get('type', '').lower()
+        attributes_to_values['tag_type'] = input_type if input_type in INPUT_TYPES else 'text'
+    elif tag == 'select':
+        attributes_to_values['mmid'] = element_attributes.get('mmid')
+        attributes_to_values['role'] = 'combobox'
+        attributes_to_values['options'] = []
+        stack = list(reversed(__element_children(dom_node)))
+        while stack:
+            option = stack.pop()
+            if option.get('localName') == 'optgroup':
+                stack.extend(reversed(__element_children(option)))
+                continue
+            if option.get('localName') != 'option':
+                continue
+            option_attributes = __attributes_of(option)
+            option_text = __text_of(option)
+            attributes_to_values['options'].append({
+                'mmid': option_attributes.get('mmid'),
+                'text': option_text,
+                'value': option_attributes.get('value', option_text),
+                'selected': option_selection.get(option['backendNodeId'], 'selected' in option_attributes),
+            })
+        return attributes_to_values
+
+    for attribute in params['attributes']:
+        value = element_attributes.get(attribute)
+        if value:
+            attributes_to_values[attribute] = value
+
+    if should_fetch_inner_text:
+        inner_text = __text_of(dom_node)
+        if inner_text:
+            attributes_to_values['description'] = inner_text
+
+    if element_attributes.get('role') == 'listbox' or tag == 'ul':
+        attributes_to_include = ['mmid', 'role', 'aria-label', 'value']
+        attributes_to_values['additional_info'] = [{name: value for name, value in __attributes_of(child).items() if name in attributes_to_include}
+                                                   for child in __element_children(dom_node)]
+
+    minimal_keys = ['tag', 'mmid']
+    keys = list(attributes_to_values.keys())
+    has_more_than_minimal_keys = len(keys) > len(minimal_keys) or any(key not in minimal_keys for key in keys)
+    if not has_more_than_minimal_keys:
+        for backup_attribute in params['backup_attributes']:
+            value = element_attributes.get(backup_attribute)
+            if value:
+                attributes_to_values[backup_attribute] = value
+
+        if len(attributes_to_values) <= len(minimal_keys):
+            if tag == 'button':
+                attributes_to_values['mmid'] = element_attributes.get('mmid')
+                attributes_to_values['role'] = 'button'
+                attributes_to_values['additional_info'] = []
+                attributes_to_exclude = ['width', 'height', 'path', 'class', 'viewBox', 'mmid']
+                if __text_of(dom_node) == '':
+                    for child in __element_children(dom_node):
+                        attributes_to_values['additional_info'].append({name: value for name, value in __attributes_of(child).items() if name not in attributes_to_exclude})
+                    return attributes_to_values
+            return None
+    return attributes_to_values
+
+
+def __walk_document(document: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    """
+    Yields the nodes of a document returned by DOM.getDocument, including the content of its shadow roots but not the documents of its frames,
+    which have their own mmids.
+    """
+    stack = [document]
+    while stack:
+        dom_node = stack.pop()
+        yield dom_node
+        stack.extend(dom_node.get('children', []))
+        stack.extend(dom_node.get('shadowRoots', []))
+
+
+def __find_frame_document(root: dict[str, Any], frame_owner_mmids: list[str]) -> tuple[dict[str, Any] | None, str | None]:
+    """
+    Finds the document of a frame by following the mmids of the frame elements from the root document down to the frame.
+
+    Returns:
+        tuple: The document of the frame and its CDP frame id (None for the root document), or (None, None) if the frame was not found.
+    """
+    document, frame_id = root, None
+    for owner_mmid in frame_owner_mmids:
+        owner = next((dom_node for dom_node in __walk_document(document)
+                      if 'contentDocument' in dom_node and __attributes_of(dom_node).get('mmid') == owner_mmid), None)
+        if owner is None:
+            return None, None
+        document, frame_id = owner['contentDocument'], owner.get('frameId')
+    return document, frame_id
+
+
+class PiercedDocument:
+    """
+    The DOM of a page with the documents of its in-process frames, as returned by DOM.getDocument with pierce. It is fetched on first use
+    and shared by the extractions of the main frame and of the child frames of the same call, so that the whole page is serialized
+    once rather than once per frame.
+    """
+
+    def __init__(self, page: Page):
+        self.page = page
+        self._root: asyncio.Future[dict[str, Any]] | None = None
+
+    async def get_root(self) -> dict[str, Any]:
+        """
+        Returns the root node of the DOM of the page, fetching it on the first call.
+        """
+        if self._root is None:
+            self._root = asyncio.ensure_future(self.__fetch_root())
+        # A frame whose extraction times out must not cancel the fetch the other frames are waiting for
+        return await asyncio.shield(self._root)
+
+    async def __fetch_root(self) -> dict[str, Any]:
+        cdp_session = await self.page.context.new_cdp_session(self.page)
+        try:
+            dom_response = await cdp_session.send('DOM.getDocument', {'depth': -1, 'pierce': True})
+        finally:
+            await cdp_session.detach()
+        logger.debug("Fetched the DOM of the page and of its in-process frames over CDP")
+        return dom_response['root']
+
+
+async def get_cdp_accessibility_snapshot(page: Page, frame: Frame | None = None, frame_owner_mmids: list[str] | None = None,
+                                         pierced_document: PiercedDocument | None = None) -> tuple[dict[str, Any] | None, Callable[[dict[str, Any]], list[dict[str, Any] | None]]]:
+    """
+    Builds the accessibility tree of the page from a raw CDP session, using Accessibility.getFullAXTree and DOM.getDocument joined on backendNodeId.
+
+    The tree has the same shape as page.accessibility.snapshot(interesting_only=True), with the mmid of the DOM element of each node in 'keyshortcuts',
+    so it can be reconciled like the snapshot of the injection backend. The DOM information for the mmids is resolved from the DOM tree in Python,
+    instead of calling into the page.
+
+    Args:
+        page (Page): The page object representing the web page.
+        frame (Frame | None, optional): A child frame of the page to build the tree of, instead of the main frame. Out-of-process frames have
+            their own CDP target, in-process frames are found in the DOM of the page through frame_owner_mmids. Defaults to None.
+        frame_owner_mmids (list[str] | None, optional): The mmids of the frame elements from the main document down to the frame,
+            each in the document of its parent frame. Required for in-process frames.
+        pierced_document (PiercedDocument | None, optional): The DOM of the page shared with the other extractions of the same call.
+            Defaults to None, which fetches it for this call only.
+
+    Returns:
+        tuple: The accessibility tree (or None if the page has no accessible content), and a function that resolves the DOM information for a batch of mmids,
+        taking the same parameters as FETCH_DOM_INFO_JS.
+    """
+    owner_mmids: list[str] = []
+    is_own_target = False
+    if frame is None:
+        cdp_session = await page.context.new_cdp_session(page)
+    else:
+        try:
+            cdp_session = await page.context.new_cdp_session(frame)
+            is_own_target = True
+        except Exception:
+            # Only out-of-process frames have their own session, the others are part of the session of the page
+            cdp_session = await page.context.new_cdp_session(page)
+            owner_mmids = frame_owner_mmids or []
+    try:
+        if pierced_document is not None and not is_own_target:
+            root = await pierced_document.get_root()
+        else:
+            # The document of an out-of-process frame is the root of its own target
+            root = (await cdp_session.send('DOM.getDocument', {'depth': -1, 'pierce': True}))['root']
+        document, frame_id = __find_frame_document(root, owner_mmids)
+        if document is None:
+            logger.warning(f"Could not find the document of the frame {frame.url if frame else ''} in the DOM of the page")
+            return None, lambda params: [None] * len(params['entries'])
+        ax_tree_response = await cdp_session.send('Accessibility.getFullAXTree', {'frameId': frame_id} if frame_id else {})
+    finally:
+        await cdp_session.detach()
+
+    ax_nodes_payload: list[dict[str, Any]] = ax_tree_response.get('nodes', [])
+    logger.debug(f"Fetched {len(ax_nodes_payload)} accessibility nodes over CDP")
+
+    dom_nodes_by_backend_id: dict[int, dict[str, Any]] = {}
+    dom_nodes_by_mmid: dict[str, dict[str, Any]] = {}
+    for dom_node in __walk_document(document):
+        dom_nodes_by_backend_id[dom_node['backendNodeId']] = dom_node
+        if dom_node.get('nodeType') == ELEMENT_NODE:
+            mmid = __attributes_of(dom_node).get('mmid')
+            if mmid is not None:
+                dom_nodes_by_mmid[mmid] = dom_node
+
+    # The current selection of the options of select menus is only available in the accessibility tree
+    option_selection: dict[int, bool] = {}
+    for payload in ax_nodes_payload:
+        for ax_property in payload.get('properties', []):
+            if ax_property['name'] == 'selected' and 'backendDOMNodeId' in payload:
+                option_selection[payload['backendDOMNodeId']] = bool(ax_property.get('value', {}).get('value'))
+
+    accessibility_tree = __build_ax_tree(ax_nodes_payload)
+
+    # Join the accessibility nodes with their DOM elements, the mmid takes the place of 'keyshortcuts' used by the injection backend
+    stack_to_join = [accessibility_tree] if accessibility_tree else []
+    while stack_to_join:
+        node = stack_to_join.pop()
+        node.pop('keyshortcuts', None)
+        dom_node = dom_nodes_by_backend_id.get(node.pop('_backend_node_id', None)) # type: ignore
+        if dom_node is not None and dom_node.get('nodeType') == ELEMENT_NODE:
+            mmid = __attributes_of(dom_node).get('mmid')
+            if mmid is not None:
+                node['keyshortcuts'] = mmid
+        stack_to_join.extend(node.get('children', []))
+
+    def resolve_dom_info(params: dict[str, Any]) -> list[dict[str, Any] | None]:
+        elements_info: list[dict[str, Any] | None] = []
+        for entry in params['entries']:
+            dom_node = dom_nodes_by_mmid.get(str(entry['mmid']))
+            elements_info.append(__element_info(dom_node, entry['should_fetch_inner_text'], params, option_selection) if dom_node else None)
+        return elements_info
+
+    return accessibility_tree, resolve_dom_info
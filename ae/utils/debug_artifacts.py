@@ -0,0 +1,127 @@
+import asyncio
+import gzip
+import os
+import threading
+from collections import Counter
+from collections.abc import Callable
+
+from ae.config import SOURCE_LOG_FOLDER_PATH
+from ae.utils.logger import logger
+
+DEBUG_ARTIFACT_MODES = ("all", "sampled", "on_failure", "off")
+
+
+class DebugArtifactSink:
+    """
+    Writes the debug artifacts of the DOM extraction (e.g. json_accessibility_dom.json) to the log folder without blocking the event loop.
+
+    The content is serialized and written in a worker thread. Whether an artifact is written depends on the mode:
+    - 'all': every artifact is written.
+    - 'sampled': every Nth artifact of each name is written, along with the artifacts of failed extractions.
+    - 'on_failure': only the artifacts of failed extractions are written.
+    - 'off': nothing is written.
+
+    Attributes:
+        folder (str): The folder the artifacts are written to.
+        mode (str): One of DEBUG_ARTIFACT_MODES.
+        sample_every (int): In 'sampled' mode, one artifact out of this many is written for each name.
+        compress (bool): If True, the artifacts are gzip compressed and '.gz' is added to their name.
+    """
+
+    def __init__(self, folder: str, mode: str, sample_every: int, compress: bool):
+        if mode not in DEBUG_ARTIFACT_MODES:
+            logger.warning(f"Unknown debug artifact mode {mode}, expected one of {DEBUG_ARTIFACT_MODES}. Writing all the artifacts.")
+            mode = "all"
+        self.folder = folder
+        self.mode = mode
+        self.sample_every = max(1, sample_every)
+        self.compress = compress
+        self._call_counts: Counter[str] = Counter()
+        self._pending_writes: set[asyncio.Future[None]] = set()
+        # Writes of the same artifact from different threads must not interleave
+        self._write_lock = threading.Lock()
+
+    def __is_sampled(self, file_name: str, failed: bool) -> bool:
+        if self.mode == "off":
+            return False
+        if failed or self.mode == "all":
+            return True
+        if self.mode == "on_failure":
+            return False
+        # The first artifact of each name is written, then one every sample_every
+        self._call_counts[file_name] += 1
+        return (self._call_counts[file_name] - 1) % self.sample_every == 0
+
+    def write(self, file_name: str, serialize: Callable[[], str], failed: bool = False) -> None:
+        """
+        Schedules the writing of a debug artifact, if it is sampled.
+
+        Args:
+            file_name (str): The name of the file in the log folder.
+            serialize (Callable[[], str]): Returns the content of the artifact. Only called if the artifact is sampled, in the worker thread,
+                so the serialized object must not be modified after the call (see write_snapshot).
+            failed (bool, optional): Whether the artifact comes from a failed extraction. Defaults to False.
+        """
+        if not self.__is_sampled(file_name, failed):
+            return
+        self.__schedule_write(file_name, serialize)
+
+    async def write_snapshot(self, file_name: str, serialize: Callable[[], str], failed: bool = False) -> None:
+        """
+        Writes a debug artifact of an object that is modified right after the call (e.g. the raw accessibility tree, which is enriched
+        in place), if it is sampled. Returns once the content is serialized, in a worker thread so that the event loop is not blocked,
+        the file being written in the background.
+
+        Args:
+            file_name (str): The name of the file in the log folder.
+            serialize (Callable[[], str]): Returns the content of the artifact. Only called if the artifact is sampled.
+            failed (bool, optional): Whether the artifact comes from a failed extraction. Defaults to False.
+        """
+        if not self.__is_sampled(file_name, failed):
+            return
+        content = await asyncio.get_running_loop().run_in_executor(None, serialize)
+        self.__schedule_write(file_name, lambda: content)
+
+    def __schedule_write(self, file_name: str, serialize: Callable[[], str]) -> None:
+        def write_file() -> None:
+            self.__write_file(file_name, serialize())
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            write_file()
+            return
+        future = loop.run_in_executor(None, write_file)
+        self._pending_writes.add(future)
+        future.add_done_callback(self.__on_write_done)
+
+    def __on_write_done(self, future: "asyncio.Future[None]") -> None:
+        self._pending_writes.discard(future)
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Failed to write a debug artifact: {future.exception()}")
+
+    def __write_file(self, file_name: str, content: str) -> None:
+        path = os.path.join(self.folder, file_name + (".gz" if self.compress else ""))
+        data = content.encode("utf-8")
+        if self.compress:
+            data = gzip.compress(data, compresslevel=1)
+        with self._write_lock:
+            # Written next to the destination and renamed, so that readers never see a partially written artifact
+            temp_path = f"{path}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        logger.debug(f"{file_name} saved")
+
+    async def flush(self) -> None:
+        """
+        Waits for the scheduled writes to complete.
+        """
+        if self._pending_writes:
+            await asyncio.gather(*self._pending_writes, return_exceptions=True)
+
+
+debug_artifacts = DebugArtifactSink(SOURCE_LOG_FOLDER_PATH,
+                                    os.getenv("DEBUG_ARTIFACTS", "sampled").lower(),
+                                    int(os.getenv("DEBUG_ARTIFACTS_SAMPLE_EVERY", "10")),
+                                    os.getenv("DEBUG_ARTIFACTS_COMPRESS", "false").lower() == "true")
@@ -0,0 +1,75 @@
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+from playwright.async_api import Frame
+from playwright.async_api import Page
+
+from ae.utils.logger import logger
+
+
+@dataclass
+class CachedDOM:
+    """
+    An enriched accessibility tree and the state of the frame it was extracted from.
+
+    Attributes:
+        url (str): The URL of the frame when the tree was extracted.
+        mutation_state (tuple[str, int]): The (document id and state hash, mutation epoch) of the frame when the tree was extracted.
+        tree (dict[str, Any]): The enriched accessibility tree, pruned for all the fields.
+    """
+
+    url: str
+    mutation_state: tuple[str, int]
+    tree: dict[str, Any]
+
+
+class DOMExtractionCache:
+    """
+    LRU cache of the enriched accessibility trees of the open pages.
+
+    An entry is keyed by page and frame, and is only served while the URL and the mutation epoch bumped by the injected mutation observer
+    are the same as when the tree was extracted. The least recently used entry is evicted when the cache is full, and entries of closed pages
+    are dropped on every insertion.
+
+    Attributes:
+        max_entries (int): The maximum number of trees kept. 0 disables the cache.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple[Page, Frame], CachedDOM] = OrderedDict()
+
+    def get(self, page: Page, frame: Frame, mutation_state: tuple[str, int] | None) -> dict[str, Any] | None:
+        """
+        Returns the cached tree for the frame if the frame did not change since the tree was extracted, None otherwise.
+        """
+        if mutation_state is None:
+            return None
+        key = (page, frame)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.url != frame.url or entry.mutation_state != mutation_state:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry.tree
+
+    def put(self, page: Page, frame: Frame, mutation_state: tuple[str, int] | None, tree: dict[str, Any]) -> None:
+        """
+        Caches the tree extracted from the frame. Trees extracted without a mutation state cannot be validated later and are not cached.
+        """
+        if self.max_entries <= 0 or mutation_state is None:
+            return
+        for key in [key for key in self._entries if key[0].is_closed()]:
+            del self._entries[key]
+        self._entries[(page, frame)] = CachedDOM(url=frame.url, mutation_state=mutation_state, tree=tree)
+        self._entries.move_to_end((page, frame))
+        while len(self._entries) > self.max_entries:
+            evicted_key, _ = self._entries.popitem(last=False)
+            logger.debug(f"Evicted the cached DOM of {evicted_key[1].url}")
+
+
+dom_extraction_cache = DOMExtractionCache(int(os.getenv("DOM_CACHE_SIZE", "8")))
@@ -0,0 +1,162 @@
+import json
+import weakref
+from dataclasses import dataclass
+from typing import Any
+
+from playwright.async_api import Page
+
+from ae.utils.logger import logger
+
+
+@dataclass
+class DOMSnapshot:
+    """
+    The last enriched accessibility tree that was returned for a page.
+
+    Attributes:
+        url (str): The URL of the page when the snapshot was taken.
+        mutation_state (tuple[str, int] | None): The (document id and state hash, mutation epoch) of the page when the snapshot was taken.
+        tree (dict[str, Any]): The enriched and pruned accessibility tree.
+    """
+
+    url: str
+    mutation_state: tuple[str, int] | None
+    tree: dict[str, Any]
+
+
+# Keeps the last snapshot per page, entries go away with the page
+_last_snapshots: "weakref.WeakKeyDictionary[Page, DOMSnapshot]" = weakref.WeakKeyDictionary()
+
+
+def remember_snapshot(page: Page, snapshot: DOMSnapshot) -> None:
+    """
+    Stores the snapshot as the baseline for the next delta computed for the page.
+    """
+    _last_snapshots[page] = snapshot
+
+
+def get_last_snapshot(page: Page) -> DOMSnapshot | None:
+    """
+    Returns the last snapshot stored for the page, or None if there is none.
+    """
+    return _last_snapshots.get(page)
+
+
+def __node_key(node: dict[str, Any]) -> str | None:
+    mmid = node.get("mmid")
+    return str(mmid) if mmid is not None else None
+
+
+def __own_content(node: dict[str, Any]) -> dict[str, Any]:
+    """
+    Returns a copy of the node without the children that carry an mmid. Children without an mmid (e.g. text nodes)
+    are part of the content of the closest ancestor that has an mmid.
+    """
+    own = {key: value for key, value in node.items() if key != "children"}
+    # Copied with an explicit stack, the text of a deep subtree does not hit the recursion limit
+    stack = [(node, own)]
+    while stack:
+        source, content = stack.pop()
+        children = []
+        for child in source.get("children", []):
+            if __node_key(child) is None:
+                child_copy = {key: value for key, value in child.items() if key != "children"}
+                children.append(child_copy)
+                stack.append((child, child_copy))
+        if children:
+            content["children"] = children
+    return own
+
+
+def __own_signature(node: dict[str, Any]) -> str:
+    """
+    Returns a signature of the own content of the node (see __own_content). The subtree is written in pre order with the depth
+    of each node, so that a deep subtree does not hit the recursion limit of json.dumps.
+    """
+    parts: list[str] = []
+    stack: list[tuple[dict[str, Any], int]] = [(node, 0)]
+    while stack:
+        current, depth = stack.pop()
+        parts.append(f"{depth}:{json.dumps({key: value for key, value in current.items() if key != 'children'}, sort_keys=True)}")
+        for child in reversed(current.get("children", [])):
+            if __node_key(child) is None:
+                stack.append((child, depth + 1))
+    return "\n".join(parts)
+
+
+def __index_tree(tree: dict[str, Any]) -> dict[str | None, tuple[str | None, str, dict[str, Any]]]:
+    """
+    Indexes the tree by mmid. The root of the tree is indexed under None.
+
+    Returns:
+        dict[str | None, tuple[str | None, str, dict[str, Any]]]: mmid -> (mmid of the parent, signature of the node's own content, node)
+    """
+    index: dict[str | None, tuple[str | None, str, dict[str, Any]]] = {}
+    stack: list[tuple[dict[str, Any], str | None, bool]] = [(tree, None, True)]
+    while stack:
+        node, parent_key, is_root = stack.pop()
+        key = None if is_root else __node_key(node)
+        if is_root or key is not None:
+            index[key] = (parent_key, __own_signature(node), node)
+            parent_key = key
+        for child in reversed(node.get("children", [])):
+            stack.append((child, parent_key, False))
+    return index
+
+
+def compute_tree_delta(previous_tree: dict[str, Any], current_tree: dict[str, Any], max_change_ratio: float) -> dict[str, Any] | None:
+    """
+    Computes the subtrees that were added, removed or changed between two enriched accessibility trees, keyed by mmid.
+
+    Args:
+        previous_tree (dict[str, Any]): The tree returned by the previous call.
+        current_tree (dict[str, Any]): The tree for the current state of the page.
+        max_change_ratio (float): If the number of changed nodes is larger than this fraction of the nodes in the current tree,
+            the delta is considered too big to be useful.
+
+    Returns:
+        dict[str, Any] | None: A dictionary with 'added' (topmost new subtrees with the mmid of their parent), 'removed'
+        (mmids of the topmost removed subtrees) and 'changed' (nodes whose own content changed, without their children that have an mmid).
+        None if the delta is too big and a full resync is needed.
+    """
+    previous_index = __index_tree(previous_tree)
+    current_index = __index_tree(current_tree)
+
+    added_keys = current_index.keys() - previous_index.keys()
+    removed_keys = previous_index.keys() - current_index.keys()
+
+    added: list[dict[str, Any]] = []
+    removed: list[str | None] = []
+    changed: list[dict[str, Any]] = []
+    changed_count = len(added_keys)
+
+    # The nodes under an added node, including the ones moved there, are part of its subtree and are not reported on their own.
+    # The index is in pre order, so the parent of a node is always seen before it
+    in_added_subtree: set[str | None] = set()
+    for key, (parent_key, signature, node) in current_index.items():
+        if parent_key in added_keys or parent_key in in_added_subtree:
+            in_added_subtree.add(key)
+            if key not in added_keys:
+                changed_count += 1
+            continue
+        if key in added_keys:
+            added.append({"parent_mmid": parent_key, "node": node})
+            continue
+        previous_parent_key, previous_signature, _ = previous_index[key]
+        if signature != previous_signature or parent_key != previous_parent_key:
+            changed_node = __own_content(node)
+            if parent_key != previous_parent_key:
+                changed_node["parent_mmid"] = parent_key
+            changed.append(changed_node)
+            changed_count += 1
+
+    for key in removed_keys:
+        if previous_index[key][0] not in removed_keys:
+            removed.append(key)
+            changed_count += 1
+
+    logger.debug(f"DOM delta: {len(added)} added subtrees, {len(removed)} removed subtrees, {len(changed)} changed nodes out of {len(current_index)} nodes")
+    if changed_count > max_change_ratio * len(current_index):
+        return None
+
+    return {"added": added, "removed": removed, "changed": changed}
@@ -0,0 +1,100 @@
+from typing import Any
+
+from playwright.async_api import Frame
+from playwright.async_api import Page
+
+from ae.utils.dom_helper import ATTRIBUTES_OF_INTEREST
+from ae.utils.dom_helper import OPENING_TAG_JS
+from ae.utils.logger import logger
+
+# Statuses of a field filled by do_bulk_fill
+FILL_FILLED = "filled"
+FILL_NOT_FOUND = "not_found"
+FILL_NO_OPTION = "no_option"
+FILL_NEEDS_KEYBOARD = "needs_keyboard"
+FILL_NOT_EDITABLE = "not_editable"
+
+# Sets the value of a field through the setter of its prototype rather than the property of the element, which frameworks such as
+# React override to track the value: the framework then sees the change when the input event is dispatched. The text of a contenteditable
+# element is replaced. Returns false, without touching the element, for the other elements, whose value (e.g. of a button or a list item)
+# is not something the user enters.
+SET_NATIVE_VALUE_JS = """(element, value) => {
+    if (element.isContentEditable) {
+        element.textContent = value;
+        return true;
+    }
+    const prototype = element instanceof HTMLInputElement ? HTMLInputElement.prototype
+        : element instanceof HTMLTextAreaElement ? HTMLTextAreaElement.prototype
+        : element instanceof HTMLSelectElement ? HTMLSelectElement.prototype : null;
+    if (prototype === null) return false;
+    Object.getOwnPropertyDescriptor(prototype, 'value').set.call(element, value);
+    return true;
+}"""
+
+# Resolves all the fields first, then fills them in order as a user would: focus, set the value, input and change events, blur.
+# Fields that only react to real keystrokes are left to the keyboard: contenteditable elements, autocomplete and combobox inputs,
+# checkboxes and radios, and the fields whose value did not take (e.g. masked inputs).
+BULK_FILL_JS = """(params) => {
+    const querySelector = window.__agente_query_selector || ((selector) => document.querySelector(selector));
+    const getOpeningTag = """ + OPENING_TAG_JS + """;
+    const setNativeValue = """ + SET_NATIVE_VALUE_JS + """;
+    const KEYBOARD_INPUT_TYPES = ['checkbox', 'radio', 'file', 'button', 'submit', 'reset', 'image'];
+    const normalize = (text) => (text || '').replace(/\\s+/g, ' ').trim().toLowerCase();
+    const needsKeyboard = (element) => element.isContentEditable || element.getAttribute('role') === 'combobox'
+        || (element.getAttribute('aria-autocomplete') || 'none') !== 'none' || (element.tagName === 'INPUT' && element.list !== null)
+        || (element.tagName === 'INPUT' && KEYBOARD_INPUT_TYPES.includes(element.type))
+        || !['INPUT', 'TEXTAREA', 'SELECT'].includes(element.tagName);
+    const findOption = (select, text) => {
+        const options = Array.from(select.options);
+        return options.find(option => option.value === text) || options.find(option => normalize(option.text) === normalize(text))
+            || options.find(option => normalize(option.text).includes(normalize(text)));
+    };
+
+    const elements = params.fields.map(field => querySelector(field.selector));
+    return params.fields.map((field, index) => {
+        const element = elements[index];
+        if (!element || !element.isConnected) return {status: 'not_found'};
+        const result = {opening_tag: getOpeningTag(element, params.attributes)};
+        if (element.disabled || element.readOnly || element.getAttribute('aria-disabled') === 'true') return {...result, status: 'not_editable'};
+        if (needsKeyboard(element)) return {...result, status: 'needs_keyboard'};
+
+        let value = field.text;
+        if (element.tagName === 'SELECT') {
+            const option = findOption(element, field.text);
+            if (!option) return {...result, status: 'no_option'};
+            value = option.value;
+        }
+        if (params.highlight) {
+            element.classList.add('agente-ui-automation-highlight');
+            element.addEventListener('animationend', () => element.classList.remove('agente-ui-automation-highlight'), {once: true});
+        }
+        element.focus();
+        if (!setNativeValue(element, value)) return {...result, status: 'not_editable'};
+        element.dispatchEvent(new Event('input', {bubbles: true}));
+        element.dispatchEvent(new Event('change', {bubbles: true}));
+        element.blur();
+        if (element.value !== value) return {...result, status: 'needs_keyboard'};
+        return {...result, status: 'filled', value: element.value};
+    });
+}"""
+
+
+async def do_bulk_fill(frame: Page | Frame, fields: list[dict[str, str]], highlight: bool = False) -> list[dict[str, Any]]:
+    """
+    Fills several fields of a page, or of a frame, in a single call into the page, by setting their value and dispatching the
+    input and change events that a user typing in them would cause.
+
+    Args:
+        frame (Page | Frame): The page, or the frame of the fields (see resolve_selector_frame).
+        fields (list[dict[str, str]]): The fields to fill, in order, each with the 'selector' of the field in that frame and the 'text'
+            to enter. For a select, the text is the value or the text of the option to select.
+        highlight (bool, optional): Whether to highlight the fields filled. Defaults to False.
+
+    Returns:
+        list[dict[str, Any]]: For each field, its 'status' (FILL_FILLED, FILL_NOT_FOUND, FILL_NO_OPTION when no option of a select
+            matches, FILL_NEEDS_KEYBOARD for the fields left to keyboard typing, FILL_NOT_EDITABLE for disabled and read only fields and the
+            elements that take no text), the 'opening_tag' of the element when it was found, and the 'value' of the fields filled.
+    """
+    results: list[dict[str, Any]] = await frame.evaluate(BULK_FILL_JS, {"fields": fields, "highlight": highlight, "attributes": ATTRIBUTES_OF_INTEREST})
+    logger.debug(f"Filled {sum(result['status'] == FILL_FILLED for result in results)} of {len(fields)} fields in one call")
+    return results
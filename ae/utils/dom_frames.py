@@ -0,0 +1,136 @@
+import asyncio
+import os
+import re
+import weakref
+from typing import Any
+
+from playwright.async_api import Frame
+from playwright.async_api import Page
+
+from ae.utils.logger import logger
+
+# The elements of child frames have mmids of the form "<frame key>.<mmid in the frame>", the elements of the main frame keep plain mmids
+NAMESPACED_MMID_PATTERN = re.compile(r"""(mmid\s*=\s*['"]?)(\d+)\.(\d+)""")
+
+
+class _FrameKeys:
+    """
+    The keys assigned to the child frames of a page. A frame keeps its key for as long as it is attached.
+    """
+
+    def __init__(self):
+        self.next_key = 0
+        self.keys: weakref.WeakKeyDictionary[Frame, int] = weakref.WeakKeyDictionary()
+        self.frames: weakref.WeakValueDictionary[int, Frame] = weakref.WeakValueDictionary()
+
+
+_frame_keys_by_page: "weakref.WeakKeyDictionary[Page, _FrameKeys]" = weakref.WeakKeyDictionary()
+
+
+def is_frame_extraction_enabled() -> bool:
+    """
+    Returns True if the content of the child frames is included in the DOM, see DOM_INCLUDE_FRAMES.
+    """
+    return os.getenv("DOM_INCLUDE_FRAMES", "true").lower() == "true"
+
+
+def get_child_frames(page: Page) -> list[Frame]:
+    """
+    Returns the attached child frames of the page, at any depth, parents before their children.
+    """
+    return [frame for frame in page.frames if frame != page.main_frame and not frame.is_detached()]
+
+
+def get_frame_key(page: Page, frame: Frame) -> int:
+    """
+    Returns the key of a child frame of the page, assigning a new one if the frame has none yet.
+    """
+    frame_keys = _frame_keys_by_page.setdefault(page, _FrameKeys())
+    key = frame_keys.keys.get(frame)
+    if key is None:
+        frame_keys.next_key += 1
+        key = frame_keys.next_key
+        frame_keys.keys[frame] = key
+        frame_keys.frames[key] = frame
+    return key
+
+
+def namespace_mmid(frame_key: int, mmid: int | str) -> str:
+    """
+    Returns the mmid of an element of a child frame as it is shown to the LLM.
+    """
+    return f"{frame_key}.{mmid}"
+
+
+async def evaluate_in_frames(page: Page, child_frames: list[Frame], script: str, params: Any) -> list[tuple[int | None, Any]]:
+    """
+    Evaluates a script in the main frame of the page and in each of its child frames concurrently.
+
+    Args:
+        page (Page): The page.
+        child_frames (list[Frame]): The child frames to evaluate the script in, as returned by get_child_frames.
+        script (str): The script to evaluate.
+        params (Any): The parameters of the script, the same for every frame.
+
+    Returns:
+        list[tuple[int | None, Any]]: The key of the frame, None for the main frame, and the result of the script in it. The main frame
+            comes first, followed by the child frames in the given order. The child frames the script failed in (e.g. detached meanwhile)
+            are left out.
+
+    Raises:
+        Exception: The error of the script in the main frame.
+    """
+    results = await asyncio.gather(page.evaluate(script, params), *[frame.evaluate(script, params) for frame in child_frames],
+                                   return_exceptions=True)
+    if isinstance(results[0], BaseException):
+        raise results[0]
+    frame_results: list[tuple[int | None, Any]] = [(None, results[0])]
+    for frame, result in zip(child_frames, results[1:], strict=True):
+        if isinstance(result, BaseException):
+            logger.debug(f"Could not evaluate the script in the frame {frame.url}: {result}")
+            continue
+        frame_results.append((get_frame_key(page, frame), result))
+    return frame_results
+
+
+async def get_frame_owner_mmids(frame: Frame) -> list[str] | None:
+    """
+    Returns the mmids of the frame elements from the main document down to the frame, each in the document of its parent frame,
+    or None if one of them has no mmid yet.
+    """
+    owner_mmids: list[str] = []
+    while frame.parent_frame is not None:
+        owner = await frame.frame_element()
+        owner_mmid = await owner.get_attribute('mmid')
+        if owner_mmid is None:
+            return None
+        owner_mmids.append(owner_mmid)
+        frame = frame.parent_frame
+    owner_mmids.reverse()
+    return owner_mmids
+
+
+def resolve_selector_frame(page: Page, selector: str) -> tuple[Page | Frame, str]:
+    """
+    Routes a selector to the frame of the element it targets.
+
+    Args:
+        page (Page): The page the selector was taken from.
+        selector (str): The query selector, e.g. [mmid='114'] for an element of the main frame or [mmid='2.15'] for an element of a child frame.
+
+    Returns:
+        tuple[Page | Frame, str]: The page, or the child frame, to run the selector in, and the selector to use in it.
+
+    Raises:
+        ValueError: If the selector targets a child frame that is no longer attached.
+    """
+    match = NAMESPACED_MMID_PATTERN.search(selector)
+    if match is None:
+        return page, selector
+    frame_keys = _frame_keys_by_page.get(page)
+    frame = frame_keys.frames.get(int(match.group(2))) if frame_keys else None
+    if frame is None or frame.is_detached():
+        raise ValueError(f"The frame of the element with selector {selector} is no longer in the page. Fetch the DOM again.")
+    frame_selector = selector[:match.start()] + match.group(1) + match.group(3) + selector[match.end():]
+    logger.debug(f"Selector {selector} routed to the frame {frame.url} as {frame_selector}")
+    return frame, frame_selector
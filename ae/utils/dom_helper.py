@@ -1,8 +1,11 @@
 import asyncio
+from typing import Any
 
 from playwright.async_api import ElementHandle
+from playwright.async_api import Frame
 from playwright.async_api import Page
 
+from ae.utils.dom_frames import resolve_selector_frame
 from ae.utils.logger import logger
 
 
@@ -18,28 +21,158 @@ async def wait_for_non_loading_dom_state(page: Page, max_wait_millis: int):
         await asyncio.sleep(0.05)
 
 
+async def resolve_mmid_element(frame: Page | Frame, selector: str) -> ElementHandle | None:
+    """
+    Resolves an [mmid='...'] selector from the in-page registry of the mmid injection, without querying the document.
+
+    Args:
+        frame (Page | Frame): The page, or the frame of the element.
+        selector (str): The query selector.
+
+    Returns:
+        ElementHandle | None: The element, or None if the selector is not an mmid selector, or the registry has no live entry for it.
+    """
+    handle = await frame.evaluate_handle("(selector) => window.__agente_resolve_mmid ? window.__agente_resolve_mmid(selector) : null", selector)
+    element = handle.as_element()
+    if element is None:
+        await handle.dispose()
+    return element
+
+
+async def get_element_by_selector(page: Page, selector: str) -> ElementHandle | None:
+    """
+    Finds the element of a selector in the page or in the child frame the selector is routed to.
+    The mmid registry is tried first, querySelector is the fallback when the entry is missing or stale.
+
+    Args:
+        page (Page): The page the selector was taken from.
+        selector (str): The query selector.
+
+    Returns:
+        ElementHandle | None: The element, or None if it was not found.
+    """
+    frame, frame_selector = resolve_selector_frame(page, selector)
+    element = await resolve_mmid_element(frame, frame_selector)
+    if element is None:
+        logger.debug(f"Selector {selector} is not in the mmid registry, querying the DOM")
+        element = await frame.query_selector(frame_selector)
+    return element
+
+
+# The attributes shown in the opening tag of the elements acted on, see get_element_outer_html
+ATTRIBUTES_OF_INTEREST = ['id', 'name', 'aria-label', 'placeholder', 'href', 'src', 'aria-autocomplete', 'role', 'type',
+                          'data-testid', 'value', 'selected', 'aria-labelledby', 'aria-describedby', 'aria-haspopup']
+
+# Builds the opening tag of an element with the given attributes, in the page
+OPENING_TAG_JS = """(element, attributes) => {
+    let openingTag = `<${element.tagName.toLowerCase()}`;
+    for (const attribute of attributes) {
+        const value = element.getAttribute(attribute);
+        if (value) openingTag += ` ${attribute}="${value}"`;
+    }
+    return openingTag + '>';
+}"""
+
+# Resolves an element, describes it and acts on it in a single call into the page. The description is its tag, its opening tag,
+# whether it is visible, whether it had to be scrolled into view, and what kind of field it is. The actions are 'click', which selects
+# the option of a select for an option, and 'focus', which can first clear the value of the field (or select the content of a
+# contenteditable element). The element can also be highlighted.
+DESCRIBE_AND_ACT_JS = """(params) => {
+    // Also finds the elements of the open shadow roots registered by the mmid injection
+    const querySelector = window.__agente_query_selector || ((selector) => document.querySelector(selector));
+    const element = querySelector(params.selector);
+    if (!element) return null;
+
+    const getOpeningTag = """ + OPENING_TAG_JS + """;
+    const tag = element.tagName.toLowerCase();
+    const description = {tag: tag, opening_tag: getOpeningTag(element, params.attributes), scrolled: false,
+                         type: tag === 'input' ? element.type : null, role: element.getAttribute('role'),
+                         contenteditable: element.isContentEditable,
+                         autocomplete: (element.getAttribute('aria-autocomplete') || 'none') !== 'none' || (tag === 'input' && element.list !== null)};
+    const rect = element.getBoundingClientRect();
+    const inViewport = rect.bottom > 0 && rect.right > 0 && rect.top < window.innerHeight && rect.left < window.innerWidth;
+    if (!inViewport && tag !== 'option') {
+        element.scrollIntoView({block: 'center', inline: 'nearest'});
+        description.scrolled = true;
+    }
+    description.visible = element.checkVisibility ? element.checkVisibility({visibilityProperty: true}) : rect.width > 0 || rect.height > 0;
+    if (params.highlight) {
+        element.classList.add('agente-ui-automation-highlight');
+        element.addEventListener('animationend', () => element.classList.remove('agente-ui-automation-highlight'), {once: true});
+    }
+
+    if (params.action === 'focus') {
+        // Only the value of text fields is cleared, the value of the other elements (e.g. buttons, list items, options, checkboxes) is not
+        // something the user enters
+        const isTextField = tag === 'textarea' || (tag === 'input' && !['checkbox', 'radio', 'button', 'submit', 'reset', 'image'].includes(element.type));
+        if (params.clear && isTextField) element.value = '';
+        element.focus();
+        if (params.clear && element.isContentEditable) {
+            // The content is selected rather than removed, so that the text entered replaces it
+            const range = document.createRange();
+            range.selectNodeContents(element);
+            window.getSelection().removeAllRanges();
+            window.getSelection().addRange(range);
+        }
+    } else if (params.action === 'click') {
+        if (tag === 'option') {
+            const select = element.closest('select');
+            if (select) {
+                select.value = element.value;
+                select.dispatchEvent(new Event('input', {bubbles: true}));
+                select.dispatchEvent(new Event('change', {bubbles: true}));
+            }
+            description.option_value = element.value;
+            description.message = `Select menu option "${element.value}" selected`;
+            return description;
+        }
+        // If the element is a link, make it open in the same tab
+        if (tag === 'a') element.target = '_self';
+        const ariaExpandedBeforeClick = element.getAttribute('aria-expanded');
+        element.click();
+        const ariaExpandedAfterClick = element.getAttribute('aria-expanded');
+        description.message = `Executed JavaScript Click on element with selector: ${params.selector}`;
+        if (ariaExpandedBeforeClick === 'false' && ariaExpandedAfterClick === 'true') {
+            description.message += '. Very important: As a consequence a menu has appeared where you may need to make further selction. Very important: Get all_fields DOM to complete the action.';
+        }
+    }
+    return description;
+}"""
+
+
+async def describe_and_act_on_element(frame: Page | Frame, selector: str, action: str | None = None, highlight: bool = False,
+                                      clear: bool = False) -> dict[str, Any] | None:
+    """
+    Resolves the element of a selector, describes it and performs an action on it, in one round trip to the page.
+
+    Args:
+        frame (Page | Frame): The page, or the frame of the element (see resolve_selector_frame).
+        selector (str): The query selector of the element in that frame.
+        action (str | None, optional): 'click' to click the element (or select it if it is an option), 'focus' to focus it.
+            Defaults to None, which only describes the element.
+        highlight (bool, optional): Whether to highlight the element with the fading border. Defaults to False.
+        clear (bool, optional): With 'focus', whether to clear the value of the text field (input or textarea) first, or to select the
+            content of the contenteditable element. Defaults to False.
+
+    Returns:
+        dict[str, Any] | None: The 'tag', 'opening_tag', 'visible' and 'scrolled' of the element, its input 'type', 'role', whether it is
+            'contenteditable' and has 'autocomplete', the 'message' of a click and the 'option_value' of a selected option,
+            or None if the element was not found.
+    """
+    return await frame.evaluate(DESCRIBE_AND_ACT_JS, {"selector": selector, "action": action, "highlight": highlight, "clear": clear,
+                                                       "attributes": ATTRIBUTES_OF_INTEREST})
+
+
 async def get_element_outer_html(element: ElementHandle, page: Page, element_tag_name: str|None = None) -> str:
     """
-    Constructs the opening tag of an HTML element along with its attributes.
+    Constructs the opening tag of an HTML element along with its attributes, in a single call into the page.
 
     Args:
         element (ElementHandle): The element to retrieve the opening tag for.
         page (Page): The page object associated with the element.
-        element_tag_name (str, optional): The tag name of the element. Defaults to None. If not passed, it will be retrieved from the element.
+        element_tag_name (str, optional): The tag name of the element. Not needed anymore, the tag is read with the attributes. Defaults to None.
 
     Returns:
         str: The opening tag of the HTML element, including a select set of attributes.
     """
-    tag_name: str = element_tag_name if element_tag_name else await page.evaluate("element => element.tagName.toLowerCase()", element)
-
-    attributes_of_interest: list[str] = ['id', 'name', 'aria-label', 'placeholder', 'href', 'src', 'aria-autocomplete', 'role', 'type',
-                                         'data-testid', 'value', 'selected', 'aria-labelledby', 'aria-describedby', 'aria-haspopup']
-    opening_tag: str = f'<{tag_name}'
-
-    for attr in attributes_of_interest:
-        value: str = await element.get_attribute(attr) # type: ignore
-        if value:
-            opening_tag += f' {attr}="{value}"'
-    opening_tag += '>'
-
-    return opening_tag
+    return await element.evaluate(OPENING_TAG_JS, ATTRIBUTES_OF_INTEREST)
@@ -0,0 +1,225 @@
+import os
+from typing import Any
+
+from playwright.async_api import Page
+
+from ae.utils.dom_frames import evaluate_in_frames
+from ae.utils.dom_frames import get_child_frames
+from ae.utils.dom_frames import is_frame_extraction_enabled
+from ae.utils.dom_frames import namespace_mmid
+from ae.utils.dom_serializer import estimate_tokens
+from ae.utils.get_detailed_accessibility_tree import do_inject_mmids
+from ae.utils.logger import logger
+
+# The regions the links are grouped by, in the order they are returned: the content of the page first
+LINK_REGIONS = ("main", "other", "navigation", "header", "sidebar", "footer")
+
+# Collects the visible links of the page in one pass, normalizes their URL (resolved against the base URL, without fragment, with the
+# host lower-cased and the tracking parameters removed) and dedupes them by URL. A URL found in several regions is kept in the region that
+# comes first in LINK_REGIONS, with the mmid of the link found there, and the most descriptive text of all its links. The links of the
+# open shadow roots found by the mmid injection come after those of the document, in the region of their host.
+EXTRACT_LINKS_JS = """
+(params) => {
+    const TRACKING_PARAMETER = /^(utm_\\w+|fbclid|gclid|dclid|msclkid|mc_cid|mc_eid|_ga|_gl|yclid|igshid)$/i;
+    const REGION_SELECTORS = [
+        ['navigation', 'nav, [role="navigation"]'],
+        ['sidebar', 'aside, [role="complementary"]'],
+        ['footer', 'footer, [role="contentinfo"]'],
+        ['header', 'header, [role="banner"]'],
+        ['main', 'main, [role="main"], article']
+    ];
+    const SECTIONING_SELECTOR = 'article, aside, main, nav, section, [role="main"], [role="article"]';
+    const normalizeText = (text) => (text || '').replace(/\\s+/g, ' ').trim();
+
+    const normalizeUrl = (href) => {
+        let url;
+        try {
+            url = new URL(href, document.baseURI);
+        } catch (e) {
+            return null;
+        }
+        if (!['http:', 'https:'].includes(url.protocol)) return url.protocol === 'mailto:' || url.protocol === 'tel:' ? url.href : null;
+        // Fragments only address a part of the page, except for the routes of single page applications (e.g. #/settings)
+        if (!url.hash.startsWith('#/') && !url.hash.startsWith('#!')) url.hash = '';
+        for (const key of Array.from(url.searchParams.keys())) {
+            if (TRACKING_PARAMETER.test(key)) url.searchParams.delete(key);
+        }
+        url.hostname = url.hostname.toLowerCase();
+        return url.href;
+    };
+    // closest() that continues past the shadow roots, into their hosts
+    const closestComposed = (element, selector) => {
+        for (let node = element; node; node = node.getRootNode() instanceof ShadowRoot ? node.getRootNode().host : null) {
+            const match = node.closest(selector);
+            if (match) return match;
+        }
+        return null;
+    };
+    const getRegion = (link) => {
+        for (const [region, selector] of REGION_SELECTORS) {
+            const container = closestComposed(link, selector);
+            if (!container) continue;
+            // Headers and footers of an article or a section are part of its content
+            if ((region === 'header' || region === 'footer') && ['HEADER', 'FOOTER'].includes(container.tagName)
+                && container.parentElement && closestComposed(container.parentElement, SECTIONING_SELECTOR)) continue;
+            return region;
+        }
+        return 'other';
+    };
+    const getText = (link) => {
+        const text = normalizeText(link.innerText) || normalizeText(link.getAttribute('aria-label')) || normalizeText(link.getAttribute('title'))
+            || normalizeText(Array.from(link.querySelectorAll('img[alt]')).map(image => image.alt).join(' '));
+        return text.length > params.max_text_chars ? text.slice(0, params.max_text_chars - 3) + '...' : text;
+    };
+
+    // The URL of the page, rather than the one of the frame, so that the links of the site are shown by their path in every frame
+    const pageUrl = new URL(params.page_url);
+    const linksByUrl = new Map();
+    const registry = window.__agente_mmid_registry;
+    const roots = [document, ...(registry ? registry.shadow_roots : [])];
+    let linkCount = 0;
+    for (const link of roots.flatMap(root => Array.from(root.querySelectorAll('a[href], area[href]')))) {
+        if (link.checkVisibility && !link.checkVisibility()) continue;
+        const url = normalizeUrl(link.getAttribute('href'));
+        if (!url) continue;
+        linkCount++;
+        const region = getRegion(link);
+        const text = getText(link);
+        const existing = linksByUrl.get(url);
+        if (!existing) {
+            linksByUrl.set(url, {mmid: link.getAttribute('mmid'), text: text, url: url, region: region});
+            continue;
+        }
+        if (params.regions.indexOf(region) < params.regions.indexOf(existing.region)) {
+            existing.region = region;
+            existing.mmid = link.getAttribute('mmid');
+        }
+        if (text.length > existing.text.length) existing.text = text;
+    }
+
+    const links = Array.from(linksByUrl.values());
+    for (const link of links) {
+        // Links of the site are shown by their path, the others by their full URL
+        const url = new URL(link.url);
+        link.path = url.origin === pageUrl.origin ? url.pathname + url.search + url.hash : link.url;
+    }
+    return {links: links, link_count: linkCount};
+}
+"""
+
+MAX_LINK_TEXT_CHARS = 80
+
+
+async def do_get_links(page: Page, max_links: int | None = None) -> dict[str, Any] | None:
+    """
+    Retrieves the visible links of a web page and of its child frames, deduped by normalized URL and grouped by the region of the page
+    they are in.
+
+    Args:
+        page (Page): The page object representing the web page.
+        max_links (int | None, optional): The maximum number of links to return, the links of the regions that come first in LINK_REGIONS
+            being kept first. Defaults to None, which uses DOM_LINKS_MAX.
+
+    Returns:
+        dict[str, Any] | None: The 'links' of each region, in LINK_REGIONS order, as [mmid, text, path] lists in document order, where mmid
+            is namespaced for the links of the child frames as in the DOM and path is the path of the links of the site and the full URL of
+            the others, the number of links found ('link_count') and of distinct links ('unique_count'), and the number of distinct links
+            left out by the cap ('omitted_count'), or None if an error occurred.
+    """
+    if max_links is None:
+        max_links = int(os.getenv("DOM_LINKS_MAX", "200"))
+    params = {"regions": list(LINK_REGIONS), "max_text_chars": MAX_LINK_TEXT_CHARS, "page_url": page.url}
+    child_frames = get_child_frames(page) if is_frame_extraction_enabled() else []
+    try:
+        await do_inject_mmids(page, child_frames)
+        frame_results = await evaluate_in_frames(page, child_frames, EXTRACT_LINKS_JS, params)
+    except Exception as e:
+        logger.error(f"Error while fetching the links: {e}")
+        return None
+
+    links, link_count = __merge_frame_links(frame_results)
+    links_by_region: dict[str, list[list[Any]]] = {region: [] for region in LINK_REGIONS}
+    kept_count = 0
+    for region in LINK_REGIONS:
+        for link in links:
+            if link["region"] == region and kept_count < max_links:
+                links_by_region[region].append([link["mmid"], link["text"], link["path"]])
+                kept_count += 1
+    logger.debug(f"Fetched {kept_count} of {len(links)} distinct links, out of {link_count} links of the page and {len(child_frames)} frames")
+    return {
+        "links": {region: links for region, links in links_by_region.items() if links},
+        "link_count": link_count,
+        "unique_count": len(links),
+        "omitted_count": len(links) - kept_count,
+    }
+
+
+def __merge_frame_links(frame_results: list[tuple[int | None, dict[str, Any]]]) -> tuple[list[dict[str, Any]], int]:
+    """
+    Merges the links found in each frame by EXTRACT_LINKS_JS, deduped by URL across the frames the way the script dedupes them in a frame.
+    The mmids of the links of the child frames are namespaced by the key of their frame.
+
+    Args:
+        frame_results (list[tuple[int | None, dict[str, Any]]]): The key of each frame, None for the main frame, and the result of
+            EXTRACT_LINKS_JS in it, as returned by evaluate_in_frames.
+
+    Returns:
+        tuple: The distinct links, the ones of the main frame first, each with its 'mmid', 'text', 'path' and 'region', and the number of
+            links found in all the frames.
+    """
+    links_by_url: dict[str, dict[str, Any]] = {}
+    link_count = 0
+    for frame_key, result in frame_results:
+        link_count += result["link_count"]
+        for link in result["links"]:
+            mmid = link["mmid"]
+            if frame_key is not None and mmid is not None:
+                mmid = namespace_mmid(frame_key, mmid)
+            existing = links_by_url.get(link["url"])
+            if existing is None:
+                links_by_url[link["url"]] = {"mmid": mmid, "text": link["text"], "path": link["path"], "region": link["region"]}
+                continue
+            if LINK_REGIONS.index(link["region"]) < LINK_REGIONS.index(existing["region"]):
+                existing["region"] = link["region"]
+                existing["mmid"] = mmid
+            if len(link["text"]) > len(existing["text"]):
+                existing["text"] = link["text"]
+    return list(links_by_url.values()), link_count
+
+
+def serialize_links(links_result: dict[str, Any], token_budget: int | None = None) -> str:
+    """
+    Serializes the result of do_get_links to a compact text: a line per region followed by a line per link, `[mmid] "text" path`.
+
+    Args:
+        links_result (dict[str, Any]): The result of do_get_links.
+        token_budget (int | None): The maximum number of tokens of the output, as estimated by estimate_tokens. None or 0 for no limit.
+            The links over the budget are left out, the regions that come first being kept first.
+
+    Returns:
+        str: The compact representation of the links.
+    """
+    if not links_result["links"]:
+        return "No links found in the page."
+
+    lines: list[str] = []
+    used_tokens = 0
+    omitted_count = links_result["omitted_count"]
+    for region, links in links_result["links"].items():
+        region_line = f"{region}:"
+        used_tokens += estimate_tokens(region_line)
+        region_lines = [region_line]
+        for mmid, text, path in links:
+            line = "  " + (f"[{mmid}] " if mmid is not None else "") + (f"\"{text}\" " if text else "") + path
+            used_tokens += estimate_tokens(line)
+            if token_budget and used_tokens > token_budget:
+                omitted_count += 1
+                continue
+            region_lines.append(line)
+        if len(region_lines) > 1:
+            lines.extend(region_lines)
+
+    lines.append(f"{links_result['unique_count']} distinct links out of the {links_result['link_count']} links of the page.")
+    if omitted_count:
+        lines.append(f"{omitted_count} links were omitted, use find_elements to look for a specific link.")
+    return "\n".join(lines)
@@ -3,8 +3,11 @@ import asyncio
 import json
 from typing import Callable  # noqa: UP035
 
+from playwright.async_api import Frame
 from playwright.async_api import Page
 
+from ae.utils.logger import logger
+
 # Create an event loop
 loop = asyncio.get_event_loop()
 
@@ -17,6 +20,77 @@ def unsubscribe(callback: Callable[[str], None]) -> None:
     DOM_change_callback.remove(callback)
 
 
+# Maintains the mutation epoch of the document, see get_mutation_state
+MUTATION_EPOCH_JS = """
+        if (!window.__agente_document_id) {
+            window.__agente_document_id = `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+            window.__agente_mutation_epoch = 0;
+            // The time of the last change, to tell when the DOM settled after an action (see wait_for_dom_settled)
+            window.__agente_last_mutation_time = performance.now();
+            const bumpEpoch = () => {
+                window.__agente_mutation_epoch++;
+                window.__agente_last_mutation_time = performance.now();
+            };
+            const agenteInjectedAttributes = ['mmid', 'aria-keyshortcuts'];
+            const isAgentEOverlayNode = (node) => {
+                const element = node.nodeType === Node.ELEMENT_NODE ? node : node.parentElement;
+                return element ? element.closest('#agentDriveAutoOverlay') !== null : false;
+            };
+            // The highlight of the element acted on is added and removed by Agent-E, it is not a change of the page
+            const withoutHighlight = (classes) => (classes || '').split(/\\s+/).filter(name => name && name !== 'agente-ui-automation-highlight').join(' ');
+            const isHighlightToggle = (mutation) => mutation.attributeName === 'class'
+                && withoutHighlight(mutation.oldValue) === withoutHighlight(mutation.target.getAttribute('class'));
+            const epochObserver = new MutationObserver((mutationsList, observer) => {
+                for(let mutation of mutationsList) {
+                    if (mutation.type === 'attributes' && (agenteInjectedAttributes.includes(mutation.attributeName) || isHighlightToggle(mutation))) continue;
+                    if (isAgentEOverlayNode(mutation.target)) continue;
+                    bumpEpoch();
+                    return;
+                }
+            });
+            const epochObserverOptions = {subtree: true, childList: true, characterData: true, attributes: true, attributeOldValue: true};
+            epochObserver.observe(document, epochObserverOptions);
+            // Open shadow roots are registered by the mmid injection as they are found
+            window.__agente_observe_shadow_root = (shadowRoot) => epochObserver.observe(shadowRoot, epochObserverOptions);
+            if (window.__agente_mmid_registry) window.__agente_mmid_registry.shadow_roots.forEach(window.__agente_observe_shadow_root);
+            // Changes to the value of form fields are not reflected as DOM mutations
+            ['input', 'change'].forEach(eventType => document.addEventListener(eventType, bumpEpoch, true));
+            // Stylesheets and images loaded after the DOM can change what is visible and accessible
+            window.addEventListener('load', bumpEpoch);
+        }
+"""
+
+
+# Returns the mutation state of the document. Values set by a script (element.value = ...) neither mutate the DOM nor fire input events,
+# so the values of the form fields, including the ones of the open shadow roots, are hashed into the state.
+# Hover menus, :focus-within and :target show and hide elements through CSS alone, and media queries follow the size of the viewport:
+# the hovered elements, the focused element, the fragment of the URL and the viewport size are hashed as well.
+GET_MUTATION_STATE_JS = """
+() => {
+    if (!window.__agente_document_id) return null;
+    const registry = window.__agente_mmid_registry;
+    let hash = 0;
+    const addToHash = (value) => {
+        for (let index = 0; index < value.length; index++) hash = (Math.imul(hash, 31) + value.charCodeAt(index)) | 0;
+        hash = (Math.imul(hash, 31) + 1) | 0;
+    };
+    const elementKey = (element) => element ? element.getAttribute('mmid') || element.tagName : '';
+    for (const root of [document, ...(registry ? registry.shadow_roots : [])]) {
+        for (const element of root.querySelectorAll('input, textarea, select, :hover')) {
+            if (element.matches(':hover')) addToHash(`hover:${elementKey(element)}`);
+            if (!['INPUT', 'TEXTAREA', 'SELECT'].includes(element.tagName)) continue;
+            addToHash(element.type === 'checkbox' || element.type === 'radio' ? String(element.checked) : element.value);
+        }
+    }
+    let activeElement = document.activeElement;
+    while (activeElement && activeElement.shadowRoot && activeElement.shadowRoot.activeElement) activeElement = activeElement.shadowRoot.activeElement;
+    addToHash(`focus:${elementKey(activeElement)}`);
+    addToHash(`${location.hash}:${window.innerWidth}x${window.innerHeight}`);
+    return [`${window.__agente_document_id}:${(hash >>> 0).toString(36)}`, window.__agente_mutation_epoch];
+}
+"""
+
+
 async def add_mutation_observer(page:Page):
     """
     Adds a mutation observer to the page to detect changes in the DOM.
@@ -25,10 +99,14 @@ async def add_mutation_observer(page:Page):
 
     Current implementation only detects when a new node is added to the DOM.
     However, in many cases, the change could be a change in the style or class of an existing node (e.g. toggle visibility of a hidden node).
+
+    A second observer maintains a mutation epoch for the document (see get_mutation_state). It is bumped on any change to the DOM,
+    including attribute changes and user input, but ignores the attributes injected by Agent-E and changes to the Agent-E overlay.
     """
 
     await page.evaluate("""
         console.log('Adding a mutation observer for DOM changes');
+        """ + MUTATION_EPOCH_JS + """
         new MutationObserver((mutationsList, observer) => {
             let changes_detected = [];
             for(let mutation of mutationsList) {
@@ -65,9 +143,42 @@ async def add_mutation_observer(page:Page):
         """)
 
 
+async def add_mutation_epoch_observer(frame: Frame):
+    """
+    Adds only the observer that maintains the mutation epoch to a frame, so that get_mutation_state can tell if the DOM of the frame changed.
+    Used for the child frames of the page, whose new nodes are not reported to the skills.
+    """
+    await frame.evaluate(MUTATION_EPOCH_JS)
+
+
 async def handle_navigation_for_mutation_observer(page:Page):
     await add_mutation_observer(page)
 
+
+async def get_mutation_state(page: Page | Frame) -> tuple[str, int] | None:
+    """
+    Retrieves the mutation state of the document currently loaded in the page, or in the frame.
+
+    The mutation state is a pair of a random id assigned to the document when the mutation observer is added, followed by a hash of the
+    values of its form fields and of what CSS alone can show or hide (hovered and focused elements, fragment, viewport size), and the
+    mutation epoch that is bumped every time the DOM changes. If two calls return the same state, neither the DOM, the values of the
+    fields nor the visibility of the elements have changed in between.
+
+    Args:
+        page (Page | Frame): The page or the frame to get the mutation state for.
+
+    Returns:
+        tuple[str, int] | None: The (document id and state hash, mutation epoch) pair, or None if the mutation observer is not installed in the page.
+    """
+    try:
+        mutation_state = await page.evaluate(GET_MUTATION_STATE_JS)
+    except Exception as e:
+        logger.debug(f"Unable to get the mutation state of the page: {e}")
+        return None
+    if not mutation_state:
+        return None
+    return (mutation_state[0], mutation_state[1])
+
 async def dom_mutation_change_detected(changes_detected: str):
     """
     Detects changes in the DOM (new nodes added) and emits the event to all subscribed callbacks.
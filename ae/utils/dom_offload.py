@@ -0,0 +1,83 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+from typing import TypeVar
+
+from ae.utils.logger import logger
+
+T = TypeVar("T")
+
+OFFLOAD_THREAD = "thread"
+OFFLOAD_PROCESS = "process"
+
+_process_pool: ProcessPoolExecutor | None = None
+
+
+def count_nodes(tree: dict[str, Any] | None) -> int:
+    """
+    Returns the number of nodes of a tree, without recursion.
+    """
+    if tree is None:
+        return 0
+    count = 0
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.get("children", []))
+    return count
+
+
+def get_offload_target(node_count: int, picklable: bool = True) -> str | None:
+    """
+    Decides where the post-processing of a tree runs, from its size. See DOM_OFFLOAD_MIN_NODES and DOM_OFFLOAD_PROCESS_MIN_NODES.
+
+    Args:
+        node_count (int): The number of nodes of the tree.
+        picklable (bool, optional): Whether the work can be sent to another process. Defaults to True.
+
+    Returns:
+        str | None: OFFLOAD_PROCESS, OFFLOAD_THREAD, or None to run the work on the event loop.
+    """
+    process_min_nodes = int(os.getenv("DOM_OFFLOAD_PROCESS_MIN_NODES", "0"))
+    thread_min_nodes = int(os.getenv("DOM_OFFLOAD_MIN_NODES", "2000"))
+    if picklable and process_min_nodes > 0 and node_count >= process_min_nodes:
+        return OFFLOAD_PROCESS
+    if thread_min_nodes > 0 and node_count >= thread_min_nodes:
+        return OFFLOAD_THREAD
+    return None
+
+
+def __get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        max_workers = int(os.getenv("DOM_OFFLOAD_PROCESSES", "2"))
+        # Spawned rather than forked, forking a process that runs the Playwright connection threads is not safe
+        _process_pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+        logger.debug(f"Started a pool of {max_workers} processes for the DOM post-processing")
+    return _process_pool
+
+
+async def run_offloaded(target: str | None, function: Callable[..., T], *args: Any) -> T:
+    """
+    Runs CPU bound work on a tree (merge, prune, serialization...) so that it does not block the event loop for long,
+    and the streaming of the server and the overlay callbacks keep running meanwhile.
+
+    Args:
+        target (str | None): Where to run the work, as returned by get_offload_target. None runs it directly on the event loop.
+        function (Callable[..., T]): The function to run. For OFFLOAD_PROCESS it must be a module level function, and its arguments and
+            result are copied to and from the worker process.
+        *args (Any): The arguments of the function.
+
+    Returns:
+        T: The result of the function.
+    """
+    if target is None:
+        return function(*args)
+    loop = asyncio.get_running_loop()
+    executor = __get_process_pool() if target == OFFLOAD_PROCESS else None
+    return await loop.run_in_executor(executor, functools.partial(function, *args))
@@ -0,0 +1,213 @@
+from typing import Any
+
+from playwright.async_api import Page
+
+from ae.utils.dom_frames import evaluate_in_frames
+from ae.utils.dom_frames import get_child_frames
+from ae.utils.dom_frames import is_frame_extraction_enabled
+from ae.utils.dom_frames import namespace_mmid
+from ae.utils.get_detailed_accessibility_tree import do_inject_mmids
+from ae.utils.logger import logger
+
+# Scores the visible elements of a frame, including the ones of the open shadow roots, against a query and returns the best ones.
+# The text of each element (accessible name, placeholder, inner text, title, name and id) is matched token by token, tolerating prefixes
+# and typos through trigram similarity. Words of the query that name a role (e.g. 'button', 'search box') are matched against the role
+# of the element instead of its text.
+FIND_ELEMENTS_JS = """
+(params) => {
+    const CANDIDATE_SELECTOR = 'a[href], button, input:not([type="hidden"]), select, textarea, summary, [role], [contenteditable=""], '
+        + '[contenteditable="true"], h1, h2, h3, h4, h5, h6, img[alt]';
+    const IGNORED_ROLES = new Set(['presentation', 'none', 'generic']);
+    const TEXT_INPUT_ROLES = ['textbox', 'searchbox', 'combobox'];
+    const ROLE_WORDS = {
+        button: ['button'], link: ['link'], box: TEXT_INPUT_ROLES, field: TEXT_INPUT_ROLES, input: TEXT_INPUT_ROLES,
+        textbox: TEXT_INPUT_ROLES, searchbox: TEXT_INPUT_ROLES, checkbox: ['checkbox', 'switch'], radio: ['radio'],
+        dropdown: ['combobox', 'listbox'], select: ['combobox', 'listbox'], tab: ['tab'], menu: ['menu', 'menuitem'], heading: ['heading']
+    };
+    const INPUT_ROLES = {search: 'searchbox', checkbox: 'checkbox', radio: 'radio', button: 'button', submit: 'button', reset: 'button',
+                         image: 'button', range: 'slider', number: 'spinbutton'};
+    const CONTEXT_SELECTOR = 'form, dialog, [role="dialog"], nav, [role="navigation"], [role="search"], header, footer, aside, main, section';
+
+    const normalize = (text) => (text || '').replace(/\\s+/g, ' ').trim();
+    const tokenize = (text) => normalize(text).toLowerCase().match(/[\\p{L}\\p{N}]+/gu) || [];
+    const trigrams = (token) => {
+        const padded = ` ${token} `;
+        const result = new Set();
+        for (let i = 0; i < padded.length - 2; i++) result.add(padded.slice(i, i + 3));
+        return result;
+    };
+    const similarity = (queryToken, queryTrigrams, token) => {
+        if (queryToken === token) return 1;
+        if (queryToken.length >= 3 && token.startsWith(queryToken)) return 0.85;
+        if (queryToken.length >= 3 && token.includes(queryToken)) return 0.7;
+        if (token.length >= 3 && queryToken.startsWith(token)) return 0.6;
+        const tokenTrigrams = trigrams(token);
+        let shared = 0;
+        for (const trigram of queryTrigrams) if (tokenTrigrams.has(trigram)) shared++;
+        const dice = 2 * shared / (queryTrigrams.size + tokenTrigrams.size);
+        return dice >= 0.5 ? dice * 0.8 : 0;
+    };
+
+    const getRole = (element) => {
+        const explicitRole = element.getAttribute('role');
+        if (explicitRole) return explicitRole.split(' ')[0];
+        const tag = element.tagName.toLowerCase();
+        if (tag === 'a') return 'link';
+        if (tag === 'button' || tag === 'summary') return 'button';
+        if (tag === 'select') return element.multiple || element.size > 1 ? 'listbox' : 'combobox';
+        if (tag === 'textarea') return 'textbox';
+        if (tag === 'input') return INPUT_ROLES[element.type] || 'textbox';
+        if (/^h[1-6]$/.test(tag)) return 'heading';
+        if (tag === 'img') return 'img';
+        if (element.isContentEditable) return 'textbox';
+        return null;
+    };
+    const getLabel = (element) => {
+        const labelledBy = element.getAttribute('aria-labelledby');
+        if (labelledBy) {
+            const text = normalize(labelledBy.split(/\\s+/).map(id => document.getElementById(id)?.innerText || '').join(' '));
+            if (text) return text;
+        }
+        if (element.getAttribute('aria-label')) return normalize(element.getAttribute('aria-label'));
+        if (element.labels && element.labels.length > 0) return normalize(Array.from(element.labels).map(label => label.innerText).join(' '));
+        if (element.tagName === 'IMG') return normalize(element.alt);
+        if (element.tagName === 'INPUT' && ['button', 'submit', 'reset'].includes(element.type)) return normalize(element.value);
+        return '';
+    };
+    const getContext = (element) => {
+        const container = element.parentElement && element.parentElement.closest(CONTEXT_SELECTOR);
+        if (!container) return null;
+        const heading = container.querySelector('h1, h2, h3, h4, h5, h6, legend, [role="heading"]');
+        const label = normalize(container.getAttribute('aria-label') || (heading ? heading.innerText : '')).slice(0, 60);
+        const kind = container.getAttribute('role') || container.tagName.toLowerCase();
+        return label ? `${kind}: ${label}` : kind;
+    };
+
+    let queryTokens = tokenize(params.query);
+    const wantedRoles = new Set(params.role ? (ROLE_WORDS[params.role.toLowerCase()] || [params.role.toLowerCase()]) : []);
+    const roleWords = queryTokens.filter(token => ROLE_WORDS[token]);
+    if (roleWords.length > 0 && roleWords.length < queryTokens.length) {
+        queryTokens = queryTokens.filter(token => !ROLE_WORDS[token]);
+    }
+    const hintedRoles = new Set(roleWords.flatMap(token => ROLE_WORDS[token]));
+    const queryTrigrams = queryTokens.map(trigrams);
+    const normalizedQuery = queryTokens.join(' ');
+    if (queryTokens.length === 0) return [];
+
+    const scoreText = (text) => {
+        const tokens = tokenize(text);
+        if (tokens.length === 0) return 0;
+        let total = 0;
+        queryTokens.forEach((queryToken, index) => {
+            let best = 0;
+            for (const token of tokens) {
+                best = Math.max(best, similarity(queryToken, queryTrigrams[index], token));
+                if (best === 1) break;
+            }
+            total += best;
+        });
+        let score = total / queryTokens.length;
+        // The whole query as a phrase, and texts that are not much longer than the query, are better matches
+        if (queryTokens.length > 1 && tokens.join(' ').includes(normalizedQuery)) score += 0.2;
+        return score * (0.85 + 0.15 * Math.min(1, queryTokens.length / tokens.length));
+    };
+
+    const registry = window.__agente_mmid_registry;
+    const roots = [document, ...(registry ? registry.shadow_roots : [])];
+    const candidates = [];
+    for (const root of roots) {
+        for (const element of root.querySelectorAll(CANDIDATE_SELECTOR)) {
+            const role = getRole(element);
+            if (!role || IGNORED_ROLES.has(role)) continue;
+            if (wantedRoles.size > 0 && !wantedRoles.has(role)) continue;
+            if (element.checkVisibility && !element.checkVisibility()) continue;
+
+            const label = getLabel(element);
+            const innerText = element.tagName === 'INPUT' || element.tagName === 'SELECT' || element.tagName === 'TEXTAREA' ? '' : normalize(element.innerText).slice(0, 200);
+            const fields = [[label, 1], [element.getAttribute('placeholder'), 0.9], [innerText, 0.85], [element.getAttribute('title'), 0.7],
+                            [`${element.getAttribute('name') || ''} ${element.id || ''}`.replace(/[_-]/g, ' '), 0.5]];
+            let score = 0;
+            for (const [text, weight] of fields) {
+                if (text) score = Math.max(score, scoreText(text) * weight);
+            }
+            if (hintedRoles.has(role)) score += 0.15;
+            if (score < params.min_score) continue;
+            candidates.push({element: element, role: role, label: label, innerText: innerText, score: score});
+        }
+    }
+
+    candidates.sort((first, second) => second.score - first.score);
+    return candidates.slice(0, params.top_k).map(candidate => {
+        const element = candidate.element;
+        return {
+            mmid: element.getAttribute('mmid'),
+            tag: element.tagName.toLowerCase(),
+            tag_type: element.tagName === 'INPUT' ? element.type : null,
+            role: candidate.role,
+            name: (candidate.label || candidate.innerText || element.getAttribute('title') || '').slice(0, 100),
+            placeholder: element.getAttribute('placeholder'),
+            value: ['INPUT', 'TEXTAREA', 'SELECT'].includes(element.tagName) && !['button', 'submit', 'reset'].includes(element.type) ? String(element.value).slice(0, 100) : null,
+            disabled: element.disabled === true || element.getAttribute('aria-disabled') === 'true',
+            context: getContext(element),
+            score: Math.round(candidate.score * 100) / 100
+        };
+    });
+}
+"""
+
+MIN_MATCH_SCORE = 0.3
+
+
+async def do_find_elements(page: Page, query: str, role: str | None = None, top_k: int = 5) -> list[dict[str, Any]] | None:
+    """
+    Searches the visible elements of the page for the ones that best match a text query, in a single call into the page and into each of its
+    child frames, so that an element can be found without extracting the DOM.
+
+    Args:
+        page (Page): The page object representing the web page.
+        query (str): What to look for, e.g. 'search box' or 'Checkout button'. Words naming a role favour the elements of that role.
+        role (str | None, optional): Only return elements of this role (e.g. 'button', 'link', 'textbox'). Defaults to None, any role.
+        top_k (int, optional): The maximum number of elements to return. Defaults to 5.
+
+    Returns:
+        list[dict[str, Any]] | None: The best matching elements, best first, each with its 'mmid' (namespaced for the elements of the
+            child frames, as in the DOM), 'tag', 'tag_type', 'role', 'name',
+            'placeholder', 'value', whether it is 'disabled', the 'context' it is in (e.g. the form or dialog) and its 'score',
+            or None if an error occurred.
+    """
+    params = {"query": query, "role": role, "top_k": top_k, "min_score": MIN_MATCH_SCORE}
+    child_frames = get_child_frames(page) if is_frame_extraction_enabled() else []
+    try:
+        await do_inject_mmids(page, child_frames)
+        frame_results = await evaluate_in_frames(page, child_frames, FIND_ELEMENTS_JS, params)
+    except Exception as e:
+        logger.error(f"Error while searching the elements matching {query}: {e}")
+        return None
+
+    candidates = __merge_candidates(frame_results, top_k)
+    logger.debug(f"Found {len(candidates)} elements matching {query} in the page and {len(child_frames)} frames")
+    return candidates
+
+
+def __merge_candidates(frame_results: list[tuple[int | None, list[dict[str, Any]]]], top_k: int) -> list[dict[str, Any]]:
+    """
+    Merges the best matches of each frame into the best matches of the page, best first. The mmids of the elements of the child frames
+    are namespaced by the key of their frame.
+
+    Args:
+        frame_results (list[tuple[int | None, list[dict[str, Any]]]]): The key of each frame, None for the main frame, and the matches
+            found in it, as returned by evaluate_in_frames.
+        top_k (int): The maximum number of elements to return.
+
+    Returns:
+        list[dict[str, Any]]: The best matches of the page.
+    """
+    candidates: list[dict[str, Any]] = []
+    for frame_key, frame_candidates in frame_results:
+        for candidate in frame_candidates:
+            if frame_key is not None and candidate["mmid"] is not None:
+                candidate["mmid"] = namespace_mmid(frame_key, candidate["mmid"])
+            candidates.append(candidate)
+    # The sort is stable so that the main frame comes first on equal scores
+    candidates.sort(key=lambda candidate: -candidate["score"])
+    return candidates[:top_k]
@@ -0,0 +1,250 @@
+import json
+import os
+from typing import Any
+
+# Keys that get a shorter name in the compact output, the other keys are written as they are
+KEY_ALIASES = {
+    "description": "desc",
+    "placeholder": "ph",
+    "aria-label": "label",
+    "data-testid": "testid",
+    "additional_info": "info",
+    "important information": "note",
+    "value": "val",
+    "autocomplete": "auto",
+    "keyshortcuts": "keys",
+}
+# Keys that are part of the element header (or its children) and not written as key=value
+HEADER_KEYS = ("mmid", "tag", "tag_type", "role", "name", "children", "options")
+
+INTERACTIVE_TAGS = ("a", "button", "input", "select", "textarea", "option", "summary", "details", "label")
+INTERACTIVE_ROLES = ("button", "link", "textbox", "searchbox", "combobox", "checkbox", "radio", "switch", "slider", "spinbutton",
+                     "menuitem", "menuitemcheckbox", "menuitemradio", "option", "tab", "treeitem", "listbox")
+# Subtrees made only of these roles carry the least information and are dropped first when over the token budget
+LOW_VALUE_ROLES = ("generic", "text", "none", "presentation", "paragraph", "StaticText", "LineBreak", "listitem", "img", "figure")
+HIGH_VALUE_ROLES = ("heading", "dialog", "alertdialog", "alert", "status")
+
+CHARS_PER_TOKEN = 4
+
+# Output for a page, or a window of a page, without any element to interact with, e.g. still blank or fully pruned
+NO_ELEMENTS_MESSAGE = "No interactive elements found"
+
+
+def is_compact_output_enabled() -> bool:
+    """
+    Returns True if the DOM is returned to the LLM in the compact format, False if it is returned as JSON.
+    """
+    return os.getenv("DOM_OUTPUT_FORMAT", "compact").lower() != "json"
+
+
+def get_dom_token_budget() -> int:
+    """
+    Returns the maximum number of tokens of the DOM returned to the LLM, see DOM_TOKEN_BUDGET. 0 for no limit.
+    """
+    return int(os.getenv("DOM_TOKEN_BUDGET", "20000"))
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the number of tokens of a text. This is a rough estimate that does not depend on the tokenizer of the model.
+    """
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def is_interactive(node: dict[str, Any]) -> bool:
+    """
+    Returns True if the node is an element the agent can interact with.
+    """
+    return node.get("tag") in INTERACTIVE_TAGS or node.get("role") in INTERACTIVE_ROLES or "options" in node
+
+
+def __is_default(value: Any) -> bool:
+    # An attribute with its default value is not written. Checked by identity for None and False so that 0 is written.
+    return value is None or value is False or value in ("", [], {})
+
+
+def __format_value(value: Any) -> str:
+    if isinstance(value, str):
+        return json.dumps(value, ensure_ascii=False)
+    if value is True:
+        return ""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def __format_options(options: list[dict[str, Any]]) -> str:
+    formatted: list[str] = []
+    for option in options:
+        text = option.get("text", "")
+        entry = f"{option.get('mmid', '')}:{json.dumps(text, ensure_ascii=False)}"
+        if option.get("value") not in (None, "", text):
+            entry += f"={json.dumps(option['value'], ensure_ascii=False)}"
+        if option.get("selected"):
+            entry += "*"
+        formatted.append(entry)
+    return "opts=[" + ",".join(formatted) + "]"
+
+
+def format_node(node: dict[str, Any], depth: int = 0) -> str:
+    """
+    Formats a single node of the enriched accessibility tree, without its children, as one line of the compact format:
+    `[mmid] tag:type(role) "name" key=value ...`, indented by depth. Attributes with a default value are not written,
+    and boolean attributes are written as their key only.
+    """
+    parts: list[str] = []
+    if node.get("mmid") is not None:
+        parts.append(f"[{node['mmid']}]")
+
+    kind = node.get("tag", "")
+    if node.get("tag_type"):
+        kind += f":{node['tag_type']}"
+    if node.get("role"):
+        kind = f"{kind}({node['role']})" if kind else node["role"]
+    if kind:
+        parts.append(kind)
+
+    if not __is_default(node.get("name")):
+        parts.append(__format_value(str(node["name"])))
+
+    for key, value in node.items():
+        if key in HEADER_KEYS or __is_default(value):
+            continue
+        short_key = KEY_ALIASES.get(key, key)
+        formatted_value = __format_value(value)
+        parts.append(f"{short_key}={formatted_value}" if formatted_value else short_key)
+
+    if node.get("options"):
+        parts.append(__format_options(node["options"]))
+
+    return "  " * depth + " ".join(parts)
+
+
+def __value_tier(node: dict[str, Any]) -> int:
+    """
+    Returns how valuable a subtree without interactive elements is: subtrees of the lowest tier are dropped first.
+    """
+    role = node.get("role")
+    if role in HIGH_VALUE_ROLES or "important information" in node:
+        return 2
+    if role in LOW_VALUE_ROLES or (role is None and "tag" not in node):
+        return 0
+    return 1
+
+
+def serialize_compact(tree: dict[str, Any] | None, token_budget: int | None = None) -> str:
+    """
+    Serializes an enriched accessibility tree to the compact format, one line per element, children indented under their parent.
+
+    When the serialized tree exceeds the token budget, whole subtrees that do not contain any interactive element are dropped,
+    lowest value first (generic containers and text before other content, headings last) and, within the same value, from the end of
+    the page first since it is the content that is the most likely to be off-screen. Interactive elements are never dropped, so
+    the output can still exceed the budget on pages with more interactive elements than the budget allows.
+
+    Args:
+        tree (dict[str, Any] | None): The enriched accessibility tree. It is not modified.
+        token_budget (int | None): The maximum number of tokens of the output, as estimated by estimate_tokens. None or 0 for no limit.
+
+    Returns:
+        str: The compact representation of the tree, or NO_ELEMENTS_MESSAGE when there is no tree.
+    """
+    if tree is None:
+        return NO_ELEMENTS_MESSAGE
+
+    # Pre-order flattening, so that a subtree is the contiguous range [index, index + size)
+    lines: list[str] = []
+    parents: list[int] = []
+    nodes: list[dict[str, Any]] = []
+    stack: list[tuple[dict[str, Any], int, int]] = [(tree, 0, -1)]
+    while stack:
+        node, depth, parent = stack.pop()
+        parents.append(parent)
+        nodes.append(node)
+        lines.append(format_node(node, depth))
+        index = len(nodes) - 1
+        for child in reversed(node.get("children", [])):
+            stack.append((child, depth + 1, index))
+
+    costs = [estimate_tokens(line) for line in lines]
+    total_cost = sum(costs)
+    if not token_budget or total_cost <= token_budget:
+        return "\n".join(lines)
+
+    # Children come after their parent, a reverse pass accumulates the subtree sizes, costs and interactivity
+    subtree_sizes = [1] * len(nodes)
+    subtree_costs = list(costs)
+    has_interactive = [is_interactive(node) for node in nodes]
+    for index in range(len(nodes) - 1, 0, -1):
+        parent = parents[index]
+        subtree_sizes[parent] += subtree_sizes[index]
+        subtree_costs[parent] += subtree_costs[index]
+        has_interactive[parent] = has_interactive[parent] or has_interactive[index]
+
+    # The droppable subtrees are the largest ones without interactive elements. The root is always kept.
+    candidates = [index for index in range(1, len(nodes)) if not has_interactive[index] and (parents[index] == 0 or has_interactive[parents[index]])]
+    candidates.sort(key=lambda index: (__value_tier(nodes[index]), -index))
+
+    dropped = [False] * len(nodes)
+    dropped_count = 0
+    for index in candidates:
+        if total_cost <= token_budget:
+            break
+        for offset in range(subtree_sizes[index]):
+            dropped[index + offset] = True
+        total_cost -= subtree_costs[index]
+        dropped_count += subtree_sizes[index]
+
+    kept_lines = [line for index, line in enumerate(lines) if not dropped[index]]
+    kept_lines.append(f"... {dropped_count} non-interactive elements were omitted to fit the budget of {token_budget} tokens, use text_only for the text content")
+    return "\n".join(kept_lines)
+
+
+def serialize_compact_delta(delta_result: dict[str, Any], token_budget: int | None = None) -> str:
+    """
+    Serializes the result of do_get_accessibility_delta to the compact format.
+
+    Args:
+        delta_result (dict[str, Any]): A dictionary with either the 'changes' or the 'full_dom'.
+        token_budget (int | None): The token budget applied when the full DOM is returned.
+
+    Returns:
+        str: The compact representation of the changes, or of the full DOM.
+    """
+    if "full_dom" in delta_result:
+        return "full_dom:\n" + serialize_compact(delta_result["full_dom"], token_budget)
+
+    changes = delta_result["changes"]
+    if not changes["added"] and not changes["removed"] and not changes["changed"]:
+        return "No changes since the last fetch of the DOM"
+
+    lines: list[str] = []
+    if changes["added"]:
+        lines.append("added:")
+        for added in changes["added"]:
+            lines.append(f"  under [{added['parent_mmid']}]:" if added["parent_mmid"] is not None else "  under the page:")
+            lines.extend("    " + line for line in serialize_compact(added["node"]).split("\n"))
+    if changes["removed"]:
+        lines.append("removed: " + " ".join(f"[{mmid}]" for mmid in changes["removed"]))
+    if changes["changed"]:
+        lines.append("changed:")
+        for changed in changes["changed"]:
+            lines.extend("  " + line for line in serialize_compact(changed).split("\n"))
+    return "\n".join(lines)
+
+
+def serialize_compact_window(window_result: dict[str, Any], token_budget: int | None = None) -> str:
+    """
+    Serializes the result of do_get_viewport_accessibility_info to the compact format, followed by the cursors of the neighbouring windows.
+
+    Args:
+        window_result (dict[str, Any]): A dictionary with the 'tree' of the window (None when it is empty), its 'start' and 'end', and the 'next_cursor' and 'previous_cursor'.
+        token_budget (int | None): The token budget applied to the tree of the window.
+
+    Returns:
+        str: The compact representation of the window.
+    """
+    lines = [serialize_compact(window_result.get("tree"), token_budget)]
+    lines.append(f"Elements between {window_result['start']}px and {window_result['end']}px of the page.")
+    if window_result["next_cursor"] is not None:
+        lines.append(f"More elements below, use viewport_fields with cursor={window_result['next_cursor']} to fetch them.")
+    if window_result["previous_cursor"] is not None:
+        lines.append(f"More elements above, use viewport_fields with cursor={window_result['previous_cursor']} to fetch them.")
+    return "\n".join(lines)
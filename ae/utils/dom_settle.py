@@ -0,0 +1,123 @@
+import asyncio
+import os
+import weakref
+
+from playwright.async_api import BrowserContext
+from playwright.async_api import Page
+from playwright.async_api import Request
+
+from ae.utils.logger import logger
+
+# The requests whose response can change the DOM, images, fonts and media only change how it renders
+TRACKED_RESOURCE_TYPES = {"document", "fetch", "xhr", "script"}
+
+# Interval in seconds at which the requests in flight are checked again while waiting for them to finish
+NETWORK_IDLE_POLL_INTERVAL = 0.02
+
+_pending_requests: "weakref.WeakKeyDictionary[Page, set[Request]]" = weakref.WeakKeyDictionary()
+
+# Resolves once no mutation was recorded by the observer of MUTATION_EPOCH_JS for quiet_millis, counting from the call, or after
+# max_wait_millis. Returns whether the DOM went quiet. Without the observer, only the quiet period from the call is waited for.
+WAIT_FOR_DOM_QUIET_JS = """
+(params) => new Promise(resolve => {
+    const start = performance.now();
+    const check = () => {
+        const now = performance.now();
+        const sinceLastMutation = now - Math.max(start, window.__agente_last_mutation_time || 0);
+        if (sinceLastMutation >= params.quiet_millis) return resolve(true);
+        if (now - start >= params.max_wait_millis) return resolve(false);
+        setTimeout(check, Math.min(params.quiet_millis - sinceLastMutation, params.max_wait_millis - (now - start)));
+    };
+    check();
+})
+"""
+
+
+def __get_request_page(request: Request) -> Page | None:
+    try:
+        return request.frame.page
+    except Exception:
+        # Requests of service workers have no frame
+        return None
+
+
+def __on_request(request: Request):
+    if request.resource_type not in TRACKED_RESOURCE_TYPES:
+        return
+    page = __get_request_page(request)
+    if page is not None:
+        _pending_requests.setdefault(page, set()).add(request)
+
+
+def __on_request_done(request: Request):
+    page = __get_request_page(request)
+    if page is not None and page in _pending_requests:
+        _pending_requests[page].discard(request)
+
+
+def track_network_activity(context: BrowserContext):
+    """
+    Keeps track of the requests in flight of each page of the browser context, so that wait_for_dom_settled also waits for the
+    responses that are about to change the DOM.
+    """
+    context.on("request", __on_request)
+    context.on("requestfinished", __on_request_done)
+    context.on("requestfailed", __on_request_done)
+
+
+def get_pending_request_count(page: Page) -> int:
+    """
+    Returns the number of requests of the page in flight that can change the DOM (documents, scripts, fetch and XHR).
+    """
+    return len(_pending_requests.get(page, ()))
+
+
+async def wait_for_dom_settled(page: Page, quiet_millis: int | None = None, max_wait_millis: int | None = None) -> float:
+    """
+    Waits for the page to settle after an action: for no DOM mutation to be recorded by the mutation observer for quiet_millis,
+    and for the requests started in the meantime to finish, whichever takes longer, up to max_wait_millis.
+
+    It replaces fixed sleeps after the actions: on a fast page it returns after quiet_millis, on a slow one it keeps waiting for the
+    late changes (e.g. autocomplete suggestions) that a fixed sleep would miss. The changes reported by the mutation observer to the
+    subscribed skills have arrived when it returns.
+
+    Args:
+        page (Page): The page the action was performed on.
+        quiet_millis (int | None, optional): The time without mutation after which the DOM is considered settled.
+            Defaults to None, which uses DOM_SETTLE_QUIET_MS.
+        max_wait_millis (int | None, optional): The maximum time to wait, pages that keep changing (e.g. carousels, timers) are
+            considered settled after it. Defaults to None, which uses DOM_SETTLE_MAX_MS.
+
+    Returns:
+        float: How long it waited, in seconds.
+    """
+    if quiet_millis is None:
+        quiet_millis = int(os.getenv("DOM_SETTLE_QUIET_MS", "50"))
+    if max_wait_millis is None:
+        max_wait_millis = int(os.getenv("DOM_SETTLE_MAX_MS", "1000"))
+    loop = asyncio.get_running_loop()
+    start_time = loop.time()
+    end_time = start_time + max_wait_millis / 1000
+    settled = False
+    while loop.time() < end_time:
+        try:
+            is_quiet = await page.evaluate(WAIT_FOR_DOM_QUIET_JS, {"quiet_millis": quiet_millis, "max_wait_millis": (end_time - loop.time()) * 1000})
+        except Exception as e:
+            # The action navigated away, the new document is waited for by the next skill
+            logger.debug(f"Stopped waiting for the DOM to settle: {e}")
+            break
+        if not is_quiet:
+            break
+        if get_pending_request_count(page) == 0:
+            settled = True
+            break
+        # The responses in flight are likely to change the DOM, wait for them and for the DOM to be quiet again
+        while get_pending_request_count(page) > 0 and loop.time() < end_time:
+            await asyncio.sleep(NETWORK_IDLE_POLL_INTERVAL)
+
+    waited_time = loop.time() - start_time
+    if settled:
+        logger.debug(f"DOM settled after {waited_time * 1000:.0f} ms")
+    else:
+        logger.debug(f"DOM did not settle, stopped waiting after {waited_time * 1000:.0f} ms with {get_pending_request_count(page)} requests in flight")
+    return waited_time
@@ -0,0 +1,188 @@
+import os
+from typing import Any
+
+from playwright.async_api import Page
+
+from ae.utils.dom_serializer import estimate_tokens
+from ae.utils.get_detailed_accessibility_tree import do_inject_mmids
+from ae.utils.logger import logger
+
+# Finds the visible HTML and ARIA tables of the page and reads the rows of the window [start, start + max_rows) in one call into the page.
+# The rows are numbered across the tables in document order, the header rows of a table are not counted and are returned with every window.
+# Each cell is its text followed by the mmids of the interactive elements in it, so that the rows can be acted on.
+EXTRACT_TABLES_JS = """
+(params) => {
+    const TABLE_SELECTOR = 'table, [role="table"], [role="grid"], [role="treegrid"]';
+    const CELL_ROLES = '[role="cell"], [role="gridcell"], [role="columnheader"], [role="rowheader"]';
+    const CONTROL_SELECTOR = 'a, button, input, select, textarea, [role="button"], [role="link"], [role="checkbox"], [role="radio"], [role="switch"]';
+    const normalize = (text) => (text || '').replace(/\\s+/g, ' ').trim();
+
+    const isAriaTable = (table) => table.tagName !== 'TABLE' || table.hasAttribute('role');
+    const getRows = (table) => {
+        if (!isAriaTable(table)) return Array.from(table.rows);
+        return Array.from(table.querySelectorAll('tr, [role="row"]')).filter(row => row.parentElement.closest(TABLE_SELECTOR) === table);
+    };
+    const getCells = (row) => {
+        if (row.tagName === 'TR' && !row.hasAttribute('role')) return Array.from(row.cells);
+        return Array.from(row.querySelectorAll(`td, th, ${CELL_ROLES}`)).filter(cell => cell.parentElement.closest('tr, [role="row"]') === row);
+    };
+    const isHeaderCell = (cell) => cell.tagName === 'TH' || cell.getAttribute('role') === 'columnheader';
+    const getCellText = (cell) => {
+        let text = normalize(cell.innerText);
+        if (text.length > params.max_cell_chars) text = text.slice(0, params.max_cell_chars - 3) + '...';
+        const controls = Array.from(cell.querySelectorAll(CONTROL_SELECTOR)).filter(control => control.hasAttribute('mmid'));
+        if (cell.matches(CONTROL_SELECTOR) && cell.hasAttribute('mmid')) controls.unshift(cell);
+        for (const control of controls.slice(0, params.max_cell_controls)) text += ` [${control.getAttribute('mmid')}]`;
+        return text;
+    };
+    const getCellTexts = (cells) => {
+        const texts = [];
+        for (const cell of cells) {
+            texts.push(getCellText(cell));
+            // Spanned columns get empty cells so that the values stay aligned with the header
+            for (let span = 1; span < Math.min(cell.colSpan || Number(cell.getAttribute('aria-colspan')) || 1, 50); span++) texts.push('');
+        }
+        return texts;
+    };
+    const getCaption = (table) => {
+        if (table.caption) return normalize(table.caption.innerText);
+        const labelledBy = table.getAttribute('aria-labelledby');
+        if (labelledBy) {
+            return normalize(labelledBy.split(/\\s+/).map(id => document.getElementById(id)?.innerText || '').join(' '));
+        }
+        return normalize(table.getAttribute('aria-label'));
+    };
+
+    const tables = [];
+    let rowIndex = 0;
+    for (const table of document.querySelectorAll(TABLE_SELECTOR)) {
+        if (['presentation', 'none'].includes(table.getAttribute('role'))) continue;
+        if (table.checkVisibility && !table.checkVisibility()) continue;
+        const rows = getRows(table);
+        // The header is the thead, or the leading rows made only of column headers
+        let headerCount = 0;
+        while (headerCount < rows.length) {
+            const row = rows[headerCount];
+            const cells = getCells(row);
+            const inHead = row.parentElement && row.parentElement.tagName === 'THEAD';
+            if (!inHead && (cells.length === 0 || !cells.every(isHeaderCell))) break;
+            headerCount++;
+        }
+        const bodyRows = rows.slice(headerCount);
+        // Layout tables, with a single row or a single column, are left to the other content types
+        if (bodyRows.length === 0 || (headerCount === 0 && (bodyRows.length < 2 || getCells(bodyRows[0]).length < 2))) continue;
+
+        const firstRow = rowIndex;
+        rowIndex += bodyRows.length;
+        const windowStart = Math.max(params.start, firstRow);
+        const windowEnd = Math.min(params.start + params.max_rows, rowIndex);
+        if (windowStart >= windowEnd) {
+            tables.push({mmid: table.getAttribute('mmid'), first_row: firstRow, row_count: bodyRows.length, rows: null});
+            continue;
+        }
+        tables.push({
+            mmid: table.getAttribute('mmid'),
+            caption: getCaption(table),
+            header: rows.slice(0, headerCount).map(row => getCellTexts(getCells(row))),
+            first_row: firstRow,
+            row_count: bodyRows.length,
+            rows: bodyRows.slice(windowStart - firstRow, windowEnd - firstRow).map(row => ({mmid: row.getAttribute('mmid'), cells: getCellTexts(getCells(row))}))
+        });
+    }
+    return {tables: tables, total_rows: rowIndex};
+}
+"""
+
+TABLE_CELL_DELIMITER = " | "
+MAX_CELL_CHARS = 200
+MAX_CELL_CONTROLS = 3
+
+
+async def do_get_tables(page: Page, cursor: int | None = None, max_rows: int | None = None) -> dict[str, Any] | None:
+    """
+    Retrieves the tables of a web page, HTML tables and ARIA tables and grids, as their header and rows of cell texts.
+
+    The rows are numbered across all the tables of the page, in document order, and only the rows from the cursor on are read, up to max_rows,
+    so that large tables are fetched in chunks. Each chunk comes with the header of its tables.
+
+    Args:
+        page (Page): The page object representing the web page.
+        cursor (int | None, optional): The number of the first row to return, as returned by the previous call. Defaults to None, the first row.
+        max_rows (int | None, optional): The maximum number of rows to return. Defaults to None, which uses DOM_TABLE_MAX_ROWS.
+
+    Returns:
+        dict[str, Any] | None: The 'tables' that have rows in the window, each with its 'mmid', 'caption', 'header' rows, 'first_row',
+            'row_count' and 'rows' ({'mmid': ..., 'cells': [...]}), the 'total_rows' of the page, the 'start' of the window and the
+            'next_cursor', None if there are no more rows, or None if an error occurred.
+    """
+    if max_rows is None:
+        max_rows = int(os.getenv("DOM_TABLE_MAX_ROWS", "100"))
+    start = max(0, cursor or 0)
+    try:
+        await do_inject_mmids(page)
+        result: dict[str, Any] = await page.evaluate(EXTRACT_TABLES_JS, {"start": start, "max_rows": max_rows,
+                                                                         "max_cell_chars": MAX_CELL_CHARS, "max_cell_controls": MAX_CELL_CONTROLS})
+    except Exception as e:
+        logger.error(f"Error while fetching the tables: {e}")
+        return None
+
+    result["tables"] = [table for table in result["tables"] if table["rows"] is not None]
+    result["start"] = start
+    end = start + sum(len(table["rows"]) for table in result["tables"])
+    result["next_cursor"] = end if end < result["total_rows"] else None
+    logger.debug(f"Fetched rows {start} to {end} of {result['total_rows']} in {len(result['tables'])} tables")
+    return result
+
+
+def __format_row(cells: list[str]) -> str:
+    return TABLE_CELL_DELIMITER.join(cell.replace("|", "\\|") for cell in cells)
+
+
+def serialize_tables(tables_result: dict[str, Any], token_budget: int | None = None) -> str:
+    """
+    Serializes the result of do_get_tables to a compact text: for each table a title line, the header rows as 'columns:' lines and one line per
+    row, the cells separated by ' | ' and the row prefixed by its mmid.
+
+    When the rows exceed the token budget, the remaining rows are left for the next call and the cursor of the first of them is returned.
+
+    Args:
+        tables_result (dict[str, Any]): The result of do_get_tables.
+        token_budget (int | None): The maximum number of tokens of the output, as estimated by estimate_tokens. None or 0 for no limit.
+            At least one row is returned.
+
+    Returns:
+        str: The compact representation of the tables, followed by the cursor of the next rows.
+    """
+    if not tables_result["tables"]:
+        return "No tables found in the page. Use all_fields or text_only instead."
+
+    lines: list[str] = []
+    used_tokens = 0
+    returned_rows = 0
+    next_cursor = tables_result["next_cursor"]
+    truncated = False
+    for table in tables_result["tables"]:
+        title = "table" + (f" [{table['mmid']}]" if table["mmid"] is not None else "") + (f" \"{table['caption']}\"" if table["caption"] else "")
+        table_lines = [title] + ["  columns: " + __format_row(header) for header in table["header"]]
+        used_tokens += sum(estimate_tokens(line) for line in table_lines)
+        table_start = len(lines)
+        lines.extend(table_lines)
+        for row in table["rows"]:
+            line = "  " + (f"[{row['mmid']}] " if row["mmid"] is not None else "") + __format_row(row["cells"])
+            used_tokens += estimate_tokens(line)
+            if token_budget and used_tokens > token_budget and returned_rows:
+                next_cursor = tables_result["start"] + returned_rows
+                truncated = True
+                # A table without any of its rows is left for the next call as a whole
+                if len(lines) == table_start + len(table_lines):
+                    del lines[table_start:]
+                break
+            lines.append(line)
+            returned_rows += 1
+        if truncated:
+            break
+
+    lines.append(f"Rows {tables_result['start'] + 1} to {tables_result['start'] + returned_rows} of the {tables_result['total_rows']} rows of the tables of the page.")
+    if next_cursor is not None:
+        lines.append(f"More rows are available, use tables with cursor={next_cursor} to fetch them.")
+    return "\n".join(lines)
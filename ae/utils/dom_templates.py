@@ -0,0 +1,154 @@
+import os
+from typing import Any
+
+from ae.utils.dom_serializer import is_interactive
+
+# The keys of a node that identify its structure, the other keys (name, text, value...) are the content that varies between repeated elements
+SHAPE_KEYS = ("tag", "tag_type", "role")
+# The keys whose values are used to tell the collapsed elements apart
+TEXT_KEYS = ("name", "text", "description", "value", "placeholder", "aria-label")
+ROW_TEXT_LIMIT = 150
+
+
+def get_collapse_keep_count() -> int:
+    """
+    Returns the number of elements of a group of repeated elements that are kept in full, see DOM_COLLAPSE_KEEP. 0 disables the collapsing.
+    """
+    return max(0, int(os.getenv("DOM_COLLAPSE_KEEP", "3")))
+
+
+def __get_row(member: dict[str, Any], varying_keys: set[tuple[int, str]]) -> dict[str, Any]:
+    """
+    Summarizes a collapsed element as the mmid of its first interactive element (or its first mmid if it has none) and the text that
+    distinguishes it from the other elements of its group.
+    """
+    mmid = None
+    interactive_mmid = None
+    texts: list[str] = []
+    stack = [member]
+    index = 0
+    while stack:
+        node = stack.pop()
+        if mmid is None and node.get("mmid") is not None:
+            mmid = node["mmid"]
+        if interactive_mmid is None and node.get("mmid") is not None and is_interactive(node):
+            interactive_mmid = node["mmid"]
+        for key in TEXT_KEYS:
+            value = node.get(key)
+            if (index, key) in varying_keys and value and str(value) not in texts:
+                texts.append(str(value))
+        index += 1
+        stack.extend(reversed(node.get("children", [])))
+
+    text = " | ".join(texts)
+    if len(text) > ROW_TEXT_LIMIT:
+        text = text[:ROW_TEXT_LIMIT - 3] + "..."
+    row: dict[str, Any] = {"mmid": interactive_mmid if interactive_mmid is not None else mmid}
+    if text:
+        row["name"] = text
+    return row
+
+
+def __get_varying_keys(members: list[dict[str, Any]]) -> set[tuple[int, str]]:
+    """
+    Returns the (pre-order index, key) positions whose text is not the same in all the elements of a group. The elements have the same shape,
+    so the same index designates the same node in each of them.
+    """
+    values_by_position: dict[tuple[int, str], set[Any]] = {}
+    for member in members:
+        stack = [member]
+        index = 0
+        while stack:
+            node = stack.pop()
+            for key in TEXT_KEYS:
+                values_by_position.setdefault((index, key), set()).add(str(node.get(key, "")))
+            index += 1
+            stack.extend(reversed(node.get("children", [])))
+    return {position for position, values in values_by_position.items() if len(values) > 1}
+
+
+def collapse_repeated_subtrees(tree: dict[str, Any], keep_count: int) -> tuple[dict[str, Any], dict[str, list[dict[str, Any]]]]:
+    """
+    Collapses the runs of sibling subtrees that have the same structure, such as the results of a search or the products of a listing page.
+
+    Two subtrees have the same structure when their nodes have the same tag, type and role and their children have the same structure,
+    whatever their text. In each run of at least keep_count + 2 such siblings, the first keep_count are kept in full and the others are
+    replaced by a single group node with one row per collapsed subtree: an mmid to interact with it and the text that is not the same in all the subtrees of the run.
+    Only subtrees with children are collapsed, since a leaf is not larger than its row.
+
+    Args:
+        tree (dict[str, Any]): The enriched accessibility tree. It is not modified, the nodes that are not changed are shared with the result.
+        keep_count (int): The number of subtrees kept in full in each run. 0 disables the collapsing.
+
+    Returns:
+        tuple[dict[str, Any], dict[str, list[dict[str, Any]]]]: The collapsed tree, and the collapsed subtrees of each group by the id of the
+            group, which is the mmid of its first row.
+    """
+    groups: dict[str, list[dict[str, Any]]] = {}
+    if keep_count <= 0:
+        return tree, groups
+
+    # Pre-order, so that the children of a node come after it and are processed before it in reverse
+    order: list[dict[str, Any]] = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        stack.extend(node.get("children", []))
+
+    # Each distinct structure gets an id, so that comparing two subtrees is comparing two ints
+    shape_ids: dict[tuple[Any, ...], int] = {}
+    shapes: dict[int, int] = {}
+    collapsed_nodes: dict[int, dict[str, Any]] = {}
+    for node in reversed(order):
+        children = node.get("children", [])
+        shape = tuple(node.get(key) for key in SHAPE_KEYS) + tuple(shapes[id(child)] for child in children)
+        shapes[id(node)] = shape_ids.setdefault(shape, len(shape_ids))
+
+        new_children: list[dict[str, Any]] = []
+        run_start = 0
+        while run_start < len(children):
+            run_end = run_start + 1
+            while run_end < len(children) and shapes[id(children[run_end])] == shapes[id(children[run_start])]:
+                run_end += 1
+            run = children[run_start:run_end]
+            new_children.extend(collapsed_nodes.get(id(child), child) for child in run[:keep_count])
+            rows: list[dict[str, Any]] = []
+            if len(run) >= keep_count + 2 and "children" in run[0]:
+                varying_keys = __get_varying_keys(run)
+                rows = [__get_row(member, varying_keys) for member in run[keep_count:]]
+            if rows and rows[0]["mmid"] is not None:
+                group_id = str(rows[0]["mmid"])
+                groups[group_id] = [collapsed_nodes.get(id(member), member) for member in run[keep_count:]]
+                new_children.append({
+                    "role": "group",
+                    "name": f"{len(rows)} more elements with the same structure as the {keep_count} above, use expand={group_id} to fetch them in full",
+                    "children": rows,
+                })
+            else:
+                new_children.extend(collapsed_nodes.get(id(child), child) for child in run[keep_count:])
+            run_start = run_end
+
+        if len(new_children) != len(children) or any(new_child is not child for new_child, child in zip(new_children, children, strict=True)):
+            collapsed_nodes[id(node)] = {**node, "children": new_children}
+
+    return collapsed_nodes.get(id(tree), tree), groups
+
+
+def expand_collapsed_group(tree: dict[str, Any], group_id: str, keep_count: int) -> dict[str, Any] | None:
+    """
+    Returns the subtrees collapsed in a group of the tree, in full, under a single group node.
+
+    Args:
+        tree (dict[str, Any]): The enriched accessibility tree, as passed to collapse_repeated_subtrees.
+        group_id (str): The id of the group, as shown in the collapsed tree.
+        keep_count (int): The number of subtrees that were kept in full in each run.
+
+    Returns:
+        dict[str, Any] | None: The group node with the collapsed subtrees as its children, or None if the tree has no such group.
+    """
+    _, groups = collapse_repeated_subtrees(tree, keep_count)
+    members = groups.get(str(group_id))
+    if members is None:
+        return None
+    return {"role": "group", "name": f"{len(members)} elements of the group {group_id}", "children": members}
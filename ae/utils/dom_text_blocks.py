@@ -0,0 +1,249 @@
+import math
+import re
+from collections import Counter
+from typing import Any
+
+from playwright.async_api import Page
+
+from ae.utils.dom_serializer import CHARS_PER_TOKEN
+from ae.utils.dom_serializer import estimate_tokens
+
+# Segments the visible text of the page into blocks, the text of a block being the text of the inline content of a block-level element.
+# Each block comes with the features used to tell the main content from the boilerplate: how much of its text is in links, whether it is in
+# a navigation, header, footer or sidebar region, and whether it is a heading.
+EXTRACT_TEXT_BLOCKS_JS = """
+() => {
+    const SKIPPED_TAGS = new Set(['SCRIPT', 'STYLE', 'NOSCRIPT', 'TEMPLATE']);
+    const INLINE_DISPLAYS = new Set(['inline', 'inline-block', 'inline-flex', 'inline-grid', 'contents']);
+    const BOILERPLATE_TAGS = new Set(['NAV', 'HEADER', 'FOOTER', 'ASIDE']);
+    const BOILERPLATE_ROLES = new Set(['navigation', 'banner', 'contentinfo', 'complementary', 'menu', 'menubar', 'search']);
+    const BOILERPLATE_PATTERN = /(^|[\\s_-])(nav|navbar|navigation|menu|footer|sidebar|breadcrumbs?|cookies?|consent|banner|ads?|advert\\w*|promo\\w*|share|social|related|newsletter|subscribe)([\\s_-]|$)/i;
+    const HEADING_TAGS = new Set(['H1', 'H2', 'H3', 'H4', 'H5', 'H6']);
+    const overlay = document.getElementById('agente-overlay');
+
+    const blockElements = new Map();
+    const regions = new Map();
+    const visible = new Map();
+    const blocks = [];
+    const blocksByElement = new Map();
+
+    const getBlockElement = (element) => {
+        if (blockElements.has(element)) return blockElements.get(element);
+        let blockElement = element;
+        while (blockElement !== document.body && blockElement.parentElement && INLINE_DISPLAYS.has(getComputedStyle(blockElement).display)) {
+            blockElement = blockElement.parentElement;
+        }
+        blockElements.set(element, blockElement);
+        return blockElement;
+    };
+
+    const getRegion = (element) => {
+        if (!element || element === document.body) return null;
+        if (regions.has(element)) return regions.get(element);
+        let region = null;
+        // Headers and footers of an article or a section are part of its content, only the ones of the page are landmarks
+        const isSectioned = (element.tagName === 'HEADER' || element.tagName === 'FOOTER') && element.parentElement
+            && element.parentElement.closest('article, aside, main, nav, section, [role="main"], [role="article"]');
+        if ((BOILERPLATE_TAGS.has(element.tagName) && !isSectioned) || BOILERPLATE_ROLES.has(element.getAttribute('role'))) {
+            region = 'landmark';
+        } else if (BOILERPLATE_PATTERN.test(element.id) || BOILERPLATE_PATTERN.test(element.getAttribute('class') || '')) {
+            region = 'pattern';
+        } else {
+            region = getRegion(element.parentElement);
+        }
+        regions.set(element, region);
+        return region;
+    };
+
+    const isVisible = (element) => {
+        if (!visible.has(element)) {
+            visible.set(element, element.checkVisibility ? element.checkVisibility() : true);
+        }
+        return visible.get(element);
+    };
+
+    const addText = (element, text) => {
+        const blockElement = getBlockElement(element);
+        let block = blocksByElement.get(blockElement);
+        if (!block) {
+            block = {parts: [], link_chars: 0, region: getRegion(blockElement), heading: HEADING_TAGS.has(blockElement.tagName) || blockElement.getAttribute('role') === 'heading'};
+            blocksByElement.set(blockElement, block);
+            blocks.push(block);
+        }
+        block.parts.push(text);
+        if (element.closest('a')) block.link_chars += text.length;
+    };
+
+    if (!document.body) return [];
+    const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT | NodeFilter.SHOW_ELEMENT, {
+        acceptNode: (node) => {
+            if (node.nodeType === Node.ELEMENT_NODE) {
+                return SKIPPED_TAGS.has(node.tagName) || node === overlay ? NodeFilter.FILTER_REJECT : NodeFilter.FILTER_SKIP;
+            }
+            return NodeFilter.FILTER_ACCEPT;
+        }
+    });
+    for (let node = walker.nextNode(); node; node = walker.nextNode()) {
+        const parent = node.parentElement;
+        const text = node.nodeValue.replace(/\\s+/g, ' ').trim();
+        if (text && parent && isVisible(parent)) addText(parent, text);
+    }
+    for (const image of document.querySelectorAll('img[alt]')) {
+        const alt = image.alt.trim();
+        if (alt && !(overlay && overlay.contains(image)) && isVisible(image)) addText(image, `[image: ${alt}]`);
+    }
+
+    return blocks.map((block, index) => ({
+        index: index,
+        text: block.parts.join(' '),
+        link_chars: block.link_chars,
+        region: block.region,
+        heading: block.heading
+    }));
+}
+"""
+
+# A block with more words than this is classified on its own, a shorter one takes the class of its neighbours
+SHORT_BLOCK_WORDS = 10
+MAX_LINK_DENSITY = 0.5
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+async def get_text_blocks(page: Page) -> list[dict[str, Any]]:
+    """
+    Segments the visible text of the page into blocks, in document order, in one call into the page.
+
+    Args:
+        page (Page): The page to extract the text blocks from.
+
+    Returns:
+        list[dict[str, Any]]: The blocks, each with its 'index', 'text', the number of characters of its text that are in links ('link_chars'),
+            the boilerplate 'region' it is in ('landmark' for nav, header, footer and aside elements and their ARIA roles, 'pattern' for
+            elements whose id or class looks like navigation or ads, or None) and whether it is a 'heading'.
+    """
+    return await page.evaluate(EXTRACT_TEXT_BLOCKS_JS)
+
+
+def classify_boilerplate(blocks: list[dict[str, Any]]) -> list[bool]:
+    """
+    Classifies the text blocks as main content or boilerplate (navigation, header, footer, ads...).
+
+    Headings are content unless they are in a navigation, header, footer or sidebar landmark. Other blocks in a boilerplate region, and
+    blocks whose text is mostly links, are boilerplate. The other blocks with enough words are content, and the remaining short blocks
+    (e.g. a price, a date) take the class of their nearest classified neighbours: content if either of them is content.
+
+    Args:
+        blocks (list[dict[str, Any]]): The text blocks, in document order, as returned by get_text_blocks.
+
+    Returns:
+        list[bool]: True for the blocks that are boilerplate.
+    """
+    classes: list[bool | None] = []
+    for block in blocks:
+        text = block["text"]
+        if block["heading"] and block["region"] != "landmark":
+            classes.append(False)
+        elif block["region"] is not None or block["link_chars"] > MAX_LINK_DENSITY * len(text):
+            classes.append(True)
+        elif len(text.split()) > SHORT_BLOCK_WORDS:
+            classes.append(False)
+        else:
+            classes.append(None)
+
+    # Nearest classified neighbour of each short block, on each side
+    previous_classes: list[bool | None] = []
+    last: bool | None = None
+    for block_class in classes:
+        previous_classes.append(last)
+        if block_class is not None:
+            last = block_class
+    next_classes: list[bool | None] = [None] * len(classes)
+    last = None
+    for index in range(len(classes) - 1, -1, -1):
+        next_classes[index] = last
+        if classes[index] is not None:
+            last = classes[index]
+
+    return [block_class if block_class is not None else not (previous_classes[index] is False or next_classes[index] is False)
+            for index, block_class in enumerate(classes)]
+
+
+def __tokenize(text: str) -> list[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def rank_bm25(texts: list[str], query: str) -> list[float]:
+    """
+    Scores texts against a query with Okapi BM25, the texts being the corpus.
+
+    Args:
+        texts (list[str]): The texts to score.
+        query (str): The query.
+
+    Returns:
+        list[float]: The score of each text, 0 for the texts that contain none of the terms of the query.
+    """
+    documents = [Counter(__tokenize(text)) for text in texts]
+    lengths = [sum(document.values()) for document in documents]
+    average_length = sum(lengths) / len(lengths) if lengths else 0
+    terms = set(__tokenize(query))
+    document_frequencies = {term: sum(1 for document in documents if term in document) for term in terms}
+
+    scores: list[float] = []
+    for document, length in zip(documents, lengths, strict=True):
+        score = 0.0
+        for term in terms:
+            frequency = document.get(term, 0)
+            if frequency == 0:
+                continue
+            idf = math.log((len(documents) - document_frequencies[term] + 0.5) / (document_frequencies[term] + 0.5) + 1)
+            score += idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * (1 - BM25_B + BM25_B * length / (average_length or 1)))
+        scores.append(score)
+    return scores
+
+
+def select_text_blocks(blocks: list[dict[str, Any]], query: str | None, cursor: int | None, token_budget: int | None) -> dict[str, Any]:
+    """
+    Orders the text blocks, main content before boilerplate, and returns the ones that fit in the token budget from the cursor on.
+
+    Without a query, the blocks keep the document order within the content and within the boilerplate. With a query, they are ordered by
+    their BM25 score against it, the blocks that do not match any term of the query keeping the document order after the ones that do.
+
+    Args:
+        blocks (list[dict[str, Any]]): The text blocks, in document order, as returned by get_text_blocks.
+        query (str | None): The query to rank the blocks against, or None to keep the document order.
+        cursor (int | None): The position in the ordered blocks to start from, as returned by the previous call. None to start from the first block.
+        token_budget (int | None): The maximum number of tokens of the returned text, as estimated by estimate_tokens. None or 0 for no limit.
+            At least one block is returned, truncated if it exceeds the budget on its own.
+
+    Returns:
+        dict[str, Any]: The 'text' of the selected blocks, the 'next_cursor' (None if there are no more blocks), the number of
+            'boilerplate' blocks after the content, and the 'total' number of blocks.
+    """
+    boilerplate = classify_boilerplate(blocks)
+    scores = rank_bm25([block["text"] for block in blocks], query) if query else [0.0] * len(blocks)
+    order = sorted(range(len(blocks)), key=lambda index: (boilerplate[index], -scores[index], index))
+
+    start = max(0, cursor or 0)
+    selected: list[str] = []
+    used_tokens = 0
+    position = start
+    while position < len(order):
+        text = blocks[order[position]]["text"]
+        tokens = estimate_tokens(text)
+        if token_budget and used_tokens + tokens > token_budget:
+            if not selected:
+                selected.append(text[:token_budget * CHARS_PER_TOKEN] + "...")
+                position += 1
+            break
+        selected.append(text)
+        used_tokens += tokens
+        position += 1
+
+    return {
+        "text": "\n".join(selected),
+        "next_cursor": position if position < len(order) else None,
+        "boilerplate": sum(boilerplate),
+        "total": len(blocks),
+    }
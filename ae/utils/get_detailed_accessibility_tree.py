@@ -1,18 +1,48 @@
+import asyncio
 import json
 import os
 import re
 import traceback
+from collections.abc import Callable
+from collections.abc import Iterator
 from typing import Annotated
 from typing import Any
 
+from playwright.async_api import Frame
 from playwright.async_api import Page
 
-from ae.config import SOURCE_LOG_FOLDER_PATH
 from ae.core.playwright_manager import PlaywrightManager
+from ae.utils.accessibility_node_rules import add_rule_hits
+from ae.utils.accessibility_node_rules import apply_merge_rules
+from ae.utils.accessibility_node_rules import get_rule_hits
+from ae.utils.accessibility_node_rules import has_custom_rules
+from ae.utils.accessibility_node_rules import matches_prune_rule
+from ae.utils.cdp_accessibility_tree import get_cdp_accessibility_snapshot
+from ae.utils.cdp_accessibility_tree import PiercedDocument
+from ae.utils.debug_artifacts import debug_artifacts
+from ae.utils.dom_cache import dom_extraction_cache
+from ae.utils.dom_delta import compute_tree_delta
+from ae.utils.dom_delta import DOMSnapshot
+from ae.utils.dom_delta import get_last_snapshot
+from ae.utils.dom_delta import remember_snapshot
+from ae.utils.dom_frames import get_child_frames
+from ae.utils.dom_frames import get_frame_key
+from ae.utils.dom_frames import get_frame_owner_mmids
+from ae.utils.dom_frames import is_frame_extraction_enabled
+from ae.utils.dom_frames import namespace_mmid
+from ae.utils.dom_mutation_observer import add_mutation_epoch_observer
+from ae.utils.dom_mutation_observer import get_mutation_state
+from ae.utils.dom_offload import get_offload_target
+from ae.utils.dom_offload import OFFLOAD_PROCESS
+from ae.utils.dom_offload import OFFLOAD_THREAD
+from ae.utils.dom_offload import run_offloaded
 from ae.utils.logger import logger
 
 space_delimited_mmid = re.compile(r'^[\d ]+$')
 
+# Maximum time in seconds to extract the DOM of a child frame, slower frames are left out
+FRAME_EXTRACTION_TIMEOUT = 5
+
 def is_space_delimited_mmid(s: str) -> bool:
     """
     Check if the given string matches the the mmid pattern of number space repeated.
@@ -27,41 +57,400 @@ def is_space_delimited_mmid(s: str) -> bool:
     return bool(space_delimited_mmid.fullmatch(s))
 
 
-async def __inject_attributes(page: Page):
+# In-page registry of the mmids assigned to the elements of the document. An element gets an mmid once and keeps it for as long
+# as it is part of the document. Tagging is lazy: the whole document is only walked on the first injection, after which only the
+# elements recorded by a mutation observer are tagged, the ones inserted in the document (so that copies of tagged elements, e.g.
+# cloneNode, get their own mmid instead of a duplicate one) and the ones whose mmid attribute was changed or removed by the page.
+# The light DOM and the open shadow roots are walked together, the shadow roots found are observed as well and kept in the registry
+# so that window.__agente_query_selector can resolve the mmids of their elements.
+# The registry also maps each mmid to a weak reference to its element, so that window.__agente_resolve_mmid finds the element of an
+# [mmid='...'] selector without querying the document. The entries of garbage collected elements are removed by a FinalizationRegistry.
+# page.accessibility.snapshot only returns ARIA properties, so the mmid is also exposed in 'aria-keyshortcuts' when the element is tagged,
+# in the same walk. The elements that have shortcuts of their own keep them, they are listed in the registry and only swapped for the
+# duration of the snapshot, see SET_ARIA_KEYSHORTCUTS_JS.
+INJECT_MMID_JS = """() => {
+    let registry = window.__agente_mmid_registry;
+    let tagged_count = 0;
+    // previousMmid is the mmid attribute the element had before it was tagged, e.g. the one of the element it was cloned from
+    const exposeMmid = (element, previousMmid) => {
+        const mmid = registry.tagged.get(element);
+        const keyshortcuts = element.getAttribute('aria-keyshortcuts');
+        if (keyshortcuts === null || keyshortcuts === registry.exposed.get(element) || (previousMmid !== null && keyshortcuts === previousMmid)) {
+            if (keyshortcuts !== mmid) element.setAttribute('aria-keyshortcuts', mmid);
+            registry.exposed.set(element, mmid);
+            registry.authored_keyshortcuts.delete(element);
+        } else {
+            registry.exposed.delete(element);
+            registry.authored_keyshortcuts.add(element);
+        }
+    };
+    const tag = (element) => {
+        const mmid = `${++registry.next_id}`;
+        const previousMmid = element.getAttribute('mmid');
+        // an element whose mmid was changed by the page gets a new one, its previous entry is stale
+        if (registry.tagged.has(element)) registry.elements.delete(registry.tagged.get(element));
+        element.setAttribute('mmid', mmid);
+        registry.tagged.set(element, mmid);
+        registry.elements.set(mmid, new WeakRef(element));
+        registry.finalizer.register(element, mmid);
+        exposeMmid(element, previousMmid);
+        tagged_count++;
+    };
+    const ensureTagged = (element) => {
+        if (registry.tagged.get(element) !== element.getAttribute('mmid')) {
+            tag(element);
+        } else {
+            exposeMmid(element, null);
+        }
+    };
+    const registerShadowRoot = (shadowRoot) => {
+        if (!registry.shadow_roots.has(shadowRoot)) {
+            registry.shadow_roots.add(shadowRoot);
+            registry.observer.observe(shadowRoot, registry.observer_options);
+            // lets the mutation epoch observer see the changes in the shadow root, see dom_mutation_observer
+            if (window.__agente_observe_shadow_root) window.__agente_observe_shadow_root(shadowRoot);
+        }
+        return shadowRoot;
+    };
+    // Visits the elements of the tree of root, including the content of the open shadow roots, in a single walk
+    const forEachElement = (root, visit) => {
+        const roots = [];
+        const visitElement = (element) => {
+            visit(element);
+            if (element.shadowRoot) roots.push(registerShadowRoot(element.shadowRoot));
+        };
+        if (root.nodeType === Node.ELEMENT_NODE) {
+            visitElement(root);
+        } else {
+            roots.push(root);
+        }
+        while (roots.length > 0) {
+            roots.pop().querySelectorAll('*').forEach(visitElement);
+        }
+    };
+
+    if (!registry) {
+        registry = window.__agente_mmid_registry = {next_id: 0, tagged: new WeakMap(), inserted_roots: new Set(), changed_elements: new Set(),
+                                                    shadow_roots: new Set(), elements: new Map(), exposed: new WeakMap(),
+                                                    authored_keyshortcuts: new Set(), original_keyshortcuts: new Map()};
+        registry.finalizer = new FinalizationRegistry((mmid) => {
+            const elementRef = registry.elements.get(mmid);
+            if (elementRef && elementRef.deref() === undefined) registry.elements.delete(mmid);
+        });
+        registry.record_mutations = (mutationsList) => {
+            for (const mutation of mutationsList) {
+                if (mutation.type === 'attributes') {
+                    registry.changed_elements.add(mutation.target);
+                    continue;
+                }
+                for (const node of mutation.addedNodes) {
+                    if (node.nodeType === Node.ELEMENT_NODE) registry.inserted_roots.add(node);
+                }
+            }
+        };
+        registry.observer = new MutationObserver(registry.record_mutations);
+        registry.observer_options = {subtree: true, childList: true, attributes: true, attributeFilter: ['mmid', 'aria-keyshortcuts']};
+        registry.observer.observe(document, registry.observer_options);
+        // Returns the element of an [mmid='...'] selector from the registry, or null if the selector is not of that form or the entry is
+        // missing or stale (the element left the document or its mmid attribute was changed by the page)
+        window.__agente_resolve_mmid = (selector) => {
+            const match = /^\\s*\\[mmid=['"]?(\\d+)['"]?\\]\\s*$/.exec(selector);
+            if (!match) return null;
+            const element = registry.elements.get(match[1])?.deref();
+            if (!element || !element.isConnected || element.getAttribute('mmid') !== match[1]) return null;
+            return element;
+        };
+        // querySelector that resolves mmids from the registry first, and also looks into the open shadow roots found so far
+        window.__agente_query_selector = (selector) => {
+            const element = window.__agente_resolve_mmid(selector) || document.querySelector(selector);
+            if (element) return element;
+            for (const shadowRoot of registry.shadow_roots) {
+                const shadowElement = shadowRoot.querySelector(selector);
+                if (shadowElement) return shadowElement;
+            }
+            return null;
+        };
+        forEachElement(document, tag);
+    } else {
+        // the mutations not delivered to the observer yet
+        registry.record_mutations(registry.observer.takeRecords());
+        for (const root of registry.inserted_roots) {
+            if (root.isConnected) forEachElement(root, ensureTagged);
+        }
+        for (const element of registry.changed_elements) {
+            if (element.isConnected) ensureTagged(element);
+        }
+        for (const shadowRoot of registry.shadow_roots) {
+            if (!shadowRoot.host.isConnected) registry.shadow_roots.delete(shadowRoot);
+        }
+    }
+    // the mmid attributes set above are not changes of the page
+    registry.observer.takeRecords();
+    registry.inserted_roots.clear();
+    registry.changed_elements.clear();
+    return {tagged_count: tagged_count, last_mmid: registry.next_id, shadow_root_count: registry.shadow_roots.size};
+}"""
+
+# Exposes the mmid of the elements that have shortcuts of their own in their 'aria-keyshortcuts' for the duration of the snapshot of the
+# injection backend, the other elements carry it since they were tagged. The original values are kept in the registry and put back by
+# RESTORE_ARIA_KEYSHORTCUTS_JS. The changes of the page not recorded yet are recorded first, and the swaps themselves are dropped from
+# the records of the registry, they are ignored by the mutation epoch observer.
+SET_ARIA_KEYSHORTCUTS_JS = """() => {
+    const registry = window.__agente_mmid_registry;
+    registry.record_mutations(registry.observer.takeRecords());
+    for (const element of registry.authored_keyshortcuts) {
+        if (!element.isConnected) {
+            // tagged again through the inserted roots if it comes back
+            registry.authored_keyshortcuts.delete(element);
+            continue;
+        }
+        registry.original_keyshortcuts.set(element, element.getAttribute('aria-keyshortcuts'));
+        element.setAttribute('aria-keyshortcuts', registry.tagged.get(element));
+    }
+    registry.observer.takeRecords();
+}"""
+
+RESTORE_ARIA_KEYSHORTCUTS_JS = """() => {
+    const registry = window.__agente_mmid_registry;
+    if (!registry) return;
+    registry.record_mutations(registry.observer.takeRecords());
+    for (const [element, originalValue] of registry.original_keyshortcuts) {
+        if (originalValue === null) {
+            element.removeAttribute('aria-keyshortcuts');
+        } else {
+            element.setAttribute('aria-keyshortcuts', originalValue);
+        }
+    }
+    registry.original_keyshortcuts.clear();
+    registry.observer.takeRecords();
+}"""
+
+
+async def __inject_attributes(page: Page | Frame):
     """
-    Injects 'mmid' and 'aria-keyshortcuts' into all DOM elements. If an element already has an 'aria-keyshortcuts',
-    it renames it to 'orig-aria-keyshortcuts' before injecting the new 'aria-keyshortcuts'
-    This will be captured in the accessibility tree and thus make it easier to reconcile the tree with the DOM.
-    'aria-keyshortcuts' is choosen because it is not widely used aria attribute.
+    Injects an 'mmid' into the DOM elements that do not have one yet.
+
+    The mmids are kept in an in-page registry, so an element keeps its mmid across calls and selectors returned earlier keep working.
+    The 'mmid' attributes, and the copies of the mmids in 'aria-keyshortcuts', are left in place, so that the next call only needs to tag
+    the elements that were added since. The shortcuts set by the page are not modified, see __snapshot_accessibility_tree.
     """
 
-    last_mmid = await page.evaluate("""() => {
-        const allElements = document.querySelectorAll('*');
-        let id = 0;
-        allElements.forEach(element => {
-            const origAriaAttribute = element.getAttribute('aria-keyshortcuts');
-            const mmid = `${++id}`;
-            element.setAttribute('mmid', mmid);
-            element.setAttribute('aria-keyshortcuts', mmid);
-            //console.log(`Injected 'mmid'into element with tag: ${element.tagName} and mmid: ${mmid}`);
-            if (origAriaAttribute) {
-                element.setAttribute('orig-aria-keyshortcuts', origAriaAttribute);
+    injection_result = await page.evaluate(INJECT_MMID_JS)
+    logger.debug(f"Added MMID into {injection_result['tagged_count']} elements, last MMID: {injection_result['last_mmid']}, open shadow roots: {injection_result['shadow_root_count']}")
+
+
+# In-page function that resolves the DOM information for a batch of mmids in a single round trip.
+# Each entry in input_params.entries is {mmid, should_fetch_inner_text}, the result is a list in the same order.
+FETCH_DOM_INFO_JS = """
+(input_params) => {
+    const attributes = input_params.attributes;
+    const tags_to_ignore = input_params.tags_to_ignore;
+    const ids_to_ignore = input_params.ids_to_ignore;
+
+    // Elements in open shadow roots are found through the registry of INJECT_MMID_JS
+    const querySelector = window.__agente_query_selector || ((selector) => document.querySelector(selector));
+
+    const fetchElementInfo = (mmid, should_fetch_inner_text) => {
+        const element = querySelector(`[mmid="${mmid}"]`);
+
+        if (!element) {
+            console.log(`No element found with mmid: ${mmid}`);
+            return null;
+        }
+
+        if (ids_to_ignore.includes(element.id)) {
+            console.log(`Ignoring element with id: ${element.id}`, element);
+            return null;
+        }
+        //Ignore "option" because it would have been processed with the select element
+        if (tags_to_ignore.includes(element.tagName.toLowerCase()) || element.tagName.toLowerCase() === "option") return null;
+
+        let attributes_to_values = {
+            'tag': element.tagName.toLowerCase() // Always include the tag name
+        };
+
+        // If the element is an input, include its type as well
+        if (element.tagName.toLowerCase() === 'input') {
+            attributes_to_values['tag_type'] = element.type; // This will capture 'checkbox', 'radio', etc.
+        }
+        else if (element.tagName.toLowerCase() === 'select') {
+            attributes_to_values["mmid"] = element.getAttribute('mmid');
+            attributes_to_values["role"] = "combobox";
+            attributes_to_values["options"] = [];
+
+            for (const option of element.options) {
+                let option_attributes_to_values = {
+                    "mmid": option.getAttribute('mmid'),
+                    "text": option.text,
+                    "value": option.value,
+                    "selected": option.selected
+                };
+                attributes_to_values["options"].push(option_attributes_to_values);
             }
-        });
-        return id;
-    }""")
-    logger.debug(f"Added MMID into {last_mmid} elements")
+            return attributes_to_values;
+        }
+
+        for (const attribute of attributes) {
+            let value = element.getAttribute(attribute);
+
+            if(value){
+                attributes_to_values[attribute] = value;
+            }
+        }
+
+        if (should_fetch_inner_text && element.innerText) {
+            attributes_to_values['description'] = element.innerText;
+        }
+
+        let role = element.getAttribute('role');
+        if(role==='listbox' || element.tagName.toLowerCase()=== 'ul'){
+            let children=element.children;
+            let attributes_to_include = ['mmid', 'role', 'aria-label','value'];
+            attributes_to_values["additional_info"]=[]
+            for (const child of children) {
+                let children_attributes_to_values = {};
+
+                for (let attr of child.attributes) {
+                    // If the attribute is not in the predefined list, add it to children_attributes_to_values
+                    if (attributes_to_include.includes(attr.name)) {
+                        children_attributes_to_values[attr.name] = attr.value;
+                    }
+                }
+
+                attributes_to_values["additional_info"].push(children_attributes_to_values);
+            }
+        }
+        // Check if attributes_to_values contains more than just 'name', 'role', and 'mmid'
+        const keys = Object.keys(attributes_to_values);
+        const minimalKeys = ['tag', 'mmid'];
+        const hasMoreThanMinimalKeys = keys.length > minimalKeys.length || keys.some(key => !minimalKeys.includes(key));
+
+        if (!hasMoreThanMinimalKeys) {
+            //If there were no attributes found, then try to get the backup attributes
+            for (const backupAttribute of input_params.backup_attributes) {
+                let value = element.getAttribute(backupAttribute);
+                if(value){
+                    attributes_to_values[backupAttribute] = value;
+                }
+            }
+
+            //if even the backup attributes are not found, then return null, which will cause this element to be skipped
+            if(Object.keys(attributes_to_values).length <= minimalKeys.length) {
+                if (element.tagName.toLowerCase() === 'button') {
+                        attributes_to_values["mmid"] = element.getAttribute('mmid');
+                        attributes_to_values["role"] = "button";
+                        attributes_to_values["additional_info"] = [];
+                        let children=element.children;
+                        let attributes_to_exclude = ['width', 'height', 'path', 'class', 'viewBox', 'mmid']
+
+                        // Check if the button has no text and no attributes
+                        if (element.innerText.trim() === '') {
+
+                            for (const child of children) {
+                                let children_attributes_to_values = {};
+
+                                for (let attr of child.attributes) {
+                                    // If the attribute is not in the predefined list, add it to children_attributes_to_values
+                                    if (!attributes_to_exclude.includes(attr.name)) {
+                                        children_attributes_to_values[attr.name] = attr.value;
+                                    }
+                                }
+
+                                attributes_to_values["additional_info"].push(children_attributes_to_values);
+                            }
+                            console.log("Button with no text and no attributes: ", attributes_to_values);
+                            return attributes_to_values;
+                        }
+                }
+
+                return null; // Return null if only minimal keys are present
+            }
+        }
+        return attributes_to_values;
+    };
+
+    return input_params.entries.map(entry => fetchElementInfo(entry.mmid, entry.should_fetch_inner_text));
+}
+"""
+
+
+# In-page function that returns, among the given mmids, the ones of the elements that are not rendered, in a single round trip:
+# not displayed or with visibility hidden (checkVisibility), in an inert or aria-hidden subtree, without any size, or entirely before the
+# start of the document (e.g. skip links moved off screen). Opacity is not checked, transparent inputs are often styled replacements of
+# checkboxes and radios, and form controls without size or off the document are kept when one of their labels is visible. Options are
+# never reported, their visibility is the one of their select.
+FIND_HIDDEN_ELEMENTS_JS = """
+(mmids) => {
+    const querySelector = window.__agente_query_selector || ((selector) => document.querySelector(selector));
+    const isRendered = (element) => element.checkVisibility === undefined || element.checkVisibility({visibilityProperty: true});
+    const isOffDocument = (rect) => (rect.width === 0 && rect.height === 0) || rect.right + window.scrollX <= 0 || rect.bottom + window.scrollY <= 0;
+    // Visually hidden form controls (e.g. sr-only checkboxes) are operated through their label
+    const hasVisibleLabel = (element) => Array.from(element.labels || []).some(label => isRendered(label) && !isOffDocument(label.getBoundingClientRect()));
+    const hidden = [];
+    for (const mmid of mmids) {
+        const element = querySelector(`[mmid="${mmid}"]`);
+        if (!element || element.tagName === 'OPTION') continue;
+        let isHidden = !element.isConnected || element.closest('[inert], [aria-hidden="true"]') !== null || !isRendered(element);
+        if (!isHidden) {
+            isHidden = isOffDocument(element.getBoundingClientRect()) && !hasVisibleLabel(element);
+        }
+        if (isHidden) hidden.push(mmid);
+    }
+    return hidden;
+}
+"""
+
+
+def is_hidden_pruning_enabled() -> bool:
+    """
+    Returns True if the hidden elements are pruned from the DOM before it is reconciled, see DOM_PRUNE_HIDDEN.
+    """
+    return os.getenv("DOM_PRUNE_HIDDEN", "true").lower() == "true"
+
+
+def __get_node_mmid(node: dict[str, Any]) -> int | None:
+    """
+    Extracts the injected mmid of an accessibility node from its 'keyshortcuts' property.
+
+    Args:
+        node (dict[str, Any]): The accessibility node.
+
+    Returns:
+        int | None: The mmid of the node, or None if the node does not carry a valid numeric mmid.
+    """
+    # Use 'name' attribute from the accessibility node as 'mmid'
+    mmid_temp: str = node.get('keyshortcuts') # type: ignore
+
+    # If the name has multiple mmids, take the last one
+    if(mmid_temp and is_space_delimited_mmid(mmid_temp)):
+        #TODO: consider if we should grab each of the mmids and process them separately as seperate nodes copying this node's attributes
+        mmid_temp = mmid_temp.split(' ')[-1]
+
+    #focusing on nodes with mmid, which is the attribute we inject
+    try:
+        return int(mmid_temp)
+    except (ValueError, TypeError):
+        return None
 
 
-async def __fetch_dom_info(page: Page, accessibility_tree: dict[str, Any], only_input_fields: bool):
+async def __fetch_dom_info(page: Page | Frame, accessibility_tree: dict[str, Any], only_input_fields: bool,
+                           dom_info_resolver: Callable[[dict[str, Any]], list[dict[str, Any] | None]] | None = None,
+                           include_hidden: bool = False):
     """
     Iterates over the accessibility tree, fetching additional information from the DOM based on 'mmid',
     and constructs a new JSON structure with detailed information.
 
+    The visibility of all the nodes is checked in a single call into the page first, and the hidden subtrees are dropped before they are
+    reconciled. The DOM information for the remaining nodes is then resolved in a single call into the page, and merged back into the tree.
+
     Args:
-        page (Page): The page object representing the web page.
+        page (Page | Frame): The page, or the frame, whose document the accessibility tree is the one of.
         accessibility_tree (dict[str, Any]): The accessibility tree JSON structure.
         only_input_fields (bool): Flag indicating whether to include only input fields in the new JSON structure.
+        dom_info_resolver (Callable, optional): Resolves the DOM information without calling into the page, given the parameters of FETCH_DOM_INFO_JS.
+            Used by the CDP backend. Defaults to None, which evaluates FETCH_DOM_INFO_JS in the page.
+        include_hidden (bool, optional): If True, the hidden elements are kept. Defaults to False, which prunes them unless
+            DOM_PRUNE_HIDDEN is disabled.
 
     Returns:
         dict[str, Any]: The pruned tree with detailed information from the DOM.
@@ -72,287 +461,176 @@ async def __fetch_dom_info(page: Page, accessibility_tree: dict[str, Any], only_
     attributes = ['name', 'aria-label', 'placeholder', 'mmid', "id", "for", "data-testid"]
     backup_attributes = [] #if the attributes are not found, then try to get these attributes
     tags_to_ignore = ['head','style', 'script', 'link', 'meta', 'noscript', 'template', 'iframe', 'g', 'main', 'c-wiz','svg', 'path']
-    attributes_to_delete = ["level", "multiline", "haspopup", "id", "for"]
     ids_to_ignore = ['agentDriveAutoOverlay']
 
-    # Recursive function to process each node in the accessibility tree
-    async def process_node(node: dict[str, Any]):
-        if 'children' in node:
-            for child in node['children']:
-                await process_node(child)
+    nodes_to_enrich, node_count = __collect_nodes_to_enrich(accessibility_tree)
+
+    if nodes_to_enrich and not include_hidden and is_hidden_pruning_enabled():
+        hidden_mmids: list[int] = await page.evaluate(FIND_HIDDEN_ELEMENTS_JS, sorted({mmid for _, mmid, _ in nodes_to_enrich}))
+        if hidden_mmids:
+            hidden_count = __mark_hidden_subtrees(accessibility_tree, set(hidden_mmids))
+            logger.debug(f"Pruning {hidden_count} hidden elements out of {len(nodes_to_enrich)} before reconciling them")
+            nodes_to_enrich, node_count = __collect_nodes_to_enrich(accessibility_tree)
+
+    # The same mmid can be referenced by more than one node, fetch each (mmid, should_fetch_inner_text) combination only once
+    entries: dict[tuple[int, bool], int] = {}
+    for _, mmid, should_fetch_inner_text in nodes_to_enrich:
+        entries.setdefault((mmid, should_fetch_inner_text), len(entries))
+
+    # Large trees are merged and pruned off the event loop, in a worker process if they are large enough and the rules can be run there
+    offload_target = get_offload_target(node_count, picklable=not has_custom_rules())
+
+    # Fetch attributes and possibly 'innerText' from the DOM elements by 'mmid' in a single round trip
+    elements_attributes: list[dict[str, Any] | None] = []
+    if entries:
+        dom_info_params = {"entries": [{"mmid": mmid, "should_fetch_inner_text": should_fetch_inner_text} for mmid, should_fetch_inner_text in entries],
+                           "attributes": attributes, "backup_attributes": backup_attributes,
+                           "tags_to_ignore": tags_to_ignore,
+                           "ids_to_ignore": ids_to_ignore}
+        if dom_info_resolver is not None:
+            # The resolver holds the DOM of the CDP snapshot, it can only leave the event loop for a thread
+            elements_attributes = await run_offloaded(OFFLOAD_THREAD if offload_target is not None else None, dom_info_resolver, dom_info_params)
+        else:
+            elements_attributes = await page.evaluate(FETCH_DOM_INFO_JS, dom_info_params)
+    logger.debug(f"Fetched DOM info for {len(entries)} elements")
 
-        # Use 'name' attribute from the accessibility node as 'mmid'
-        mmid_temp: str = node.get('keyshortcuts') # type: ignore
+    if offload_target is not None:
+        logger.debug(f"Merging and pruning {node_count} nodes in a {offload_target}")
+    pruned_tree, rule_hits = await run_offloaded(offload_target, __merge_and_prune, accessibility_tree, only_input_fields, entries, elements_attributes)
+    if offload_target == OFFLOAD_PROCESS:
+        # The hit counters of the rules were incremented in the worker process
+        add_rule_hits(rule_hits)
+
+    logger.debug("Reconciliation complete")
+    return pruned_tree
 
-        # If the name has multiple mmids, take the last one
-        if(mmid_temp and is_space_delimited_mmid(mmid_temp)):
-            #TODO: consider if we should grab each of the mmids and process them separately as seperate nodes copying this node's attributes
-            mmid_temp = mmid_temp.split(' ')[-1]
 
-        #focusing on nodes with mmid, which is the attribute we inject
-        try:
-            mmid = int(mmid_temp)
-        except (ValueError, TypeError):
-            #logger.error(f"'name attribute contains \"{node.get('name')}\", which is not a valid numeric mmid. Adding node as is: {node}")
-            return node.get('name')
+def __collect_nodes_to_enrich(accessibility_tree: dict[str, Any]) -> tuple[list[tuple[dict[str, Any], int, bool]], int]:
+    """
+    Collects the nodes of the accessibility tree that carry an mmid and need to be reconciled with the DOM, in post order.
+    The subtrees marked for deletion are skipped.
+
+    Returns:
+        tuple: (node, mmid, should_fetch_inner_text) for every node to reconcile, and the number of nodes of the tree.
+    """
+    nodes_to_enrich: list[tuple[dict[str, Any], int, bool]] = []
+    node_count = 0
+
+    # Post order walk with an explicit stack, so that deep pages do not hit the recursion limit. Each node is pushed a second time
+    # under its children, and collected when it is popped again
+    stack: list[tuple[dict[str, Any], bool]] = [(accessibility_tree, False)]
+    while stack:
+        node, children_visited = stack.pop()
+        if not children_visited:
+            if "marked_for_deletion_by_mm" in node:
+                continue
+            node_count += 1
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.get('children', [])))
+            continue
+
+        mmid = __get_node_mmid(node)
+        if mmid is None:
+            continue
 
         if node['role'] == 'menuitem':
-            return node.get('name')
+            continue
 
         if node.get('role') == 'dialog' and node.get('modal') == True:  # noqa: E712
             node["important information"] = "This is a modal dialog. Please interact with this dialog and close it to be able to interact with the full page (e.g. by pressing the close button or selecting an option)."
 
         if mmid:
             # Determine if we need to fetch 'innerText' based on the absence of 'children' in the accessibility node
-            should_fetch_inner_text = 'children' not in node
-
-            js_code = """
-            (input_params) => {
-                const should_fetch_inner_text = input_params.should_fetch_inner_text;
-                const mmid = input_params.mmid;
-                const attributes = input_params.attributes;
-                const tags_to_ignore = input_params.tags_to_ignore;
-                const ids_to_ignore = input_params.ids_to_ignore;
+            nodes_to_enrich.append((node, mmid, 'children' not in node))
+        else:
+            logger.debug(f"No element found with mmid: {mmid}, deleting node: {node}")
+            node["marked_for_deletion_by_mm"] = True
 
-                const element = document.querySelector(`[mmid="${mmid}"]`);
+    return nodes_to_enrich, node_count
 
-                if (!element) {
-                    console.log(`No element found with mmid: ${mmid}`);
-                    return null;
-                }
 
-                if (ids_to_ignore.includes(element.id)) {
-                    console.log(`Ignoring element with id: ${element.id}`, element);
-                    return null;
-                }
-                //Ignore "option" because it would have been processed with the select element
-                if (tags_to_ignore.includes(element.tagName.toLowerCase()) || element.tagName.toLowerCase() === "option") return null;
-
-                let attributes_to_values = {
-                    'tag': element.tagName.toLowerCase() // Always include the tag name
-                };
+def __mark_hidden_subtrees(accessibility_tree: dict[str, Any], hidden_mmids: set[int]) -> int:
+    """
+    Marks for deletion the nodes of hidden elements that have no visible element under them, so that their subtrees are neither
+    reconciled with the DOM nor returned. A hidden container with a visible descendant (e.g. a visibility hidden wrapper of a
+    visible child) is kept. The root of the tree is never marked.
 
-                // If the element is an input, include its type as well
-                if (element.tagName.toLowerCase() === 'input') {
-                    attributes_to_values['tag_type'] = element.type; // This will capture 'checkbox', 'radio', etc.
-                }
-                else if (element.tagName.toLowerCase() === 'select') {
-                    attributes_to_values["mmid"] = element.getAttribute('mmid');
-                    attributes_to_values["role"] = "combobox";
-                    attributes_to_values["options"] = [];
-
-                    for (const option of element.options) {
-                        let option_attributes_to_values = {
-                            "mmid": option.getAttribute('mmid'),
-                            "text": option.text,
-                            "value": option.value,
-                            "selected": option.selected
-                        };
-                        attributes_to_values["options"].push(option_attributes_to_values);
-                    }
-                    return attributes_to_values;
-                }
+    Args:
+        accessibility_tree (dict[str, Any]): The raw accessibility tree, modified in place.
+        hidden_mmids (set[int]): The mmids of the hidden elements, as returned by FIND_HIDDEN_ELEMENTS_JS.
 
-                for (const attribute of attributes) {
-                    let value = element.getAttribute(attribute);
+    Returns:
+        int: The number of nodes marked for deletion.
+    """
+    marked_count = 0
+
+    # Whether the subtree of each visited node has a visible element, by id of the node. The nodes without an mmid (e.g. text) are
+    # only visible if their element is. Walked in post order with an explicit stack, as in __collect_nodes_to_enrich
+    subtree_is_visible: dict[int, bool] = {}
+    stack: list[tuple[dict[str, Any], bool]] = [(accessibility_tree, False)]
+    while stack:
+        node, children_visited = stack.pop()
+        children = node.get('children', [])
+        if not children_visited:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(children))
+            continue
+
+        has_visible_descendant = any([subtree_is_visible.pop(id(child)) for child in children])
+        mmid = __get_node_mmid(node)
+        if mmid is None or has_visible_descendant:
+            subtree_is_visible[id(node)] = has_visible_descendant
+        elif mmid not in hidden_mmids:
+            subtree_is_visible[id(node)] = True
+        else:
+            if node is not accessibility_tree:
+                node["marked_for_deletion_by_mm"] = True
+                marked_count += 1
+            subtree_is_visible[id(node)] = False
 
-                    if(value){
-                        /*
-                        if(attribute === 'href'){
-                            value = value.split('?')[0]
-                        }
-                        */
-                        attributes_to_values[attribute] = value;
-                    }
-                }
+    return marked_count
 
-                if (should_fetch_inner_text && element.innerText) {
-                    attributes_to_values['description'] = element.innerText;
-                }
 
-                let role = element.getAttribute('role');
-                if(role==='listbox' || element.tagName.toLowerCase()=== 'ul'){
-                    let children=element.children;
-                    let filtered_children = Array.from(children).filter(child => child.getAttribute('role') === 'option');
-                    console.log("Listbox or ul found: ", filtered_children);
-                    let attributes_to_include = ['mmid', 'role', 'aria-label','value'];
-                    attributes_to_values["additional_info"]=[]
-                    for (const child of children) {
-                        let children_attributes_to_values = {};
-
-                        for (let attr of child.attributes) {
-                            // If the attribute is not in the predefined list, add it to children_attributes_to_values
-                            if (attributes_to_include.includes(attr.name)) {
-                                children_attributes_to_values[attr.name] = attr.value;
-                            }
-                        }
+def __merge_and_prune(accessibility_tree: dict[str, Any], only_input_fields: bool, entries: dict[tuple[int, bool], int],
+                      elements_attributes: list[dict[str, Any] | None]) -> tuple[dict[str, Any] | None, dict[str, int]]:
+    """
+    Merges the information fetched from the DOM into the accessibility nodes and prunes the tree. This is the CPU bound part of
+    __fetch_dom_info, it does not touch the page so that it can run in a thread or in a worker process.
 
-                        attributes_to_values["additional_info"].push(children_attributes_to_values);
-                    }
-                }
-                // Check if attributes_to_values contains more than just 'name', 'role', and 'mmid'
-                const keys = Object.keys(attributes_to_values);
-                const minimalKeys = ['tag', 'mmid'];
-                const hasMoreThanMinimalKeys = keys.length > minimalKeys.length || keys.some(key => !minimalKeys.includes(key));
-
-                if (!hasMoreThanMinimalKeys) {
-                    //If there were no attributes found, then try to get the backup attributes
-                    for (const backupAttribute of input_params.backup_attributes) {
-                        let value = element.getAttribute(backupAttribute);
-                        if(value){
-                            attributes_to_values[backupAttribute] = value;
-                        }
-                    }
+    Args:
+        accessibility_tree (dict[str, Any]): The accessibility tree, modified in place.
+        only_input_fields (bool): Flag indicating whether to include only input fields in the pruned tree.
+        entries (dict[tuple[int, bool], int]): The index in elements_attributes of each (mmid, should_fetch_inner_text) combination.
+        elements_attributes (list[dict[str, Any] | None]): The information fetched from the DOM.
 
-                    //if even the backup attributes are not found, then return null, which will cause this element to be skipped
-                    if(Object.keys(attributes_to_values).length <= minimalKeys.length) {
-                        if (element.tagName.toLowerCase() === 'button') {
-                                attributes_to_values["mmid"] = element.getAttribute('mmid');
-                                attributes_to_values["role"] = "button";
-                                attributes_to_values["additional_info"] = [];
-                                let children=element.children;
-                                let attributes_to_exclude = ['width', 'height', 'path', 'class', 'viewBox', 'mmid']
-
-                                // Check if the button has no text and no attributes
-                                if (element.innerText.trim() === '') {
-
-                                    for (const child of children) {
-                                        let children_attributes_to_values = {};
-
-                                        for (let attr of child.attributes) {
-                                            // If the attribute is not in the predefined list, add it to children_attributes_to_values
-                                            if (!attributes_to_exclude.includes(attr.name)) {
-                                                children_attributes_to_values[attr.name] = attr.value;
-                                            }
-                                        }
-
-                                        attributes_to_values["additional_info"].push(children_attributes_to_values);
-                                    }
-                                    console.log("Button with no text and no attributes: ", attributes_to_values);
-                                    return attributes_to_values;
-                                }
-                        }
+    Returns:
+        tuple: The pruned tree, and the number of hits of each rule during the merge and the pruning.
+    """
+    hits_before = get_rule_hits()
+    # Collected again rather than passed, the nodes must be the ones of this copy of the tree when running in a worker process
+    nodes_to_enrich, _ = __collect_nodes_to_enrich(accessibility_tree)
+    for node, mmid, should_fetch_inner_text in nodes_to_enrich:
+        element_attributes = elements_attributes[entries[(mmid, should_fetch_inner_text)]]
+        if 'keyshortcuts' in node:
+            del node['keyshortcuts'] #remove keyshortcuts since it is not needed
 
-                        return null; // Return null if only minimal keys are present
-                    }
-                }
-                return attributes_to_values;
-            }
-            """
-
-            # Fetch attributes and possibly 'innerText' from the DOM element by 'mmid'
-            element_attributes = await page.evaluate(js_code,
-                                                     {"mmid": mmid, "attributes": attributes, "backup_attributes": backup_attributes,
-                                                      "should_fetch_inner_text": should_fetch_inner_text,
-                                                      "tags_to_ignore": tags_to_ignore,
-                                                      "ids_to_ignore": ids_to_ignore})
-
-            if 'keyshortcuts' in node:
-                    del node['keyshortcuts'] #remove keyshortcuts since it is not needed
-
-            node["mmid"]=mmid
-
-            # Update the node with fetched information
-            if element_attributes:
-                node.update(element_attributes)
-
-                # check if 'name' and 'mmid' are the same
-                if node.get('name') == node.get('mmid') and node.get('role') != "textbox":
-                    del node['name']  # Remove 'name' from the node
-
-                if 'name' in node and 'description' in node and (node['name'] == node['description'] or node['name'] == node['description'].replace('\n', ' ') or node['description'].replace('\n', '') in node['name']):
-                    del node['description'] #if the name is same as description, then remove the description to avoid duplication
-
-                if 'name' in node and 'aria-label' in node and  node['aria-label'] in node['name']:
-                    del node['aria-label'] #if the name is same as the aria-label, then remove the aria-label to avoid duplication
-
-                if 'name' in node and 'text' in node and node['name'] == node['text']:
-                    del node['text'] #if the name is same as the text, then remove the text to avoid duplication
-
-                if node.get('tag') == "select": #children are not needed for select menus since "options" attriburte is already added
-                    node.pop("children", None)
-                    node.pop("role", None)
-                    node.pop("description", None)
-
-                #role and tag can have the same info. Get rid of role if it is the same as tag
-                if node.get('role') == node.get('tag'):
-                    del node['role']
-
-                # avoid duplicate aria-label
-                if node.get("aria-label") and node.get("placeholder") and node.get("aria-label") == node.get("placeholder"):
-                    del node["aria-label"]
-
-                if node.get("role") == "link":
-                    del node["role"]
-                    if node.get("description"):
-                        node["text"] = node["description"]
-                        del node["description"]
-
-                #textbox just means a text input and that is expressed well enough with the rest of the attributes returned
-                #if node.get('role') == "textbox":
-                #    del node['role']
-
-                if node.get('role') == "textbox":
-                    #get the id attribute of this field from the DOM
-                    if "id" in element_attributes and element_attributes["id"]:
-                        #find if there is an element in the DOM that has this id in aria-labelledby.
-                        js_code = """
-                        (inputParams) => {
-                            let referencingElements = [];
-                            const referencedElement = document.querySelector(`[aria-labelledby="${inputParams.aria_labelled_by_query_value}"]`);
-                            if(referencedElement) {
-                                const mmid = referencedElement.getAttribute('mmid');
-                                if (mmid) {
-                                    return {"mmid": mmid, "tag": referencedElement.tagName.toLowerCase()};
-                                }
-                            }
-                            return null;
-                        }
-                        """
-                    #textbox just means a text input and that is expressed well enough with the rest of the attributes returned
-                    #del node['role']
-
-            #remove attributes that are not needed once processing of a node is complete
-            for attribute_to_delete in attributes_to_delete:
-                if attribute_to_delete in node:
-                    node.pop(attribute_to_delete, None)
-        else:
-            logger.debug(f"No element found with mmid: {mmid}, deleting node: {node}")
-            node["marked_for_deletion_by_mm"] = True
+        node["mmid"] = mmid
 
+        # Update the node with fetched information
+        if element_attributes:
+            node.update(element_attributes)
 
-    # Process each node in the tree starting from the root
-    await process_node(accessibility_tree)
+        # Deduplicate and rewrite the attributes of the node, see accessibility_node_rules
+        apply_merge_rules(node, bool(element_attributes))
 
     pruned_tree = __prune_tree(accessibility_tree, only_input_fields)
-
-    logger.debug("Reconciliation complete")
-    return pruned_tree
-
-
-async def __cleanup_dom(page: Page):
-    """
-    Cleans up the DOM by removing injected 'aria-description' attributes and restoring any original 'aria-keyshortcuts'
-    from 'orig-aria-keyshortcuts'.
-    """
-    logger.debug("Cleaning up the DOM's previous injections")
-    await page.evaluate("""() => {
-        const allElements = document.querySelectorAll('*[mmid]');
-        allElements.forEach(element => {
-            element.removeAttribute('aria-keyshortcuts');
-            const origAriaLabel = element.getAttribute('orig-aria-keyshortcuts');
-            if (origAriaLabel) {
-                element.setAttribute('aria-keyshortcuts', origAriaLabel);
-                element.removeAttribute('orig-aria-keyshortcuts');
-            }
-        });
-    }""")
-    logger.debug("DOM cleanup complete")
+    hits_after = get_rule_hits()
+    return pruned_tree, {name: hits_after[name] - hits_before.get(name, 0) for name in hits_after}
 
 
 def __prune_tree(node: dict[str, Any], only_input_fields: bool) -> dict[str, Any] | None:
     """
-    Recursively prunes a tree starting from `node`, based on pruning conditions and handling of 'unraveling'.
+    Prunes a tree starting from `node`, based on pruning conditions and handling of 'unraveling'.
 
     The function has two main jobs:
     1. Pruning: Remove nodes that don't meet certain conditions, like being marked for deletion.
@@ -363,61 +641,87 @@ def __prune_tree(node: dict[str, Any], only_input_fields: bool) -> dict[str, Any
     be cautious about modifying the tree outside this function during a prune operation.
 
     Args:
-    - node (Dict[str, Any]): The node we're currently looking at. We'll check this node, its children,
-      and so on, recursively down the tree.
+    - node (Dict[str, Any]): The root of the tree to prune.
     - only_input_fields (bool): If True, we're only interested in pruning input-related nodes (like form fields).
       This lets you narrow the focus if, for example, you're only interested in cleaning up form-related parts
       of a larger tree.
 
     Returns:
     - dict[str, Any] | None: The pruned version of `node`, or None if `node` was pruned away. When we 'unravel'
-      a node, we directly replace it with its children in the parent's list of children, so the return value
-      will be the parent, updated in place.
+      a node, we directly replace it with its children in the parent's list of children.
 
     Notes:
     - 'marked_for_deletion_by_mm' is our flag for nodes that should definitely be removed.
     - Unraveling is neat for flattening the tree when a node is just a wrapper without semantic meaning.
-    - We use a while loop with manual index management to safely modify the list of children as we iterate over it.
+      The lifted children are kept as they are, without being pruned themselves.
+    - The tree is walked in post order with an explicit stack, so deep pages do not hit the recursion limit,
+      and the new list of children of each node is built once, in linear time.
     """
     if "marked_for_deletion_by_mm" in node:
         return None
 
-    if 'children' in node:
-        i = 0
-        while i < len(node['children']):
-            child = node['children'][i]
-            if 'marked_for_unravel_children' in child:
-                # Replace the current child with its children
-                if 'children' in child:
-                    node['children'] = node['children'][:i] + child['children'] + node['children'][i+1:]
-                    i += len(child['children']) - 1  # Adjust the index for the new children
-                else:
-                    # If the node marked for unraveling has no children, remove it
-                    node['children'].pop(i)
-                    i -= 1  # Adjust the index since we removed an element
+    # Each entry is (node, iterator over its original children or None, the children kept so far)
+    stack: list[tuple[dict[str, Any], Iterator[dict[str, Any]] | None, list[dict[str, Any]]]] = [
+        (node, iter(node['children']) if 'children' in node else None, [])]
+    while stack:
+        current, children_iterator, kept_children = stack[-1]
+        descended = False
+        if children_iterator is not None:
+            for child in children_iterator:
+                if 'marked_for_unravel_children' in child:
+                    # Replace the child with its children, if it has no children it is simply removed
+                    kept_children.extend(child.get('children', []))
+                elif "marked_for_deletion_by_mm" not in child:
+                    # Prune the child before coming back to the rest of the children of the current node
+                    stack.append((child, iter(child['children']) if 'children' in child else None, []))
+                    descended = True
+                    break
+        if descended:
+            continue
+
+        stack.pop()
+        if children_iterator is not None:
+            # After processing all children, if there are no children left, remove the children array
+            if kept_children:
+                current['children'] = kept_children
             else:
-                # Recursively prune the child if it's not marked for unraveling
-                pruned_child = __prune_tree(child, only_input_fields)
-                if pruned_child is None:
-                    # If the child is pruned, remove it from the children list
-                    node['children'].pop(i)
-                    i -= 1  # Adjust the index since we removed an element
-                else:
-                    # Update the child with the pruned version
-                    node['children'][i] = pruned_child
-            i += 1  # Move to the next child
+                del current['children']
+
+        # Apply existing conditions to decide if the current node should be pruned
+        is_pruned = __should_prune_node(current, only_input_fields)
+        if not stack:
+            return None if is_pruned else current
+        if not is_pruned:
+            stack[-1][2].append(current)
+    return None
 
-        # After processing all children, if the children array is empty, remove it
-        if not node['children']:
-            del node['children']
 
-    # Apply existing conditions to decide if the current node should be pruned
-    return None if __should_prune_node(node, only_input_fields) else node
+def __filter_input_fields(tree: dict[str, Any]) -> dict[str, Any] | None:
+    """
+    Prunes a tree that was pruned for all the fields down to the input fields, leaving the given tree untouched.
+    Pruning for all the fields and then for input fields gives the same tree as pruning for input fields directly.
+
+    Args:
+        tree (dict[str, Any]): The tree pruned for all the fields, e.g. from the cache.
+
+    Returns:
+        dict[str, Any] | None: The tree pruned for input fields.
+    """
+    # __prune_tree only modifies the node dictionaries and the children lists, so copying those is enough
+    tree_copy = dict(tree)
+    stack = [tree_copy]
+    while stack:
+        node = stack.pop()
+        if 'children' in node:
+            node['children'] = [dict(child) for child in node['children']]
+            stack.extend(node['children'])
+    return __prune_tree(tree_copy, True)
 
 
 def __should_prune_node(node: dict[str, Any], only_input_fields: bool):
     """
     Determines if a node should be pruned based on its 'role' and 'element_attributes'.
+    The conditions are the prune rules in accessibility_node_rules.
 
     Args:
         node (dict[str, Any]): The node to be evaluated.
@@ -426,34 +730,13 @@ def __should_prune_node(node: dict[str, Any], only_input_fields: bool):
     Returns:
         bool: True if the node should be pruned, False otherwise.
     """
-    #If the request is for only input fields and this is not an input field, then mark the node for prunning
-    if node.get("role") != "WebArea" and only_input_fields and not (node.get("tag") in ("input", "button", "textarea") or node.get("role") == "button"):
-        return True
-
-    if node.get('role') == 'generic' and 'children' not in node and not ('name' in node and node.get('name')):  # The presence of 'children' is checked after potentially deleting it above
-        return True
-
-    if node.get('role') in ['separator', 'LineBreak']:
-        return True
-    processed_name = ""
-    if 'name' in node:
-        processed_name:str =node.get('name') # type: ignore
-        processed_name = processed_name.replace(',', '')
-        processed_name = processed_name.replace(':', '')
-        processed_name = processed_name.replace('\n', '')
-        processed_name = processed_name.strip()
-        if len(processed_name) <3:
-            processed_name = ""
-
-    #check if the node only have name and role, then delete that node
-    if len(node) == 2 and 'name' in node and 'role' in node and not (node.get('role') == "text" and processed_name != ""):
-        return True
-    return False
+    return matches_prune_rule(node, only_input_fields)
 
 async def get_node_dom_element(page: Page, mmid: str):
     return await page.evaluate("""
         (mmid) => {
-            return document.querySelector(`[mmid="${mmid}"]`);
+            const querySelector = window.__agente_query_selector || ((selector) => document.querySelector(selector));
+            return querySelector(`[mmid="${mmid}"]`);
         }
     """, mmid)
 
@@ -463,7 +746,8 @@ async def get_element_attributes(page: Page, mmid: str, attributes: list[str]):
         (inputParams) => {
             const mmid = inputParams.mmid;
             const attributes = inputParams.attributes;
-            const element = document.querySelector(`[mmid="${mmid}"]`);
+            const querySelector = window.__agente_query_selector || ((selector) => document.querySelector(selector));
+            const element = querySelector(`[mmid="${mmid}"]`);
             if (!element) return null;  // Return null if element is not found
 
             let attrs = {};
@@ -493,7 +777,154 @@ async def get_dom_with_accessibility_info() -> Annotated[dict[str, Any] | None,
     return await do_get_accessibility_info(page)
 
 
-async def do_get_accessibility_info(page: Page, only_input_fields: bool = False):
+async def __inject_attributes_in_frames(page: Page, child_frames: list[Frame]):
+    """
+    Injects the mmids in the main frame and in the child frames, concurrently.
+    The child frames also get the observer that maintains their mutation epoch.
+    """
+    async def inject_child_frame(frame: Frame):
+        await add_mutation_epoch_observer(frame)
+        await __inject_attributes(frame)
+
+    results = await asyncio.gather(__inject_attributes(page), *[inject_child_frame(frame) for frame in child_frames],
+                                   return_exceptions=True)
+    if isinstance(results[0], BaseException):
+        raise results[0]
+    for frame, result in zip(child_frames, results[1:], strict=True):
+        if isinstance(result, BaseException):
+            logger.debug(f"Could not inject the mmids in the frame {frame.url}: {result}")
+
+
+async def __snapshot_accessibility_tree(page: Page, pierced_document: PiercedDocument | None = None) -> tuple[dict[str, Any], Callable[[dict[str, Any]], list[dict[str, Any] | None]] | None]:
+    """
+    Takes the raw accessibility snapshot of the main frame of the page with the configured backend, see DOM_EXTRACTION_BACKEND.
+    The mmids must have been injected beforehand. The CDP backend reads the DOM from pierced_document when it is given.
+
+    Returns:
+        tuple: The raw accessibility tree, and the resolver of the DOM information to pass to __fetch_dom_info (None to evaluate it in the page).
+    """
+    dom_info_resolver = None
+    backend = os.getenv("DOM_EXTRACTION_BACKEND", "injection").lower()
+    logger.debug(f"Extracting the accessibility tree with the {backend} backend")
+    if backend == "cdp":
+        accessibility_tree, dom_info_resolver = await get_cdp_accessibility_snapshot(page, pierced_document=pierced_document)
+    else:
+        # The elements with shortcuts of their own only expose their mmid in 'aria-keyshortcuts' while the snapshot is taken
+        await page.evaluate(SET_ARIA_KEYSHORTCUTS_JS)
+        try:
+            accessibility_tree: dict[str, Any] = await page.accessibility.snapshot(interesting_only=True)  # type: ignore
+        finally:
+            await page.evaluate(RESTORE_ARIA_KEYSHORTCUTS_JS)
+
+    # The raw tree is enriched in place afterwards, so it is serialized before returning (when sampled), without indentation to keep it fast
+    await debug_artifacts.write_snapshot('json_accessibility_dom.json', lambda: json.dumps(accessibility_tree))
+
+    return accessibility_tree, dom_info_resolver
+
+
+async def __extract_main_frame_tree(page: Page, include_hidden: bool = False, pierced_document: PiercedDocument | None = None) -> dict[str, Any] | None:
+    """
+    Takes the accessibility snapshot of the main frame and enriches it with the information from the DOM.
+    The hidden elements are pruned unless include_hidden is True.
+
+    Returns:
+        dict[str, Any] | None: The enriched tree, pruned for all the fields, or None if an error occurred.
+    """
+    accessibility_tree, dom_info_resolver = await __snapshot_accessibility_tree(page, pierced_document)
+
+    try:
+        # Always extract all the fields, so that the cached tree can also serve input fields
+        enhanced_tree = await __fetch_dom_info(page, accessibility_tree, False, dom_info_resolver, include_hidden)
+        logger.debug(f"Enhanced Accessibility Tree ready, node rule hits so far: {get_rule_hits()}")
+        return enhanced_tree
+    except Exception as e:
+        logger.error(f"Error while fetching DOM info: {e}")
+        traceback.print_exc()
+        debug_artifacts.write('json_accessibility_dom.json', lambda: json.dumps(accessibility_tree), failed=True)
+        return None
+
+
+async def __extract_child_frame_tree(page: Page, frame: Frame, pierced_document: PiercedDocument, include_hidden: bool = False) -> dict[str, Any] | None:
+    """
+    Extracts the enriched accessibility tree of a child frame over CDP, with its mmids namespaced with the key of the frame.
+    The document of an in-process frame is looked up in pierced_document. The hidden elements are pruned unless include_hidden is True.
+    """
+    owner_mmids = await get_frame_owner_mmids(frame)
+    if owner_mmids is None:
+        return None
+    accessibility_tree, dom_info_resolver = await get_cdp_accessibility_snapshot(page, frame, owner_mmids, pierced_document)
+    if accessibility_tree is None:
+        return None
+    # The visibility of the elements is checked in the document of the frame
+    frame_tree = await __fetch_dom_info(frame, accessibility_tree, False, dom_info_resolver, include_hidden)
+    if frame_tree is None or 'children' not in frame_tree:
+        return None
+
+    frame_key = get_frame_key(page, frame)
+    stack = [frame_tree]
+    while stack:
+        node = stack.pop()
+        if 'mmid' in node:
+            node['mmid'] = namespace_mmid(frame_key, node['mmid'])
+        for option in node.get('options', []):
+            if 'mmid' in option:
+                option['mmid'] = namespace_mmid(frame_key, option['mmid'])
+        stack.extend(node.get('children', []))
+    # The mmid of the frame element in the parent frame, as shown in the tree of the parent frame
+    parent_frame = frame.parent_frame
+    owner_mmid = owner_mmids[-1] if parent_frame == page.main_frame else namespace_mmid(get_frame_key(page, parent_frame), owner_mmids[-1])  # type: ignore
+    return {"role": "Iframe", "name": frame_tree.get("name") or frame.name or frame.url, "owner_mmid": owner_mmid, "children": frame_tree["children"]}
+
+
+async def __extract_child_frame_trees(page: Page, child_frames: list[Frame], include_hidden: bool = False,
+                                      pierced_document: PiercedDocument | None = None) -> list[dict[str, Any]]:
+    """
+    Extracts the trees of the child frames concurrently. Frames that fail or take longer than FRAME_EXTRACTION_TIMEOUT seconds are left out.
+    The DOM of the page, which holds the documents of the in-process frames, is fetched once for all of them, or taken from pierced_document.
+    """
+    if pierced_document is None:
+        pierced_document = PiercedDocument(page)
+
+    async def extract(frame: Frame) -> dict[str, Any] | None:
+        try:
+            return await asyncio.wait_for(__extract_child_frame_tree(page, frame, pierced_document, include_hidden), FRAME_EXTRACTION_TIMEOUT)
+        except Exception as e:
+            logger.debug(f"Could not extract the DOM of the frame {frame.url}: {e!r}")
+            return None
+
+    frame_trees = await asyncio.gather(*[extract(frame) for frame in child_frames])
+    return [frame_tree for frame_tree in frame_trees if frame_tree is not None]
+
+
+def __graft_frame_trees(tree: dict[str, Any], frame_trees: list[dict[str, Any]]):
+    """
+    Places the tree of each child frame under the node of its frame element, or at the end of the page if the frame element is not in the tree.
+    """
+    nodes_by_mmid: dict[str, dict[str, Any]] = {}
+    stack = [tree, *frame_trees]
+    while stack:
+        node = stack.pop()
+        if 'mmid' in node:
+            nodes_by_mmid[str(node['mmid'])] = node
+        stack.extend(node.get('children', []))
+    for frame_tree in frame_trees:
+        owner = nodes_by_mmid.get(str(frame_tree.pop('owner_mmid')), tree)
+        owner.setdefault('children', []).append(frame_tree)
+
+
+async def __get_mutation_state(page: Page, child_frames: list[Frame]) -> tuple[str, int] | None:
+    """
+    Returns the mutation state of the page and its child frames, which is only the same between two calls if none of the documents changed.
+    None if the mutation state of any of the documents is unknown.
+    """
+    mutation_states = await asyncio.gather(get_mutation_state(page), *[get_mutation_state(frame) for frame in child_frames])
+    if any(mutation_state is None for mutation_state in mutation_states):
+        return None
+    # Mutation epochs only increase, so the sum of the epochs of the same documents changes whenever one of them changes
+    return "|".join(mutation_state[0] for mutation_state in mutation_states), sum(mutation_state[1] for mutation_state in mutation_states)  # type: ignore
+
+
+async def do_get_accessibility_info(page: Page, only_input_fields: bool = False, include_hidden: bool = False):
     """
     Retrieves the accessibility information of a web page and saves it as JSON files.
 
@@ -501,29 +932,255 @@ async def do_get_accessibility_info(page: Page, only_input_fields: bool = False)
         page (Page): The page object representing the web page.
         only_input_fields (bool, optional): If True, only retrieves accessibility information for input fields.
             Defaults to False.
+        include_hidden (bool, optional): If True, the elements that are not rendered (display none, visibility hidden, inert,
+            aria-hidden, without size or off the document) are kept. Defaults to False. Such a tree is neither cached
+            nor used as the baseline of the next delta.
 
     Returns:
         dict[str, Any] or None: The enhanced accessibility tree as a dictionary, or None if an error occurred.
+
+    The tree for all the fields is cached per page until the DOM changes. The tree for input fields is filtered from it.
+    The child frames are extracted concurrently with the main frame (see DOM_INCLUDE_FRAMES), their trees are placed under their frame element.
     """
-    await __inject_attributes(page)
-    accessibility_tree: dict[str, Any] = await page.accessibility.snapshot(interesting_only=True)  # type: ignore
+    child_frames = get_child_frames(page) if is_frame_extraction_enabled() else []
+    mutation_state = await __get_mutation_state(page, child_frames)
+    cached_tree = dom_extraction_cache.get(page, page.main_frame, mutation_state) if not include_hidden else None
+    if cached_tree is not None:
+        logger.debug("DOM has not changed since the last extraction, using the cached accessibility tree")
+        if only_input_fields:
+            return __filter_input_fields(cached_tree)
+        remember_snapshot(page, DOMSnapshot(url=page.url, mutation_state=mutation_state, tree=cached_tree))
+        return cached_tree
+
+    await __inject_attributes_in_frames(page, child_frames)
+    # The DOM of the page is fetched at most once over CDP, for the CDP backend and the in-process frames
+    pierced_document = PiercedDocument(page)
+    enhanced_tree, frame_trees = await asyncio.gather(__extract_main_frame_tree(page, include_hidden, pierced_document),
+                                                      __extract_child_frame_trees(page, child_frames, include_hidden, pierced_document))
+    if enhanced_tree is not None and frame_trees:
+        logger.debug(f"Adding the DOM of {len(frame_trees)} frames")
+        __graft_frame_trees(enhanced_tree, frame_trees)
+
+    # The enriched tree is not modified once built, it is serialized in the background
+    debug_artifacts.write('json_accessibility_dom_enriched.json', lambda: json.dumps(enhanced_tree, indent=2), failed=enhanced_tree is None)
+
+    if enhanced_tree is None:
+        return None
+
+    if include_hidden:
+        return __filter_input_fields(enhanced_tree) if only_input_fields else enhanced_tree
+
+    dom_extraction_cache.put(page, page.main_frame, mutation_state, enhanced_tree)
+
+    if only_input_fields:
+        return __filter_input_fields(enhanced_tree)
 
-    with open(os.path.join(SOURCE_LOG_FOLDER_PATH, 'json_accessibility_dom.json'), 'w',  encoding='utf-8') as f:
-        f.write(json.dumps(accessibility_tree, indent=2))
-        logger.debug("json_accessibility_dom.json saved")
+    # The full tree is the baseline for the next delta
+    remember_snapshot(page, DOMSnapshot(url=page.url, mutation_state=mutation_state, tree=enhanced_tree))
+    return enhanced_tree
+
+
+async def do_get_accessibility_delta(page: Page, max_change_ratio: float = 0.5) -> dict[str, Any] | None:
+    """
+    Retrieves only what changed in the accessibility information of a web page since the last time the full information was retrieved.
+
+    If the mutation observer reports that the DOM did not change, the page is not processed again. If there is no previous tree
+    for the page, the page navigated to a different URL, or the delta is too big, the full tree is returned instead.
+
+    Args:
+        page (Page): The page object representing the web page.
+        max_change_ratio (float, optional): Fraction of the nodes in the tree above which a full resync is returned instead of the delta.
+            Defaults to 0.5.
+
+    Returns:
+        dict[str, Any] or None: {"changes": {"added": [...], "removed": [...], "changed": [...]}} when a delta could be computed,
+            {"full_dom": tree} on a full resync, or None if an error occurred.
+    """
+    previous_snapshot = get_last_snapshot(page)
+    if previous_snapshot is not None and previous_snapshot.url == page.url and previous_snapshot.mutation_state is not None:
+        child_frames = get_child_frames(page) if is_frame_extraction_enabled() else []
+        if previous_snapshot.mutation_state == await __get_mutation_state(page, child_frames):
+            logger.debug("DOM has not changed since the last snapshot")
+            return {"changes": {"added": [], "removed": [], "changed": []}}
+
+    current_tree = await do_get_accessibility_info(page, only_input_fields=False)
+    if current_tree is None:
+        return None
+
+    if previous_snapshot is None or previous_snapshot.url != page.url:
+        logger.debug("No previous snapshot for this page, returning the full DOM")
+        return {"full_dom": current_tree}
+
+    delta = compute_tree_delta(previous_snapshot.tree, current_tree, max_change_ratio)
+    if delta is None:
+        logger.debug("DOM delta is too big, returning the full DOM")
+        return {"full_dom": current_tree}
+    return {"changes": delta}
+
+
+# In-page function that measures all the tagged elements in a single layout pass, and returns the mmids of the elements that intersect
+# the window [start, start + viewports * viewport height) of the document. Positions are in document coordinates, so that the window
+# also pages through content that scrolls inside a container rather than the window.
+MEASURE_VIEWPORT_WINDOW_JS = """(params) => {
+    const viewportHeight = window.innerHeight || document.documentElement.clientHeight;
+    const start = params.cursor === null ? window.scrollY : Math.max(0, params.cursor);
+    const end = start + params.viewports * viewportHeight;
+    const mmids = [];
+    let hasAbove = false;
+    let hasBelow = false;
+    // The elements are taken from the registry of INJECT_MMID_JS, which also has the ones of the open shadow roots, rather than by
+    // querying the document again
+    const registry = window.__agente_mmid_registry;
+    const elements = [];
+    if (registry) {
+        for (const [mmid, elementRef] of registry.elements) {
+            const element = elementRef.deref();
+            if (element && element.isConnected && registry.tagged.get(element) === mmid) elements.push(element);
+        }
+    } else {
+        elements.push(...document.querySelectorAll('[mmid]'));
+    }
+    for (const element of elements) {
+        const rect = element.getBoundingClientRect();
+        // elements that are not rendered, their rendered descendants are measured on their own
+        if (rect.width === 0 && rect.height === 0) continue;
+        const top = rect.top + window.scrollY;
+        const bottom = rect.bottom + window.scrollY;
+        if (bottom > start && top < end) {
+            mmids.push(parseInt(element.getAttribute('mmid')));
+        } else if (top >= end) {
+            hasBelow = true;
+        } else {
+            hasAbove = true;
+        }
+    }
+    return {
+        mmids: mmids,
+        start: Math.round(start),
+        end: Math.round(end),
+        next_cursor: hasBelow ? Math.round(end) : null,
+        previous_cursor: hasAbove ? Math.round(Math.max(0, start - params.viewports * viewportHeight)) : null,
+    };
+}"""
+
+
+def __filter_tree_by_mmids(tree: dict[str, Any], mmids: set[int], get_mmid: Callable[[dict[str, Any]], int | None],
+                           keep_emptied_children: bool) -> dict[str, Any]:
+    """
+    Returns a copy of the tree that only has the nodes whose mmid is in mmids, the nodes without an mmid whose closest ancestor
+    with an mmid is in mmids, and the ancestors of those nodes. The root is always kept. The given tree is left untouched.
 
-    await __cleanup_dom(page)
+    Args:
+        tree (dict[str, Any]): The raw or the enriched accessibility tree.
+        mmids (set[int]): The mmids of the nodes to keep.
+        get_mmid (Callable[[dict[str, Any]], int | None]): Returns the mmid of a node of the tree.
+        keep_emptied_children (bool): If True, a node whose children were all filtered out keeps an empty list of children,
+            so that __fetch_dom_info does not fetch its innerText as if it were a leaf.
+
+    Returns:
+        dict[str, Any]: The filtered copy of the tree.
+    """
+    # Each entry is (node, whether it is in the window, iterator over its children, the copies of the children kept so far)
+    stack: list[tuple[dict[str, Any], bool, Iterator[dict[str, Any]], list[dict[str, Any]]]] = [(tree, False, iter(tree.get('children', [])), [])]
+    while True:
+        current, in_window, children_iterator, kept_children = stack[-1]
+        child = next(children_iterator, None)
+        if child is not None:
+            child_mmid = get_mmid(child)
+            child_in_window = in_window if child_mmid is None else child_mmid in mmids
+            stack.append((child, child_in_window, iter(child.get('children', [])), []))
+            continue
+
+        stack.pop()
+        if stack and not in_window and not kept_children:
+            continue
+        node_copy = {key: value for key, value in current.items() if key != 'children'}
+        if kept_children or ('children' in current and keep_emptied_children):
+            node_copy['children'] = kept_children
+        if not stack:
+            return node_copy
+        stack[-1][3].append(node_copy)
+
+
+async def __get_frames_in_window(child_frames: list[Frame], mmids: set[int]) -> list[Frame]:
+    """
+    Returns the child frames nested in a frame element of the main document whose mmid is in mmids.
+    """
+    owner_mmids = await asyncio.gather(*[get_frame_owner_mmids(frame) for frame in child_frames], return_exceptions=True)
+    return [frame for frame, frame_owner_mmids in zip(child_frames, owner_mmids, strict=True)
+            if isinstance(frame_owner_mmids, list) and frame_owner_mmids and int(frame_owner_mmids[0]) in mmids]
+
+
+def __get_window_mmid(node: dict[str, Any]) -> int | None:
+    """
+    Returns the mmid of a node of the enriched tree as measured by MEASURE_VIEWPORT_WINDOW_JS, None for the nodes without an mmid and
+    for the nodes of the child frames, whose namespaced mmids are not measured: they are in the window when their frame element is.
+    """
+    mmid = node.get('mmid')
+    if mmid is None:
+        return None
     try:
-        enhanced_tree = await __fetch_dom_info(page, accessibility_tree, only_input_fields)
+        return int(mmid)
+    except ValueError:
+        return None
 
-        logger.debug("Enhanced Accessibility Tree ready")
 
-        with open(os.path.join(SOURCE_LOG_FOLDER_PATH, 'json_accessibility_dom_enriched.json'), 'w',  encoding='utf-8') as f:
-            f.write(json.dumps(enhanced_tree, indent=2))
-            logger.debug("json_accessibility_dom_enriched.json saved")
+async def do_get_viewport_accessibility_info(page: Page, cursor: int | None = None, viewports: float = 2) -> dict[str, Any] | None:
+    """
+    Retrieves the accessibility information of the elements of a web page that are within a number of viewports of the scroll position,
+    so that the size of the result does not depend on the length of the page.
 
-        return enhanced_tree
+    The geometry of all the elements is measured in a single call into the page. If the tree of the page is cached, it is filtered down
+    to the window, with the content of the frames whose frame element is in the window. Otherwise only the elements of the main frame
+    in the window are reconciled with the DOM, the frames whose frame element is in the window are extracted and grafted under it,
+    and the window tree is not cached.
+
+    Args:
+        page (Page): The page object representing the web page.
+        cursor (int | None, optional): The vertical position in the document, in pixels, where the window starts. Defaults to None,
+            which starts the window at the current scroll position.
+        viewports (float, optional): The height of the window, in viewport heights. Defaults to 2.
+
+    Returns:
+        dict[str, Any] or None: {"start": ..., "end": ..., "next_cursor": ..., "previous_cursor": ..., "tree": ...} where the cursors are
+            None when there are no elements past the window in that direction, or None if an error occurred.
+    """
+    try:
+        child_frames = get_child_frames(page) if is_frame_extraction_enabled() else []
+        mutation_state = await __get_mutation_state(page, child_frames)
+        cached_tree = dom_extraction_cache.get(page, page.main_frame, mutation_state)
+        if cached_tree is None:
+            await __inject_attributes_in_frames(page, child_frames)
+            pierced_document = PiercedDocument(page)
+            accessibility_tree, dom_info_resolver = await __snapshot_accessibility_tree(page, pierced_document)
+
+        window: dict[str, Any] = await page.evaluate(MEASURE_VIEWPORT_WINDOW_JS, {"cursor": cursor, "viewports": viewports})
+        mmids = set(window.pop("mmids"))
+        logger.debug(f"{len(mmids)} elements between {window['start']} and {window['end']} px")
+
+        if cached_tree is not None:
+            logger.debug("DOM has not changed since the last extraction, filtering the cached accessibility tree")
+            window["tree"] = __filter_tree_by_mmids(cached_tree, mmids, __get_window_mmid, keep_emptied_children=False)
+        else:
+            window_tree = __filter_tree_by_mmids(accessibility_tree, mmids, __get_node_mmid, keep_emptied_children=True)
+            window["tree"] = await __fetch_dom_info(page, window_tree, False, dom_info_resolver)
+            if window["tree"] is not None and child_frames:
+                window_frames = await __get_frames_in_window(child_frames, mmids)
+                __graft_frame_trees(window["tree"], await __extract_child_frame_trees(page, window_frames, pierced_document=pierced_document))
+        return window
     except Exception as e:
-        logger.error(f"Error while fetching DOM info: {e}")
+        logger.error(f"Error while fetching the DOM info of the viewport: {e}")
         traceback.print_exc()
         return None
+
+
+async def do_inject_mmids(page: Page, child_frames: list[Frame] | None = None) -> None:
+    """
+    Injects the mmids in the elements of the main frame that do not have one yet, without extracting the accessibility tree.
+    Used by the extractions that read the page in a single call of their own but return mmids the skills can act on (e.g. the tables).
+
+    Args:
+        page (Page): The page object representing the web page.
+        child_frames (list[Frame] | None, optional): The child frames to inject the mmids in too. Defaults to None, the main frame only.
+    """
+    await __inject_attributes_in_frames(page, child_frames or [])
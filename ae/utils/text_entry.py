@@ -0,0 +1,145 @@
+import os
+import weakref
+from collections import OrderedDict
+from typing import Any
+from urllib.parse import urlparse
+
+from playwright.async_api import CDPSession
+from playwright.async_api import Frame
+from playwright.async_api import Page
+
+from ae.utils.dom_fill import SET_NATIVE_VALUE_JS
+from ae.utils.logger import logger
+
+# Insert the whole text as one native input event, through CDP (Input.insertText)
+STRATEGY_INSERT_TEXT = "insert_text"
+# Set the value through the setter of the prototype of the field and dispatch the input and change events
+STRATEGY_NATIVE_SETTER = "native_setter"
+# Type the text key by key, for the sites that need real keystrokes
+STRATEGY_KEYBOARD = "keyboard"
+
+# Maximum number of (site, field pattern) pairs whose strategy is remembered
+MAX_CACHED_STRATEGIES = 256
+
+_strategy_cache: OrderedDict[tuple[str, str], str] = OrderedDict()
+_cdp_sessions: "weakref.WeakKeyDictionary[Page, CDPSession]" = weakref.WeakKeyDictionary()
+
+# Tells whether the text entered in a field took: its value (or the text of a contenteditable element) is the text, and React, which
+# keeps the last value it saw in a tracker on the node, handled the input event. Fields not managed by React have no tracker.
+CHECK_TEXT_ENTRY_JS = """(element, text) => {
+    const normalize = (value) => (value || '').replace(/\\r\\n/g, '\\n').replace(/\\u00a0/g, ' ').trim();
+    const value = element.isContentEditable ? element.innerText : element.value;
+    const tracker = element._valueTracker;
+    return normalize(value) === normalize(text) && (element.isContentEditable || !tracker || tracker.getValue() === element.value);
+}"""
+
+VERIFY_TEXT_ENTRY_JS = """(params) => {
+    const querySelector = window.__agente_query_selector || ((selector) => document.querySelector(selector));
+    const element = querySelector(params.selector);
+    const checkTextEntry = """ + CHECK_TEXT_ENTRY_JS + """;
+    return element !== null && checkTextEntry(element, params.text);
+}"""
+
+# Fills the field as bulk filling does, but keeps the focus in it, and tells whether the text took
+NATIVE_SETTER_ENTRY_JS = """(params) => {
+    const querySelector = window.__agente_query_selector || ((selector) => document.querySelector(selector));
+    const element = querySelector(params.selector);
+    // The text of contenteditable elements is inserted as a user would, replacing their content would drop their formatting
+    if (!element || element.isContentEditable) return false;
+    const setNativeValue = """ + SET_NATIVE_VALUE_JS + """;
+    const checkTextEntry = """ + CHECK_TEXT_ENTRY_JS + """;
+    element.focus();
+    if (!setNativeValue(element, params.text)) return false;
+    element.dispatchEvent(new Event('input', {bubbles: true}));
+    element.dispatchEvent(new Event('change', {bubbles: true}));
+    return checkTextEntry(element, params.text);
+}"""
+
+
+def is_fast_text_entry_enabled() -> bool:
+    """
+    Returns True if text is entered without typing it key by key when the field allows it, see TEXT_ENTRY_FAST.
+    """
+    return os.getenv("TEXT_ENTRY_FAST", "true").lower() == "true"
+
+
+def __get_strategy_key(page: Page, field: dict[str, Any]) -> tuple[str, str]:
+    """
+    Returns the key the strategy of a field is remembered by: the site, and the pattern of the field (tag, input type and role).
+    """
+    pattern = f"{field['tag']}:{field.get('type') or ''}:{field.get('role') or ''}:{'editable' if field.get('contenteditable') else ''}"
+    return urlparse(page.url).netloc, pattern
+
+
+def get_text_entry_strategies(page: Page, field: dict[str, Any]) -> list[str]:
+    """
+    Returns the strategies to enter text in a field, in the order they are to be tried.
+
+    The strategy that last worked for the same kind of field of the same site comes first. Fields with autocomplete only react to real
+    keystrokes (their suggestions are fetched on key events), so they are typed in, as are all the fields when TEXT_ENTRY_FAST is disabled.
+
+    Args:
+        page (Page): The page of the field.
+        field (dict[str, Any]): The description of the field, as returned by describe_and_act_on_element.
+
+    Returns:
+        list[str]: The strategies, STRATEGY_KEYBOARD being the last one.
+    """
+    if not is_fast_text_entry_enabled() or field.get("autocomplete") or field.get("role") == "combobox":
+        return [STRATEGY_KEYBOARD]
+    strategies = [STRATEGY_INSERT_TEXT, STRATEGY_KEYBOARD] if field.get("contenteditable") else [STRATEGY_INSERT_TEXT, STRATEGY_NATIVE_SETTER, STRATEGY_KEYBOARD]
+    cached_strategy = _strategy_cache.get(__get_strategy_key(page, field))
+    if cached_strategy in strategies:
+        # The strategies that failed before it for this kind of field are not tried again
+        strategies = strategies[strategies.index(cached_strategy):]
+    return strategies
+
+
+def remember_text_entry_strategy(page: Page, field: dict[str, Any], strategy: str):
+    """
+    Remembers the strategy that worked for a field, for the fields of the same kind of the same site.
+    """
+    key = __get_strategy_key(page, field)
+    if _strategy_cache.get(key) != strategy:
+        logger.debug(f"Entering text with the {strategy} strategy in the {key[1]} fields of {key[0]}")
+    _strategy_cache[key] = strategy
+    _strategy_cache.move_to_end(key)
+    while len(_strategy_cache) > MAX_CACHED_STRATEGIES:
+        _strategy_cache.popitem(last=False)
+
+
+async def __insert_text(page: Page, text: str):
+    cdp_session = _cdp_sessions.get(page)
+    if cdp_session is None:
+        cdp_session = await page.context.new_cdp_session(page)
+        _cdp_sessions[page] = cdp_session
+    try:
+        await cdp_session.send("Input.insertText", {"text": text})
+    except Exception:
+        # The session can be detached, e.g. after a crash of the renderer, a new one is opened next time
+        del _cdp_sessions[page]
+        raise
+
+
+async def try_fast_text_entry(page: Page, frame: Page | Frame, selector: str, text: str, strategy: str) -> bool:
+    """
+    Enters text in the focused field with a strategy other than typing, and checks that it took.
+
+    Args:
+        page (Page): The page of the field.
+        frame (Page | Frame): The page, or the frame of the field (see resolve_selector_frame).
+        selector (str): The query selector of the field in that frame. It must be focused and its content cleared or selected.
+        text (str): The text to enter.
+        strategy (str): STRATEGY_INSERT_TEXT or STRATEGY_NATIVE_SETTER.
+
+    Returns:
+        bool: True if the value of the field is the text and the framework of the page saw the change, False if the text is to be typed.
+    """
+    try:
+        if strategy == STRATEGY_INSERT_TEXT:
+            await __insert_text(page, text)
+            return await frame.evaluate(VERIFY_TEXT_ENTRY_JS, {"selector": selector, "text": text})
+        return await frame.evaluate(NATIVE_SETTER_ENTRY_JS, {"selector": selector, "text": text})
+    except Exception as e:
+        logger.debug(f"Could not enter text with the {strategy} strategy in {selector}: {e}")
+        return False
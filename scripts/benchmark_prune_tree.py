@@ -0,0 +1,131 @@
+import argparse
+import json
+import random
+import sys
+import time
+from typing import Any
+
+from ae.utils import get_detailed_accessibility_tree
+
+prune_tree = getattr(get_detailed_accessibility_tree, '__prune_tree')
+should_prune_node = getattr(get_detailed_accessibility_tree, '__should_prune_node')
+
+ROLES = ['generic', 'text', 'button', 'link', 'textbox', 'separator', 'LineBreak', 'listitem', 'heading']
+TAGS = ['div', 'span', 'a', 'button', 'input', 'li', 'textarea']
+NAMES = ['', 'ab', 'Add to cart', 'Next page', 'A longer product description, with punctuation: 42']
+
+
+def legacy_prune_tree(node: dict[str, Any], only_input_fields: bool) -> dict[str, Any] | None:
+    """
+    The recursive implementation of __prune_tree that rebuilt the children list with slicing, kept as the reference for the benchmark.
+    """
+    if "marked_for_deletion_by_mm" in node:
+        return None
+
+    if 'children' in node:
+        i = 0
+        while i < len(node['children']):
+            child = node['children'][i]
+            if 'marked_for_unravel_children' in child:
+                if 'children' in child:
+                    node['children'] = node['children'][:i] + child['children'] + node['children'][i+1:]
+                    i += len(child['children']) - 1
+                else:
+                    node['children'].pop(i)
+                    i -= 1
+            else:
+                pruned_child = legacy_prune_tree(child, only_input_fields)
+                if pruned_child is None:
+                    node['children'].pop(i)
+                    i -= 1
+                else:
+                    node['children'][i] = pruned_child
+            i += 1
+
+        if not node['children']:
+            del node['children']
+
+    return None if should_prune_node(node, only_input_fields) else node
+
+
+def generate_node(rng: random.Random, mmid: int) -> dict[str, Any]:
+    node: dict[str, Any] = {'role': rng.choice(ROLES), 'name': rng.choice(NAMES)}
+    if rng.random() < 0.6:
+        node['tag'] = rng.choice(TAGS)
+        node['mmid'] = mmid
+    if rng.random() < 0.05:
+        node['marked_for_deletion_by_mm'] = True
+    elif rng.random() < 0.05:
+        node['marked_for_unravel_children'] = True
+    return node
+
+
+def generate_tree(node_count: int, list_width: int, seed: int) -> dict[str, Any]:
+    """
+    Generates a random accessibility tree with roughly node_count nodes, shaped like a listing page: lists of up to list_width items,
+    each item being a small random subtree. A share of the nodes are marked for deletion or unraveling, or are pruned by the pruning conditions.
+    """
+    rng = random.Random(seed)
+    root: dict[str, Any] = {'role': 'WebArea', 'name': 'Synthetic page', 'children': []}
+    created = 1
+    while created < node_count:
+        result_list: dict[str, Any] = {'role': 'list', 'name': 'Results', 'tag': 'ul', 'mmid': created, 'children': []}
+        root['children'].append(result_list)
+        created += 1
+        for _ in range(list_width):
+            if created >= node_count:
+                break
+            item = generate_node(rng, created)
+            item['children'] = [generate_node(rng, created + offset) for offset in range(1, rng.randint(2, 5))]
+            result_list['children'].append(item)
+            created += 1 + len(item['children'])
+    return root
+
+
+def generate_deep_tree(node_count: int) -> dict[str, Any]:
+    """
+    Generates a chain of nested wrappers, to check that deep pages do not hit the recursion limit.
+    """
+    root: dict[str, Any] = {'role': 'WebArea', 'name': 'Deep page'}
+    node = root
+    for mmid in range(1, node_count):
+        child = {'role': 'generic', 'name': 'wrapper', 'tag': 'div', 'mmid': mmid}
+        node['children'] = [child]
+        node = child
+    return root
+
+
+def time_prune(prune: Any, tree: dict[str, Any], only_input_fields: bool) -> tuple[float, dict[str, Any] | None]:
+    start_time = time.perf_counter()
+    pruned = prune(tree, only_input_fields)
+    return time.perf_counter() - start_time, pruned
+
+
+def run_benchmark(sizes: list[int], list_width: int, seed: int) -> None:
+    print(f"{'nodes':>8} {'only_input':>10} {'legacy (s)':>12} {'iterative (s)':>14} {'speedup':>8}")
+    for size in sizes:
+        for only_input_fields in (False, True):
+            # Pruning modifies the tree, each implementation gets its own copy of the same tree
+            legacy_time, legacy_pruned = time_prune(legacy_prune_tree, generate_tree(size, list_width, seed), only_input_fields)
+            iterative_time, iterative_pruned = time_prune(prune_tree, generate_tree(size, list_width, seed), only_input_fields)
+            if json.dumps(legacy_pruned) != json.dumps(iterative_pruned):
+                raise AssertionError(f"Pruned trees differ for {size} nodes, only_input_fields={only_input_fields}")
+            print(f"{size:>8} {str(only_input_fields):>10} {legacy_time:>12.4f} {iterative_time:>14.4f} {legacy_time / iterative_time:>7.1f}x")
+
+    depth = sys.getrecursionlimit() * 2
+    try:
+        time_prune(legacy_prune_tree, generate_deep_tree(depth), False)
+        print(f"Legacy pruning handled a tree {depth} levels deep")
+    except RecursionError:
+        print(f"Legacy pruning hit the recursion limit on a tree {depth} levels deep")
+    iterative_time, _ = time_prune(prune_tree, generate_deep_tree(depth), False)
+    print(f"Iterative pruning handled a tree {depth} levels deep in {iterative_time:.4f} seconds")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the accessibility tree pruning on synthetic trees.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000, 100_000, 200_000], help="Number of nodes of the synthetic trees.")
+    parser.add_argument("--list_width", type=int, default=20_000, help="Number of items in each list of the synthetic trees.")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the random tree generation.")
+    args = parser.parse_args()
+    run_benchmark(args.sizes, args.list_width, args.seed)
@@ -0,0 +1,79 @@
+import pytest
+
+from ae.utils import accessibility_node_rules
+from ae.utils.accessibility_node_rules import add_prune_rule
+from ae.utils.accessibility_node_rules import apply_merge_rules
+from ae.utils.accessibility_node_rules import get_rule_hits
+from ae.utils.accessibility_node_rules import has_custom_rules
+from ae.utils.accessibility_node_rules import matches_prune_rule
+from ae.utils.accessibility_node_rules import PruneRule
+from ae.utils.accessibility_node_rules import reset_rule_hits
+
+
+@pytest.fixture(autouse=True)
+def restore_rules():
+    prune_rules = list(accessibility_node_rules.PRUNE_RULES)
+    reset_rule_hits()
+    yield
+    accessibility_node_rules.PRUNE_RULES[:] = prune_rules
+    reset_rule_hits()
+
+
+def test_merge_rules_remove_the_duplicated_attributes():
+    node = {"mmid": "4", "role": "button", "tag": "button", "name": "Search", "description": "Search", "aria-label": "Search", "id": "go"}
+
+    apply_merge_rules(node, True)
+
+    assert node == {"mmid": "4", "tag": "button", "name": "Search"}
+    hits = get_rule_hits()
+    assert hits["description_in_name"] == 1 and hits["aria_label_in_name"] == 1 and hits["role_is_tag"] == 1 and hits["unneeded_attributes"] == 1
+
+
+def test_merge_rules_turn_a_link_into_text():
+    node = {"mmid": "8", "role": "link", "tag": "a", "name": "Docs", "description": "Read the docs"}
+
+    apply_merge_rules(node, True)
+
+    assert node == {"mmid": "8", "tag": "a", "name": "Docs", "text": "Read the docs"}
+
+
+def test_merge_rules_drop_the_children_of_a_select():
+    node = {"mmid": "3", "role": "combobox", "tag": "select", "options": [{"mmid": "4", "text": "France"}], "children": [{"role": "option"}]}
+
+    apply_merge_rules(node, True)
+
+    assert node == {"mmid": "3", "tag": "select", "options": [{"mmid": "4", "text": "France"}]}
+
+
+def test_merge_rules_without_dom_info_only_remove_the_unneeded_attributes():
+    node = {"role": "heading", "name": "Title", "description": "Title", "level": 2}
+
+    apply_merge_rules(node, False)
+
+    assert node == {"role": "heading", "name": "Title", "description": "Title"}
+
+
+@pytest.mark.parametrize("node, only_input_fields, expected", [
+    ({"role": "generic", "name": ""}, False, True),
+    ({"role": "generic", "name": "", "children": [{"role": "button"}]}, False, False),
+    ({"role": "separator", "tag": "hr"}, False, True),
+    ({"role": "text", "name": ": "}, False, True),
+    ({"role": "text", "name": "Free shipping"}, False, False),
+    ({"role": "heading", "name": "Title"}, False, True),
+    ({"role": "heading", "name": "Title", "mmid": "2"}, False, False),
+    ({"role": "heading", "name": "Title", "mmid": "2"}, True, True),
+    ({"role": "textbox", "tag": "input", "mmid": "2"}, True, False),
+    ({"role": "button", "mmid": "2"}, True, False),
+    ({"role": "WebArea", "name": "Page", "children": [{"role": "button"}]}, True, False),
+])
+def test_prune_rules(node, only_input_fields, expected):
+    assert matches_prune_rule(node, only_input_fields) is expected
+
+
+def test_custom_prune_rule_is_applied_before_the_core_rules():
+    add_prune_rule(PruneRule("cookie_banner", lambda node, only_input_fields: node.get("name") == "Accept cookies"), before="not_input_field")
+
+    assert has_custom_rules()
+    assert matches_prune_rule({"role": "button", "name": "Accept cookies", "mmid": "9"}, True)
+    assert get_rule_hits()["cookie_banner"] == 1
+    assert get_rule_hits()["not_input_field"] == 0
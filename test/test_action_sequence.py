@@ -0,0 +1,36 @@
+import pytest
+
+import ae.core.skills.action_sequence as action_sequence_module
+
+validate_action = getattr(action_sequence_module, "__validate_action")
+
+
+@pytest.mark.parametrize("action", [
+    {"action": "click", "query_selector": "[mmid='114']"},
+    {"action": "entertext", "query_selector": "[mmid='12']", "text": ""},
+    {"action": "key", "key": "Enter"},
+    {"action": "wait"},
+    {"action": "wait", "seconds": "1.5"},
+    {"action": "click", "query_selector": "[mmid='2.15']", "expect_change": "true"},
+])
+def test_valid_actions(action):
+    assert validate_action(action) is None
+
+
+@pytest.mark.parametrize("action, error", [
+    ({"action": "scroll"}, "unknown action \"scroll\", it must be one of click, entertext, key, wait"),
+    ({"query_selector": "[mmid='114']"}, "unknown action \"None\", it must be one of click, entertext, key, wait"),
+    ({"action": "click"}, "click needs a query_selector"),
+    ({"action": "entertext", "query_selector": ""}, "entertext needs a query_selector"),
+    ({"action": "entertext", "query_selector": "[mmid='12']"}, "entertext needs a text"),
+    ({"action": "key"}, "key needs a key, e.g. Enter"),
+    ({"action": "wait", "seconds": "a while"}, "wait needs a number of seconds"),
+    ({"action": "wait", "seconds": ["1"]}, "wait needs a number of seconds"),
+])
+def test_invalid_actions(action, error):
+    assert validate_action(action) == error
+
+
+@pytest.mark.parametrize("action", ["click [mmid='114']", None, ["click"]])
+def test_action_that_is_not_an_object(action):
+    assert validate_action(action).startswith("it must be an object with an 'action' key, got ")
@@ -0,0 +1,123 @@
+import asyncio
+from typing import Any
+
+import pytest
+
+import ae.core.skills.enter_text_using_selector as enter_text_module
+from ae.core.skills.enter_text_using_selector import bulk_enter_text
+from ae.utils.dom_fill import FILL_FILLED
+from ae.utils.dom_fill import FILL_NEEDS_KEYBOARD
+from ae.utils.dom_fill import FILL_NO_OPTION
+from ae.utils.dom_fill import FILL_NOT_EDITABLE
+from ae.utils.dom_fill import FILL_NOT_FOUND
+
+
+class FakePage:
+    pass
+
+
+class FakePlaywrightManager:
+    page = FakePage()
+
+    def __init__(self, browser_type: str, headless: bool):
+        pass
+
+    async def get_current_page(self) -> FakePage:
+        return self.page
+
+    async def take_screenshots(self, name: str, page: FakePage):
+        pass
+
+    async def notify_user(self, message: str, message_type: Any = None):
+        pass
+
+
+class FakeBulkFill:
+    """
+    Answers the bulk fills with the given statuses by selector, in turn for the selectors with several statuses, and records them.
+    """
+
+    def __init__(self, statuses: dict[str, list[str]], drop_results: bool = False):
+        self.statuses = statuses
+        self.drop_results = drop_results
+        self.calls: list[list[str]] = []
+
+    async def __call__(self, frame: Any, fields: list[dict[str, str]], highlight: bool = False) -> list[dict[str, Any]]:
+        self.calls.append([field["selector"] for field in fields])
+        results = [{"status": self.statuses[field["selector"]].pop(0), "opening_tag": "<input>"} for field in fields]
+        return results[:-1] if self.drop_results else results
+
+
+@pytest.fixture
+def typed_selectors(monkeypatch) -> list[str]:
+    typed: list[str] = []
+
+    async def fake_entertext(page: Any, selector: str, text: str, highlight: bool = False) -> dict[str, str]:
+        typed.append(selector)
+        return {"summary_message": "Typed", "detailed_message": f"Success. Typed {text}"}
+
+    async def fake_wait_for_dom_settled(page: Any) -> float:
+        return 0
+
+    monkeypatch.setattr(enter_text_module, "PlaywrightManager", FakePlaywrightManager)
+    monkeypatch.setattr(enter_text_module, "do_entertext", fake_entertext)
+    monkeypatch.setattr(enter_text_module, "wait_for_dom_settled", fake_wait_for_dom_settled)
+    monkeypatch.setattr(enter_text_module, "subscribe", lambda callback: None)
+    monkeypatch.setattr(enter_text_module, "unsubscribe", lambda callback: None)
+    return typed
+
+
+def test_bulk_enter_text_fills_the_fields_in_one_call_and_types_the_others(monkeypatch, typed_selectors):
+    bulk_fill = FakeBulkFill({"[mmid='1']": [FILL_FILLED], "[mmid='2']": [FILL_NEEDS_KEYBOARD], "[mmid='4']": [FILL_NOT_EDITABLE],
+                              "[mmid='5']": [FILL_NOT_FOUND]})
+    monkeypatch.setattr(enter_text_module, "do_bulk_fill", bulk_fill)
+    entries = [{"query_selector": "[mmid='1']", "text": "Ada"}, {"query_selector": "[mmid='2']", "text": "Lovelace"},
+               {"query_selector": "[mmid='3']", "text": "1815", "use_keyboard": "true"}, {"query_selector": "[mmid='4']", "text": "x"},
+               {"query_selector": "[mmid='5']", "text": "y"}]
+
+    results = asyncio.run(bulk_enter_text(entries))
+
+    assert bulk_fill.calls == [["[mmid='1']", "[mmid='2']", "[mmid='4']", "[mmid='5']"]]
+    assert typed_selectors == ["[mmid='2']", "[mmid='3']"]
+    assert [result["query_selector"] for result in results] == [entry["query_selector"] for entry in entries]
+    assert results[0]["result"].startswith("Success. Text \"Ada\" set successfully")
+    assert results[1]["result"] == "Success. Typed Lovelace"
+    assert results[2]["result"] == "Success. Typed 1815"
+    assert results[3]["result"].startswith("Error: The element with selector [mmid='4'] is disabled or read only.")
+    assert results[4]["result"] == "Error: Selector [mmid='5'] not found. Unable to continue."
+
+
+def test_bulk_enter_text_retries_a_select_whose_option_is_not_there_yet(monkeypatch, typed_selectors):
+    bulk_fill = FakeBulkFill({"[mmid='1']": [FILL_FILLED], "[mmid='2']": [FILL_NO_OPTION, FILL_FILLED], "[mmid='3']": [FILL_NO_OPTION, FILL_NO_OPTION]})
+    monkeypatch.setattr(enter_text_module, "do_bulk_fill", bulk_fill)
+    entries = [{"query_selector": "[mmid='1']", "text": "France"}, {"query_selector": "[mmid='2']", "text": "Paris"},
+               {"query_selector": "[mmid='3']", "text": "Lyon"}]
+
+    results = asyncio.run(bulk_enter_text(entries))
+
+    assert bulk_fill.calls == [["[mmid='1']", "[mmid='2']", "[mmid='3']"], ["[mmid='2']", "[mmid='3']"]]
+    assert results[1]["result"].startswith("Success.")
+    assert results[2]["result"].startswith("Error: The select element with selector [mmid='3'] has no option \"Lyon\".")
+
+
+def test_bulk_enter_text_reports_every_field_when_the_page_returns_too_few_results(monkeypatch, typed_selectors):
+    monkeypatch.setattr(enter_text_module, "do_bulk_fill", FakeBulkFill({"[mmid='1']": [FILL_FILLED], "[mmid='2']": [FILL_FILLED]},
+                                                                         drop_results=True))
+    entries = [{"query_selector": "[mmid='1']", "text": "Ada"}, {"query_selector": "[mmid='2']", "text": "Lovelace"}]
+
+    results = asyncio.run(bulk_enter_text(entries))
+
+    assert [result["result"] for result in results] == [
+        f"Error entering text in selector {selector}. Error: The page returned 1 results for 2 fields" for selector in ("[mmid='1']", "[mmid='2']")
+    ]
+
+
+def test_bulk_enter_text_reports_the_fields_of_a_frame_that_is_gone(monkeypatch, typed_selectors):
+    bulk_fill = FakeBulkFill({"[mmid='1']": [FILL_FILLED]})
+    monkeypatch.setattr(enter_text_module, "do_bulk_fill", bulk_fill)
+    entries = [{"query_selector": "[mmid='1']", "text": "Ada"}, {"query_selector": "[mmid='7.2']", "text": "4242"}]
+
+    results = asyncio.run(bulk_enter_text(entries))
+
+    assert bulk_fill.calls == [["[mmid='1']"]]
+    assert results[1]["result"].startswith("Error: The frame of the element with selector [mmid='7.2'] is no longer in the page.")
@@ -0,0 +1,83 @@
+import asyncio
+from typing import Any
+
+from ae.utils.cdp_accessibility_tree import get_cdp_accessibility_snapshot
+from ae.utils.cdp_accessibility_tree import PiercedDocument
+
+
+def make_frame_element(backend_node_id: int, mmid: str, frame_id: str, button_name: str) -> dict[str, Any]:
+    button = {"nodeType": 1, "nodeName": "BUTTON", "localName": "button", "backendNodeId": backend_node_id + 2, "attributes": ["mmid", "1"],
+              "children": [{"nodeType": 3, "nodeName": "#text", "backendNodeId": backend_node_id + 3, "nodeValue": button_name}]}
+    content_document = {"nodeType": 9, "nodeName": "#document", "backendNodeId": backend_node_id + 1, "children": [button]}
+    return {"nodeType": 1, "nodeName": "IFRAME", "backendNodeId": backend_node_id, "attributes": ["mmid", mmid], "frameId": frame_id,
+            "contentDocument": content_document}
+
+
+# A page with two in-process frames, each with a button
+PAGE_DOM = {"nodeType": 9, "nodeName": "#document", "backendNodeId": 1, "children": [
+    {"nodeType": 1, "nodeName": "BODY", "backendNodeId": 2, "attributes": ["mmid", "1"], "children": [
+        make_frame_element(10, "2", "payment-frame", "Pay"), make_frame_element(20, "3", "newsletter-frame", "Subscribe"),
+    ]},
+]}
+
+FOCUSABLE = {"name": "focusable", "value": {"value": True}}
+
+AX_NODES = {
+    "payment-frame": [{"nodeId": "1", "role": {"value": "RootWebArea"}, "name": {"value": "Payment"}, "childIds": ["2"], "backendDOMNodeId": 11,
+                       "properties": [FOCUSABLE]},
+                      {"nodeId": "2", "role": {"value": "button"}, "name": {"value": "Pay"}, "backendDOMNodeId": 12}],
+    "newsletter-frame": [{"nodeId": "1", "role": {"value": "RootWebArea"}, "name": {"value": "Newsletter"}, "childIds": ["2"], "backendDOMNodeId": 21,
+                          "properties": [FOCUSABLE]},
+                         {"nodeId": "2", "role": {"value": "button"}, "name": {"value": "Subscribe"}, "backendDOMNodeId": 22}],
+}
+
+
+class FakeCDPSession:
+    def __init__(self, calls: list[tuple[str, Any]]):
+        self.calls = calls
+
+    async def send(self, method: str, params: dict[str, Any]) -> dict[str, Any]:
+        self.calls.append((method, params.get("frameId")))
+        if method == "DOM.getDocument":
+            return {"root": PAGE_DOM}
+        return {"nodes": AX_NODES[params["frameId"]]}
+
+    async def detach(self):
+        pass
+
+
+class FakeContext:
+    def __init__(self, page: Any):
+        self.page = page
+        self.calls: list[tuple[str, Any]] = []
+
+    async def new_cdp_session(self, target: Any) -> FakeCDPSession:
+        # In-process frames have no session of their own
+        if target is not self.page:
+            raise RuntimeError("This frame does not have a separate CDP session")
+        return FakeCDPSession(self.calls)
+
+
+class FakePage:
+    def __init__(self):
+        self.context = FakeContext(self)
+
+
+def test_in_process_frames_share_a_single_fetch_of_the_dom_of_the_page():
+    page = FakePage()
+
+    async def extract_frames():
+        pierced_document = PiercedDocument(page)
+        return await asyncio.gather(get_cdp_accessibility_snapshot(page, object(), ["2"], pierced_document),
+                                    get_cdp_accessibility_snapshot(page, object(), ["3"], pierced_document))
+
+    (payment_tree, resolve_payment_dom_info), (newsletter_tree, _) = asyncio.run(extract_frames())
+
+    assert [call for call in page.context.calls if call[0] == "DOM.getDocument"] == [("DOM.getDocument", None)]
+    assert sorted(page.context.calls[1:]) == [("Accessibility.getFullAXTree", "newsletter-frame"), ("Accessibility.getFullAXTree", "payment-frame")]
+    assert payment_tree["children"] == [{"role": "button", "name": "Pay", "keyshortcuts": "1"}]
+    assert newsletter_tree["children"] == [{"role": "button", "name": "Subscribe", "keyshortcuts": "1"}]
+    # The mmids are resolved in the document of the frame, not in the one of the page
+    dom_info = resolve_payment_dom_info({"entries": [{"mmid": 1, "should_fetch_inner_text": True}], "attributes": ["mmid"],
+                                         "backup_attributes": [], "tags_to_ignore": [], "ids_to_ignore": []})
+    assert dom_info[0]["tag"] == "button"
@@ -0,0 +1,113 @@
+import copy
+from typing import Any
+
+from ae.utils.dom_delta import compute_tree_delta
+
+
+def make_tree() -> dict[str, Any]:
+    return {
+        "role": "WebArea",
+        "name": "Shop",
+        "children": [
+            {"mmid": "1", "tag": "input", "role": "searchbox", "name": "Search"},
+            {"mmid": "2", "tag": "ul", "role": "list", "children": [
+                {"mmid": "3", "tag": "a", "name": "First product", "children": [{"role": "text", "name": "$10"}]},
+                {"mmid": "4", "tag": "a", "name": "Second product"},
+            ]},
+            {"mmid": "5", "tag": "button", "name": "Next page"},
+        ],
+    }
+
+
+def test_delta_of_identical_trees_is_empty():
+    assert compute_tree_delta(make_tree(), make_tree(), 0.5) == {"added": [], "removed": [], "changed": []}
+
+
+def test_delta_reports_the_topmost_added_subtree_with_its_parent():
+    current_tree = make_tree()
+    dialog = {"mmid": "6", "role": "dialog", "name": "Cart", "children": [{"mmid": "7", "tag": "button", "name": "Checkout"}]}
+    current_tree["children"].append(dialog)
+
+    delta = compute_tree_delta(make_tree(), current_tree, 0.5)
+
+    assert delta == {"added": [{"parent_mmid": None, "node": dialog}], "removed": [], "changed": []}
+
+
+def test_delta_reports_the_topmost_removed_subtree():
+    current_tree = make_tree()
+    del current_tree["children"][1]
+
+    delta = compute_tree_delta(make_tree(), current_tree, 1)
+
+    assert delta == {"added": [], "removed": ["2"], "changed": []}
+
+
+def test_delta_reports_a_change_of_the_own_content_without_the_children_with_an_mmid():
+    current_tree = make_tree()
+    current_tree["children"][1]["children"][0]["children"][0]["name"] = "$12"
+    current_tree["children"][1]["name"] = "Results"
+
+    delta = compute_tree_delta(make_tree(), current_tree, 0.5)
+
+    assert delta is not None
+    assert delta["added"] == [] and delta["removed"] == []
+    assert sorted(delta["changed"], key=lambda node: node["mmid"]) == [
+        {"mmid": "2", "tag": "ul", "role": "list", "name": "Results"},
+        {"mmid": "3", "tag": "a", "name": "First product", "children": [{"role": "text", "name": "$12"}]},
+    ]
+
+
+def test_delta_reports_a_moved_node_with_its_new_parent():
+    previous_tree = make_tree()
+    current_tree = copy.deepcopy(previous_tree)
+    moved = current_tree["children"][1]["children"].pop()
+    current_tree["children"].append(moved)
+
+    delta = compute_tree_delta(previous_tree, current_tree, 0.5)
+
+    assert delta == {"added": [], "removed": [], "changed": [{"mmid": "4", "tag": "a", "name": "Second product", "parent_mmid": None}]}
+
+
+def test_delta_reports_a_node_moved_under_an_added_node_only_in_the_added_subtree():
+    previous_tree = make_tree()
+    current_tree = copy.deepcopy(previous_tree)
+    moved = current_tree["children"][1]["children"].pop()
+    current_tree["children"].append({"mmid": "9", "tag": "section", "role": "region", "name": "Recently viewed", "children": [moved]})
+
+    delta = compute_tree_delta(previous_tree, current_tree, 1.0)
+
+    assert delta == {"added": [{"parent_mmid": None, "node": current_tree["children"][-1]}], "removed": [], "changed": []}
+
+
+def test_delta_larger_than_the_max_change_ratio_needs_a_full_resync():
+    current_tree = make_tree()
+    for node in current_tree["children"]:
+        node["name"] = "Changed"
+
+    # 3 of the 6 nodes changed
+    assert compute_tree_delta(make_tree(), current_tree, 0.4) is None
+    assert compute_tree_delta(make_tree(), current_tree, 0.5) is not None
+
+
+def test_delta_leaves_the_trees_untouched():
+    previous_tree, current_tree = make_tree(), make_tree()
+    current_tree["children"][0]["value"] = "shoes"
+
+    compute_tree_delta(previous_tree, current_tree, 0.5)
+
+    assert previous_tree == make_tree()
+    assert current_tree["children"][0] == {"mmid": "1", "tag": "input", "role": "searchbox", "name": "Search", "value": "shoes"}
+
+
+def make_deep_tree(main_name: str) -> dict[str, Any]:
+    text: dict[str, Any] = {"role": "text", "name": "Deep"}
+    for _ in range(3_000):
+        text = {"role": "generic", "name": "", "children": [text]}
+    return {"role": "WebArea", "name": "Page", "children": [{"mmid": "1", "role": "main", "name": main_name, "children": [text]}]}
+
+
+def test_delta_of_a_tree_deeper_than_the_recursion_limit():
+    delta = compute_tree_delta(make_deep_tree(""), make_deep_tree("Main"), max_change_ratio=1.0)
+
+    assert delta is not None
+    assert [node["mmid"] for node in delta["changed"]] == ["1"]
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from ae.utils.dom_frames import evaluate_in_frames
+from ae.utils.dom_frames import get_frame_key
+from ae.utils.dom_frames import namespace_mmid
+from ae.utils.dom_frames import resolve_selector_frame
+
+
+class FakeFrame:
+    def __init__(self, url: str):
+        self.url = url
+        self.detached = False
+
+    def is_detached(self) -> bool:
+        return self.detached
+
+
+class FakePage:
+    pass
+
+
+def test_selector_of_the_main_frame_is_left_as_is():
+    page = FakePage()
+
+    assert resolve_selector_frame(page, "[mmid='114']") == (page, "[mmid='114']")  # type: ignore
+
+
+def test_namespaced_selector_is_routed_to_its_frame():
+    page, frame = FakePage(), FakeFrame("https://pay.example.com")
+    frame_key = get_frame_key(page, frame)  # type: ignore
+    other_frame = FakeFrame("https://ads.example.com")
+
+    assert get_frame_key(page, frame) == frame_key  # type: ignore
+    assert get_frame_key(page, other_frame) != frame_key  # type: ignore
+    assert namespace_mmid(frame_key, 15) == f"{frame_key}.15"
+    assert resolve_selector_frame(page, f"[mmid='{frame_key}.15']") == (frame, "[mmid='15']")  # type: ignore
+    assert resolve_selector_frame(page, f'input[mmid="{frame_key}.15"]:checked') == (frame, 'input[mmid="15"]:checked')  # type: ignore
+
+
+def test_selector_of_a_detached_or_unknown_frame_is_rejected():
+    page, frame = FakePage(), FakeFrame("https://pay.example.com")
+    frame_key = get_frame_key(page, frame)  # type: ignore
+    frame.detached = True
+
+    with pytest.raises(ValueError):
+        resolve_selector_frame(page, f"[mmid='{frame_key}.15']")  # type: ignore
+    with pytest.raises(ValueError):
+        resolve_selector_frame(FakePage(), "[mmid='3.15']")  # type: ignore
+
+
+class FakeEvaluatingFrame(FakeFrame):
+    def __init__(self, url: str, result: object):
+        super().__init__(url)
+        self.result = result
+
+    async def evaluate(self, script: str, params: object) -> object:
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class FakeEvaluatingPage(FakePage):
+    def __init__(self, result: object):
+        self.result = result
+
+    async def evaluate(self, script: str, params: object) -> object:
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+def test_evaluate_in_frames_leaves_out_the_frames_it_failed_in():
+    page = FakeEvaluatingPage("main")
+    ads = FakeEvaluatingFrame("https://ads.example.com/", RuntimeError("Frame was detached"))
+    payment = FakeEvaluatingFrame("https://pay.example.com/", "payment")
+
+    frame_results = asyncio.run(evaluate_in_frames(page, [ads, payment], "() => 1", None))
+
+    assert frame_results == [(None, "main"), (get_frame_key(page, payment), "payment")]
+
+
+def test_evaluate_in_frames_raises_the_error_of_the_main_frame():
+    page = FakeEvaluatingPage(RuntimeError("Execution context was destroyed"))
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(evaluate_in_frames(page, [FakeEvaluatingFrame("https://pay.example.com/", "payment")], "() => 1", None))
@@ -0,0 +1,78 @@
+from typing import Any
+
+import ae.utils.dom_links as dom_links_module
+from ae.utils.dom_links import serialize_links
+
+merge_frame_links = getattr(dom_links_module, "__merge_frame_links")
+
+
+def make_link(mmid: str | None, text: str, url: str, region: str, path: str | None = None) -> dict[str, Any]:
+    return {"mmid": mmid, "text": text, "url": url, "region": region, "path": path or url}
+
+
+def test_merge_namespaces_the_mmids_of_the_links_of_the_child_frames():
+    frame_results = [
+        (None, {"links": [make_link("3", "Home", "https://shop.example.com/", "header", "/")], "link_count": 1}),
+        (2, {"links": [make_link("8", "Terms", "https://pay.example.com/terms", "other"), make_link(None, "Help", "https://pay.example.com/help", "other")],
+             "link_count": 3}),
+    ]
+
+    links, link_count = merge_frame_links(frame_results)
+
+    assert links == [
+        {"mmid": "3", "text": "Home", "path": "/", "region": "header"},
+        {"mmid": "2.8", "text": "Terms", "path": "https://pay.example.com/terms", "region": "other"},
+        {"mmid": None, "text": "Help", "path": "https://pay.example.com/help", "region": "other"},
+    ]
+    assert link_count == 4
+
+
+def test_merge_dedupes_the_links_of_the_frames_by_url():
+    frame_results = [
+        (None, {"links": [make_link("3", "Cart", "https://shop.example.com/cart", "footer", "/cart")], "link_count": 1}),
+        (1, {"links": [make_link("5", "Your cart (2 items)", "https://shop.example.com/cart", "main", "/cart")], "link_count": 1}),
+    ]
+
+    links, link_count = merge_frame_links(frame_results)
+
+    # The region that comes first in LINK_REGIONS wins with its mmid, and the most descriptive text is kept
+    assert links == [{"mmid": "1.5", "text": "Your cart (2 items)", "path": "/cart", "region": "main"}]
+    assert link_count == 2
+
+
+def make_links_result(omitted_count: int = 0) -> dict[str, Any]:
+    return {
+        "links": {"main": [["4", "Running shoes", "/shoes/running"], ["5", "Trail shoes", "/shoes/trail"]],
+                  "footer": [[None, "", "https://social.example.com/shop"]]},
+        "link_count": 9,
+        "unique_count": 3 + omitted_count,
+        "omitted_count": omitted_count,
+    }
+
+
+def test_serialize_links_writes_a_line_per_region_and_per_link():
+    assert serialize_links(make_links_result()).split("\n") == [
+        "main:", '  [4] "Running shoes" /shoes/running', '  [5] "Trail shoes" /shoes/trail',
+        "footer:", "  https://social.example.com/shop",
+        "3 distinct links out of the 9 links of the page.",
+    ]
+
+
+def test_serialize_links_counts_the_links_left_out_by_the_cap():
+    lines = serialize_links(make_links_result(omitted_count=2)).split("\n")
+
+    assert lines[-2:] == ["5 distinct links out of the 9 links of the page.",
+                          "2 links were omitted, use find_elements to look for a specific link."]
+
+
+def test_serialize_links_stops_at_the_token_budget_and_counts_the_omitted_links():
+    # The budget holds the region line and the first link only
+    lines = serialize_links(make_links_result(omitted_count=1), token_budget=12).split("\n")
+
+    assert lines == ["main:", '  [4] "Running shoes" /shoes/running', "4 distinct links out of the 9 links of the page.",
+                     "3 links were omitted, use find_elements to look for a specific link."]
+
+
+def test_serialize_links_without_budget_or_links():
+    assert serialize_links(make_links_result(), token_budget=0) == serialize_links(make_links_result())
+    assert serialize_links({"links": {}, "link_count": 0, "unique_count": 0, "omitted_count": 0}) == "No links found in the page."
@@ -0,0 +1,51 @@
+import asyncio
+import threading
+
+import pytest
+
+from ae.utils.dom_offload import count_nodes
+from ae.utils.dom_offload import get_offload_target
+from ae.utils.dom_offload import OFFLOAD_PROCESS
+from ae.utils.dom_offload import OFFLOAD_THREAD
+from ae.utils.dom_offload import run_offloaded
+
+
+@pytest.fixture(autouse=True)
+def default_thresholds(monkeypatch):
+    monkeypatch.delenv("DOM_OFFLOAD_MIN_NODES", raising=False)
+    monkeypatch.delenv("DOM_OFFLOAD_PROCESS_MIN_NODES", raising=False)
+
+
+def test_count_nodes():
+    tree = {"role": "WebArea", "children": [{"role": "list", "children": [{"role": "listitem"}, {"role": "listitem"}]}, {"role": "button"}]}
+
+    assert count_nodes(tree) == 5
+    assert count_nodes(None) == 0
+
+
+def test_small_trees_stay_on_the_event_loop_and_large_ones_go_to_a_thread():
+    assert get_offload_target(1_999) is None
+    assert get_offload_target(2_000) == OFFLOAD_THREAD
+
+
+def test_process_offload_is_opt_in_and_needs_picklable_work(monkeypatch):
+    assert get_offload_target(1_000_000) == OFFLOAD_THREAD
+
+    monkeypatch.setenv("DOM_OFFLOAD_PROCESS_MIN_NODES", "10000")
+    assert get_offload_target(9_999) == OFFLOAD_THREAD
+    assert get_offload_target(10_000) == OFFLOAD_PROCESS
+    assert get_offload_target(10_000, picklable=False) == OFFLOAD_THREAD
+
+
+def test_offload_is_disabled_with_a_threshold_of_zero(monkeypatch):
+    monkeypatch.setenv("DOM_OFFLOAD_MIN_NODES", "0")
+
+    assert get_offload_target(1_000_000) is None
+
+
+def test_run_offloaded_runs_on_the_event_loop_or_in_a_thread():
+    async def run(target):
+        return await run_offloaded(target, lambda suffix: threading.current_thread().name + suffix, "!")
+
+    assert asyncio.run(run(None)) == threading.current_thread().name + "!"
+    assert asyncio.run(run(OFFLOAD_THREAD)) != threading.current_thread().name + "!"
@@ -0,0 +1,41 @@
+from typing import Any
+
+import ae.utils.dom_search as dom_search_module
+
+merge_candidates = getattr(dom_search_module, "__merge_candidates")
+
+
+def make_candidate(mmid: str | None, name: str, score: float) -> dict[str, Any]:
+    return {"mmid": mmid, "tag": "button", "role": "button", "name": name, "score": score}
+
+
+def test_merge_namespaces_the_mmids_of_the_child_frames():
+    frame_results = [(None, [make_candidate("4", "Checkout", 0.9)]), (2, [make_candidate("7", "Pay", 0.8), make_candidate(None, "Close", 0.5)])]
+
+    candidates = merge_candidates(frame_results, top_k=5)
+
+    assert [candidate["mmid"] for candidate in candidates] == ["4", "2.7", None]
+
+
+def test_merge_orders_by_score_with_the_main_frame_first_on_equal_scores():
+    frame_results = [
+        (None, [make_candidate("1", "Search", 0.6), make_candidate("2", "Search help", 0.4)]),
+        (1, [make_candidate("3", "Search", 0.6), make_candidate("5", "Search the site", 0.95)]),
+    ]
+
+    candidates = merge_candidates(frame_results, top_k=5)
+
+    assert [candidate["mmid"] for candidate in candidates] == ["1.5", "1", "1.3", "2"]
+
+
+def test_merge_keeps_the_top_k_matches_of_all_the_frames():
+    frame_results = [(None, [make_candidate(str(mmid), "Result", mmid / 10) for mmid in range(1, 4)]),
+                     (1, [make_candidate(str(mmid), "Result", mmid / 10) for mmid in range(4, 7)])]
+
+    candidates = merge_candidates(frame_results, top_k=2)
+
+    assert [candidate["mmid"] for candidate in candidates] == ["1.6", "1.5"]
+
+
+def test_merge_without_matches():
+    assert merge_candidates([(None, []), (1, [])], top_k=5) == []
@@ -0,0 +1,89 @@
+from typing import Any
+
+from ae.utils.dom_serializer import estimate_tokens
+from ae.utils.dom_serializer import format_node
+from ae.utils.dom_serializer import get_dom_token_budget
+from ae.utils.dom_serializer import NO_ELEMENTS_MESSAGE
+from ae.utils.dom_serializer import serialize_compact
+from ae.utils.dom_serializer import serialize_compact_delta
+from ae.utils.dom_serializer import serialize_compact_window
+
+
+def make_tree() -> dict[str, Any]:
+    return {
+        "role": "WebArea",
+        "name": "Sign in",
+        "children": [
+            {"role": "heading", "name": "Welcome back"},
+            {"mmid": "2", "tag": "input", "tag_type": "email", "name": "Email", "placeholder": "you@example.com", "required": True},
+            {"mmid": "3", "tag": "select", "name": "Language", "options": [
+                {"mmid": "4", "text": "English", "value": "en", "selected": True},
+                {"mmid": "5", "text": "Français", "value": "fr"},
+            ]},
+            {"role": "generic", "children": [{"role": "text", "name": "A long paragraph of legal text " * 20}]},
+            {"mmid": "6", "tag": "button", "name": "Sign in", "disabled": False},
+        ],
+    }
+
+
+def test_format_node_writes_the_header_and_the_attributes_that_are_set():
+    assert format_node({"mmid": "2", "tag": "input", "tag_type": "email", "name": "Email", "placeholder": "you@example.com", "required": True,
+                        "description": "", "disabled": False}, depth=1) == '  [2] input:email "Email" ph="you@example.com" required'
+
+
+def test_format_node_writes_the_options_of_a_select():
+    node = make_tree()["children"][2]
+
+    assert format_node(node) == '[3] select "Language" opts=[4:"English"="en"*,5:"Français"="fr"]'
+
+
+def test_serialize_compact_indents_the_children_under_their_parent():
+    assert serialize_compact(make_tree()).split("\n")[:3] == ['WebArea "Sign in"', '  heading "Welcome back"',
+                                                                 '  [2] input:email "Email" ph="you@example.com" required']
+
+
+def test_serialize_compact_drops_the_non_interactive_subtrees_over_the_budget():
+    tree = make_tree()
+    full_output = serialize_compact(tree)
+
+    output = serialize_compact(tree, token_budget=estimate_tokens(full_output) // 4)
+
+    assert "legal text" in full_output and "legal text" not in output
+    for mmid in ("[2]", "[3]", "[6]"):
+        assert mmid in output
+    assert output.endswith("use text_only for the text content")
+    assert tree == make_tree()
+
+
+def test_serialize_compact_of_an_empty_tree():
+    assert serialize_compact(None) == NO_ELEMENTS_MESSAGE
+    assert serialize_compact_delta({"full_dom": None}) == "full_dom:\n" + NO_ELEMENTS_MESSAGE
+
+
+def test_serialize_compact_delta_of_the_changes():
+    delta_result = {"changes": {
+        "added": [{"parent_mmid": None, "node": {"mmid": "9", "role": "dialog", "name": "Cookies"}}],
+        "removed": ["3"],
+        "changed": [{"mmid": "2", "tag": "input", "name": "Email", "value": "a@b.c"}],
+    }}
+
+    assert serialize_compact_delta(delta_result).split("\n") == [
+        "added:", "  under the page:", '    [9] dialog "Cookies"', "removed: [3]", "changed:", '  [2] input "Email" val="a@b.c"',
+    ]
+    assert serialize_compact_delta({"changes": {"added": [], "removed": [], "changed": []}}) == "No changes since the last fetch of the DOM"
+
+
+def test_serialize_compact_window_of_an_empty_window_keeps_the_cursors():
+    window_result = {"tree": None, "start": 0, "end": 1600, "next_cursor": 1600, "previous_cursor": None}
+
+    assert serialize_compact_window(window_result).split("\n") == [
+        NO_ELEMENTS_MESSAGE, "Elements between 0px and 1600px of the page.",
+        "More elements below, use viewport_fields with cursor=1600 to fetch them.",
+    ]
+
+
+def test_token_budget_is_read_on_every_call(monkeypatch):
+    monkeypatch.setenv("DOM_TOKEN_BUDGET", "500")
+    assert get_dom_token_budget() == 500
+    monkeypatch.setenv("DOM_TOKEN_BUDGET", "0")
+    assert get_dom_token_budget() == 0
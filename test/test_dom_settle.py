@@ -0,0 +1,88 @@
+import asyncio
+from typing import Any
+
+from ae.utils.dom_settle import get_pending_request_count
+from ae.utils.dom_settle import track_network_activity
+from ae.utils.dom_settle import wait_for_dom_settled
+
+
+class FakeContext:
+    def __init__(self):
+        self.handlers: dict[str, Any] = {}
+
+    def on(self, event: str, handler: Any):
+        self.handlers[event] = handler
+
+
+class FakeQuietPage:
+    """
+    Answers the waits for a quiet DOM with the given results in turn, the last one repeated.
+    """
+
+    def __init__(self, quiet_results: list[bool | Exception]):
+        self.quiet_results = quiet_results
+        self.calls = 0
+
+    async def evaluate(self, script: str, params: dict[str, Any]) -> bool:
+        result = self.quiet_results[min(self.calls, len(self.quiet_results) - 1)]
+        self.calls += 1
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+class FakeFrame:
+    def __init__(self, page: FakeQuietPage):
+        self.page = page
+
+
+class FakeRequest:
+    def __init__(self, page: FakeQuietPage, resource_type: str):
+        self.frame = FakeFrame(page)
+        self.resource_type = resource_type
+
+
+def test_quiet_page_without_requests_is_settled_after_one_wait():
+    page = FakeQuietPage([True])
+
+    waited_time = asyncio.run(wait_for_dom_settled(page, quiet_millis=50, max_wait_millis=1000))
+
+    assert page.calls == 1
+    assert waited_time < 1
+
+
+def test_page_that_keeps_changing_is_left_after_the_wait_times_out():
+    page = FakeQuietPage([False])
+
+    asyncio.run(wait_for_dom_settled(page, quiet_millis=50, max_wait_millis=1000))
+
+    assert page.calls == 1
+
+
+def test_page_that_navigated_away_is_left():
+    page = FakeQuietPage([RuntimeError("Execution context was destroyed")])
+
+    asyncio.run(wait_for_dom_settled(page, quiet_millis=50, max_wait_millis=1000))
+
+    assert page.calls == 1
+
+
+def test_requests_in_flight_are_waited_for_before_the_dom_is_quiet_again():
+    context = FakeContext()
+    track_network_activity(context)
+    page = FakeQuietPage([True])
+    xhr = FakeRequest(page, "xhr")
+    context.handlers["request"](xhr)
+    # Images do not change the DOM, they are not waited for
+    context.handlers["request"](FakeRequest(page, "image"))
+    assert get_pending_request_count(page) == 1
+
+    async def act():
+        asyncio.get_running_loop().call_later(0.1, context.handlers["requestfinished"], xhr)
+        return await wait_for_dom_settled(page, quiet_millis=50, max_wait_millis=1000)
+
+    waited_time = asyncio.run(act())
+
+    assert page.calls == 2
+    assert 0.1 <= waited_time < 1
+    assert get_pending_request_count(page) == 0
@@ -0,0 +1,46 @@
+from typing import Any
+
+from ae.utils.dom_tables import serialize_tables
+
+
+def make_tables_result(row_count: int, start: int = 0, total_rows: int | None = None) -> dict[str, Any]:
+    rows = [{"mmid": str(100 + index), "cells": [f"Order {start + index}", "Shipped | tracked", f"${index}.00"]} for index in range(row_count)]
+    total_rows = row_count if total_rows is None else total_rows
+    end = start + row_count
+    return {
+        "tables": [{"mmid": "7", "caption": "Orders", "header": [["Order", "Status", "Total"]], "rows": rows}],
+        "start": start,
+        "total_rows": total_rows,
+        "next_cursor": end if end < total_rows else None,
+    }
+
+
+def test_serialize_tables_writes_one_line_per_row():
+    assert serialize_tables(make_tables_result(2)).split("\n") == [
+        'table [7] "Orders"',
+        "  columns: Order | Status | Total",
+        "  [100] Order 0 | Shipped \\| tracked | $0.00",
+        "  [101] Order 1 | Shipped \\| tracked | $1.00",
+        "Rows 1 to 2 of the 2 rows of the tables of the page.",
+    ]
+
+
+def test_serialize_tables_returns_the_cursor_of_the_rows_left_for_the_next_call():
+    lines = serialize_tables(make_tables_result(3, start=10, total_rows=50)).split("\n")
+
+    assert lines[-2] == "Rows 11 to 13 of the 50 rows of the tables of the page."
+    assert lines[-1] == "More rows are available, use tables with cursor=13 to fetch them."
+
+
+def test_serialize_tables_stops_at_the_token_budget_with_at_least_one_row():
+    lines = serialize_tables(make_tables_result(100), token_budget=60).split("\n")
+
+    row_lines = [line for line in lines if line.startswith("  [")]
+    assert 1 <= len(row_lines) < 100
+    assert lines[-1] == f"More rows are available, use tables with cursor={len(row_lines)} to fetch them."
+
+    assert len([line for line in serialize_tables(make_tables_result(5), token_budget=1).split("\n") if line.startswith("  [")]) == 1
+
+
+def test_serialize_tables_without_tables():
+    assert serialize_tables({"tables": [], "start": 0, "total_rows": 0, "next_cursor": None}).startswith("No tables found")
@@ -0,0 +1,73 @@
+import copy
+from typing import Any
+
+from ae.utils.dom_templates import collapse_repeated_subtrees
+from ae.utils.dom_templates import expand_collapsed_group
+
+
+def make_product(mmid: int, name: str, price: str) -> dict[str, Any]:
+    return {"mmid": str(mmid), "tag": "li", "role": "listitem", "children": [
+        {"mmid": str(mmid + 1), "tag": "a", "name": name},
+        {"role": "text", "name": price},
+        {"mmid": str(mmid + 2), "tag": "button", "name": "Add to cart"},
+    ]}
+
+
+def make_listing(product_count: int) -> dict[str, Any]:
+    products = [make_product(10 + 3 * index, f"Product {index}", f"${index}.99") for index in range(product_count)]
+    return {"role": "WebArea", "name": "Shop", "children": [
+        {"mmid": "1", "tag": "input", "name": "Search"},
+        {"mmid": "2", "tag": "ul", "role": "list", "children": products},
+    ]}
+
+
+def test_collapse_keeps_the_first_subtrees_and_summarizes_the_others_as_rows():
+    tree = make_listing(6)
+
+    collapsed_tree, groups = collapse_repeated_subtrees(tree, 2)
+
+    items = collapsed_tree["children"][1]["children"]
+    assert items[:2] == tree["children"][1]["children"][:2]
+    group = items[2]
+    assert group["role"] == "group"
+    assert "use expand=17" in group["name"]
+    # The row has the mmid of the first interactive element and only the text that differs between the products
+    assert group["children"] == [{"mmid": "17", "name": "Product 2 | $2.99"}, {"mmid": "20", "name": "Product 3 | $3.99"},
+                                 {"mmid": "23", "name": "Product 4 | $4.99"}, {"mmid": "26", "name": "Product 5 | $5.99"}]
+    assert groups["17"] == tree["children"][1]["children"][2:]
+
+
+def test_collapse_leaves_short_runs_and_the_tree_untouched():
+    tree = make_listing(3)
+    original_tree = copy.deepcopy(tree)
+
+    collapsed_tree, groups = collapse_repeated_subtrees(tree, 2)
+
+    assert collapsed_tree is tree
+    assert groups == {}
+    assert tree == original_tree
+
+
+def test_collapse_is_disabled_with_a_keep_count_of_zero():
+    tree = make_listing(10)
+
+    assert collapse_repeated_subtrees(tree, 0) == (tree, {})
+
+
+def test_collapse_does_not_modify_the_given_tree():
+    tree = make_listing(8)
+    original_tree = copy.deepcopy(tree)
+
+    collapse_repeated_subtrees(tree, 3)
+
+    assert tree == original_tree
+
+
+def test_expand_returns_the_collapsed_subtrees_in_full():
+    tree = make_listing(6)
+
+    expanded = expand_collapsed_group(tree, "17", 2)
+
+    assert expanded is not None
+    assert expanded["children"] == tree["children"][1]["children"][2:]
+    assert expand_collapsed_group(tree, "999", 2) is None
@@ -0,0 +1,29 @@
+import pytest
+
+from ae.utils.dom_text_blocks import rank_bm25
+
+
+def test_rank_bm25_scores_the_texts_with_the_query_terms_first():
+    texts = ["Shipping and returns policy", "Our return policy lasts 30 days, returns are free", "Contact us", ""]
+
+    scores = rank_bm25(texts, "return policy")
+
+    assert scores[1] > scores[0] > 0
+    assert scores[2] == 0 and scores[3] == 0
+
+
+def test_rank_bm25_favours_the_rare_terms():
+    texts = ["price of the laptop", "price of the phone", "price of the tablet"]
+
+    scores = rank_bm25(texts, "price laptop")
+
+    assert scores[0] > scores[1] == pytest.approx(scores[2])
+
+
+def test_rank_bm25_is_case_insensitive_and_ignores_punctuation():
+    assert rank_bm25(["Opening HOURS: 9am-5pm"], "opening hours?")[0] == pytest.approx(rank_bm25(["opening hours 9am 5pm"], "Opening Hours")[0])
+
+
+def test_rank_bm25_of_an_empty_corpus_or_query():
+    assert rank_bm25([], "anything") == []
+    assert rank_bm25(["some text"], "") == [0]
@@ -0,0 +1,228 @@
+import asyncio
+import copy
+import json
+from typing import Any
+
+import pytest
+
+import ae.utils.get_detailed_accessibility_tree as accessibility_tree_module
+from scripts.benchmark_prune_tree import generate_tree
+from scripts.benchmark_prune_tree import legacy_prune_tree
+
+fetch_dom_info = getattr(accessibility_tree_module, "__fetch_dom_info")
+filter_tree_by_mmids = getattr(accessibility_tree_module, "__filter_tree_by_mmids")
+get_window_mmid = getattr(accessibility_tree_module, "__get_window_mmid")
+prune_tree = getattr(accessibility_tree_module, "__prune_tree")
+
+
+def make_tree_to_prune() -> dict[str, Any]:
+    """
+    A tree with the cases the pruning handles: nodes marked for deletion, unraveled nodes with and without children, nested
+    unraveling, input fields and containers left empty.
+    """
+    return {
+        "role": "WebArea",
+        "name": "Form",
+        "children": [
+            {"role": "generic", "name": "", "tag": "div", "mmid": 1, "marked_for_unravel_children": True, "children": [
+                {"role": "textbox", "name": "Email", "tag": "input", "mmid": 2},
+                {"role": "generic", "name": "", "tag": "div", "mmid": 3, "marked_for_unravel_children": True, "children": [
+                    {"role": "button", "name": "Submit", "tag": "button", "mmid": 4},
+                    {"role": "text", "name": "Hidden", "tag": "span", "mmid": 5, "marked_for_deletion_by_mm": True},
+                ]},
+            ]},
+            {"role": "generic", "name": "", "tag": "div", "mmid": 6, "marked_for_unravel_children": True},
+            {"role": "list", "name": "Results", "tag": "ul", "mmid": 7, "children": [
+                {"role": "listitem", "name": "", "tag": "li", "mmid": 8, "children": [
+                    {"role": "link", "name": "First result", "tag": "a", "mmid": 9},
+                ]},
+                {"role": "listitem", "name": "", "tag": "li", "mmid": 10, "marked_for_deletion_by_mm": True, "children": [
+                    {"role": "link", "name": "Deleted with its parent", "tag": "a", "mmid": 11},
+                ]},
+            ]},
+            {"role": "generic", "name": "", "tag": "div", "mmid": 12, "children": [
+                {"role": "text", "name": "", "tag": "span", "mmid": 13, "marked_for_deletion_by_mm": True},
+            ]},
+            {"role": "combobox", "name": "Country", "tag": "select", "mmid": 14},
+        ],
+    }
+
+
+def make_tree_with_frames() -> dict[str, Any]:
+    """
+    An enriched tree with two child frames grafted under the Iframe nodes of their frame elements, the way
+    do_get_accessibility_info returns it.
+    """
+    return {
+        "role": "WebArea",
+        "name": "Page",
+        "children": [
+            {"mmid": "1", "tag": "h1", "role": "heading", "name": "Checkout"},
+            {"mmid": "2", "tag": "button", "role": "button", "name": "Below the window"},
+            {"mmid": "3", "tag": "div", "role": "generic", "children": [
+                {"role": "Iframe", "name": "Payment", "children": [
+                    {"mmid": "1.4", "tag": "input", "role": "textbox", "name": "Card number"},
+                    {"mmid": "1.5", "tag": "div", "role": "generic", "children": [
+                        {"mmid": "1.6", "tag": "button", "role": "button", "name": "Pay"},
+                    ]},
+                ]},
+            ]},
+            {"mmid": "7", "tag": "div", "role": "generic", "children": [
+                {"role": "Iframe", "name": "Ads", "children": [
+                    {"mmid": "2.1", "tag": "a", "role": "link", "name": "Ad"},
+                ]},
+            ]},
+        ],
+    }
+
+
+def test_filter_keeps_the_frame_content_of_a_frame_element_in_the_window():
+    tree = make_tree_with_frames()
+
+    window_tree = filter_tree_by_mmids(tree, {1, 3}, get_window_mmid, keep_emptied_children=False)
+
+    assert [child.get("mmid") for child in window_tree["children"]] == ["1", "3"]
+    frame_node = window_tree["children"][1]["children"][0]
+    assert frame_node["role"] == "Iframe"
+    assert [child["mmid"] for child in frame_node["children"]] == ["1.4", "1.5"]
+    assert frame_node["children"][1]["children"][0]["mmid"] == "1.6"
+
+
+def test_filter_drops_the_frame_content_of_a_frame_element_out_of_the_window():
+    tree = make_tree_with_frames()
+
+    window_tree = filter_tree_by_mmids(tree, {1, 2}, get_window_mmid, keep_emptied_children=False)
+
+    assert [child.get("mmid") for child in window_tree["children"]] == ["1", "2"]
+
+
+def test_filter_leaves_the_tree_untouched():
+    tree = make_tree_with_frames()
+    original_tree = copy.deepcopy(tree)
+
+    filter_tree_by_mmids(tree, {3}, get_window_mmid, keep_emptied_children=False)
+
+    assert tree == original_tree
+
+
+def test_window_mmid_of_main_frame_and_frame_nodes():
+    assert get_window_mmid({"mmid": "12"}) == 12
+    assert get_window_mmid({"mmid": 12}) == 12
+    assert get_window_mmid({"mmid": "2.15"}) is None
+    assert get_window_mmid({"role": "Iframe"}) is None
+
+
+@pytest.mark.parametrize("only_input_fields", [False, True])
+def test_prune_tree_matches_the_recursive_pruner_on_a_form(only_input_fields: bool):
+    # Both pruners modify the tree in place, each one gets its own copy
+    expected = legacy_prune_tree(make_tree_to_prune(), only_input_fields)
+
+    assert prune_tree(make_tree_to_prune(), only_input_fields) == expected
+
+
+@pytest.mark.parametrize("only_input_fields", [False, True])
+@pytest.mark.parametrize("seed", [1, 7, 42])
+def test_prune_tree_matches_the_recursive_pruner_on_listing_pages(only_input_fields: bool, seed: int):
+    expected = legacy_prune_tree(generate_tree(2_000, 50, seed), only_input_fields)
+
+    # Compared serialized, so that the order of the keys of the nodes is checked as well
+    assert json.dumps(prune_tree(generate_tree(2_000, 50, seed), only_input_fields)) == json.dumps(expected)
+
+
+def test_prune_tree_of_a_fully_deleted_page():
+    tree = {"role": "WebArea", "name": "Page", "marked_for_deletion_by_mm": True, "children": [{"role": "button", "name": "OK"}]}
+
+    assert prune_tree(copy.deepcopy(tree), False) is None
+    assert legacy_prune_tree(copy.deepcopy(tree), False) is None
+
+
+class FakeDOMPage:
+    """
+    Answers the calls of __fetch_dom_info into the page from a fixed DOM, and records them.
+    """
+
+    def __init__(self, elements: dict[int, dict[str, Any] | None], hidden_mmids: list[int]):
+        self.elements = elements
+        self.hidden_mmids = hidden_mmids
+        self.calls: list[tuple[str, Any]] = []
+
+    async def evaluate(self, script: str, params: Any) -> Any:
+        if script == accessibility_tree_module.FIND_HIDDEN_ELEMENTS_JS:
+            self.calls.append(("find_hidden", params))
+            return [mmid for mmid in params if mmid in self.hidden_mmids]
+        assert script == accessibility_tree_module.FETCH_DOM_INFO_JS
+        self.calls.append(("fetch_dom_info", params["entries"]))
+        return [copy.deepcopy(self.elements[entry["mmid"]]) for entry in params["entries"]]
+
+
+def make_raw_tree() -> dict[str, Any]:
+    """
+    A raw accessibility snapshot of the injection backend, with the mmid of each node in 'keyshortcuts'.
+    """
+    return {
+        "role": "WebArea",
+        "name": "Login",
+        "children": [
+            {"role": "textbox", "name": "Email", "keyshortcuts": "2"},
+            {"role": "generic", "name": "", "keyshortcuts": "3", "children": [
+                {"role": "button", "name": "Go", "keyshortcuts": "4"},
+                {"role": "text", "name": "Go", "keyshortcuts": "4"},
+            ]},
+            {"role": "link", "name": "Skip to content", "keyshortcuts": "5"},
+            {"role": "heading", "name": "Sign in to your account", "level": 1},
+        ],
+    }
+
+
+def test_fetch_dom_info_reconciles_the_tree_in_one_call_per_step():
+    page = FakeDOMPage({2: {"tag": "input", "tag_type": "email", "name": "email", "mmid": "2"}, 3: None, 4: {"tag": "button", "mmid": "4"}},
+                       hidden_mmids=[5])
+
+    enriched_tree = asyncio.run(fetch_dom_info(page, make_raw_tree(), False))
+
+    assert page.calls == [
+        ("find_hidden", [2, 3, 4, 5]),
+        # Post order, each (mmid, should_fetch_inner_text) once, and the hidden link is not fetched
+        ("fetch_dom_info", [{"mmid": 2, "should_fetch_inner_text": True}, {"mmid": 4, "should_fetch_inner_text": True},
+                            {"mmid": 3, "should_fetch_inner_text": False}]),
+    ]
+    assert enriched_tree == {
+        "role": "WebArea",
+        "name": "Login",
+        "children": [
+            {"role": "textbox", "name": "email", "mmid": "2", "tag": "input", "tag_type": "email"},
+            {"role": "generic", "name": "", "mmid": 3, "children": [
+                {"name": "Go", "mmid": "4", "tag": "button"},
+                {"role": "text", "name": "Go", "mmid": "4", "tag": "button"},
+            ]},
+            {"role": "heading", "name": "Sign in to your account", "level": 1},
+        ],
+    }
+
+
+def test_fetch_dom_info_keeps_the_hidden_elements_when_asked():
+    page = FakeDOMPage({2: None, 3: None, 4: None, 5: {"tag": "a", "mmid": "5"}}, hidden_mmids=[5])
+
+    enriched_tree = asyncio.run(fetch_dom_info(page, make_raw_tree(), False, include_hidden=True))
+
+    assert [call[0] for call in page.calls] == ["fetch_dom_info"]
+    assert {"name": "Skip to content", "mmid": "5", "tag": "a"} in enriched_tree["children"]
+
+
+def test_fetch_dom_info_of_a_tree_deeper_than_the_recursion_limit():
+    depth = 3_000
+    tree: dict[str, Any] = {"role": "textbox", "name": "Search", "keyshortcuts": str(depth + 1)}
+    for mmid in range(depth, 0, -1):
+        tree = {"role": "generic", "name": "", "keyshortcuts": str(mmid), "children": [tree]}
+    root = {"role": "WebArea", "name": "Deep", "children": [tree]}
+    page = FakeDOMPage({mmid: None for mmid in range(1, depth + 1)} | {depth + 1: {"tag": "input", "mmid": str(depth + 1)}},
+                       hidden_mmids=[])
+
+    enriched_tree = asyncio.run(fetch_dom_info(page, root, False))
+
+    # One call for the hidden elements and one for the DOM information, whatever the depth
+    assert [call[0] for call in page.calls] == ["find_hidden", "fetch_dom_info"]
+    node = enriched_tree
+    while node.get("children"):
+        node = node["children"][-1]
+    assert node == {"role": "textbox", "name": "Search", "mmid": str(depth + 1), "tag": "input"}
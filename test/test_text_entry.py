@@ -0,0 +1,65 @@
+from collections import OrderedDict
+
+import pytest
+
+import ae.utils.text_entry as text_entry_module
+from ae.utils.text_entry import get_text_entry_strategies
+from ae.utils.text_entry import remember_text_entry_strategy
+from ae.utils.text_entry import STRATEGY_INSERT_TEXT
+from ae.utils.text_entry import STRATEGY_KEYBOARD
+from ae.utils.text_entry import STRATEGY_NATIVE_SETTER
+
+get_strategy_key = getattr(text_entry_module, "__get_strategy_key")
+
+
+class FakePage:
+    def __init__(self, url: str):
+        self.url = url
+
+
+@pytest.fixture(autouse=True)
+def empty_strategy_cache(monkeypatch):
+    monkeypatch.setenv("TEXT_ENTRY_FAST", "true")
+    monkeypatch.setattr(text_entry_module, "_strategy_cache", OrderedDict())
+
+
+def test_strategy_key_is_the_site_and_the_pattern_of_the_field():
+    page = FakePage("https://www.example.com/checkout?step=2")
+
+    assert get_strategy_key(page, {"tag": "input", "type": "email"}) == ("www.example.com", "input:email::")
+    assert get_strategy_key(page, {"tag": "div", "role": "textbox", "contenteditable": True}) == ("www.example.com", "div::textbox:editable")
+    # The path of the page and the identity of the field are not part of the key
+    assert get_strategy_key(FakePage("https://www.example.com/account"), {"tag": "input", "type": "email", "name": "login"}) == \
+        ("www.example.com", "input:email::")
+
+
+def test_strategies_start_with_the_one_that_worked_for_the_same_kind_of_field_of_the_site():
+    page = FakePage("https://www.example.com/")
+    field = {"tag": "input", "type": "text"}
+    assert get_text_entry_strategies(page, field) == [STRATEGY_INSERT_TEXT, STRATEGY_NATIVE_SETTER, STRATEGY_KEYBOARD]
+
+    remember_text_entry_strategy(page, field, STRATEGY_NATIVE_SETTER)
+
+    assert get_text_entry_strategies(FakePage("https://www.example.com/other"), {"tag": "input", "type": "text"}) == \
+        [STRATEGY_NATIVE_SETTER, STRATEGY_KEYBOARD]
+    assert get_text_entry_strategies(FakePage("https://shop.example.com/"), field) == \
+        [STRATEGY_INSERT_TEXT, STRATEGY_NATIVE_SETTER, STRATEGY_KEYBOARD]
+    assert get_text_entry_strategies(page, {"tag": "textarea"}) == [STRATEGY_INSERT_TEXT, STRATEGY_NATIVE_SETTER, STRATEGY_KEYBOARD]
+
+
+def test_fields_with_autocomplete_are_always_typed_in(monkeypatch):
+    page = FakePage("https://www.example.com/")
+    assert get_text_entry_strategies(page, {"tag": "input", "autocomplete": True}) == [STRATEGY_KEYBOARD]
+    assert get_text_entry_strategies(page, {"tag": "input", "role": "combobox"}) == [STRATEGY_KEYBOARD]
+
+    monkeypatch.setenv("TEXT_ENTRY_FAST", "false")
+    assert get_text_entry_strategies(page, {"tag": "input", "type": "text"}) == [STRATEGY_KEYBOARD]
+
+
+def test_strategy_cache_keeps_the_most_recently_used_fields(monkeypatch):
+    monkeypatch.setattr(text_entry_module, "MAX_CACHED_STRATEGIES", 2)
+    field = {"tag": "input", "type": "text"}
+    for site in ("a.example.com", "b.example.com", "c.example.com"):
+        remember_text_entry_strategy(FakePage(f"https://{site}/"), field, STRATEGY_KEYBOARD)
+
+    assert list(text_entry_module._strategy_cache) == [("b.example.com", "input:text::"), ("c.example.com", "input:text::")]